@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Change log of the analysis store, so derived indexes can catch up with deltas
+class AnalysisChangeLog:
+    """Ordered log of saved ("upsert") and removed ("delete") analysis ids
+
+    The sequence number of the newest entry is the store's generation: a
+    reader that remembers the last sequence it applied only needs the
+    entries after it. The log is SQLite, so saves made by another process
+    (e.g. the retention CLI) are seen too.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("ANALYSIS_CHANGES_PATH", "analysis_changes.db")
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                analysis_id TEXT NOT NULL,
+                op TEXT NOT NULL,
+                at REAL
+            )
+        """)
+        self.conn.commit()
+
+    def record(self, analysis_id, op="upsert"):
+        """Append a change; returns its sequence number"""
+        with self._lock:
+            cursor = self.conn.execute("INSERT INTO changes (analysis_id, op, at) VALUES (?, ?, ?)",
+                                       (analysis_id, op, time.time()))
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def generation(self):
+        """Sequence number of the newest change (0 before any)"""
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def since(self, seq, limit=10000):
+        """Changes after a sequence number, oldest first, as (seq, analysis_id, op)"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT seq, analysis_id, op FROM changes WHERE seq > ? ORDER BY seq LIMIT ?", (seq, limit)
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_default_log = None
+_default_lock = threading.Lock()
+
+def get_analysis_changes():
+    """Get the shared analysis change log"""
+    global _default_log
+    with _default_lock:
+        if _default_log is None:
+            _default_log = AnalysisChangeLog()
+        return _default_log
@@ -0,0 +1,435 @@
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+import numpy as np
+from analysis_stats import normalize_keywords
+
+# Columnar copy of the analysis history: month partitions of compressed NumPy columns
+#
+#   analysis_columns/
+#     dictionary.json             append-only dictionaries for type and keyword codes
+#     date=2025-03/part-*.npz     one array (or offsets + values pair) per column
+#     staging.jsonl               mirrored analyses not yet written as a part
+#
+# Each column is its own member of the .npz, and members are only
+# decompressed when accessed, so a query reads just the columns it asks for.
+COLUMNS = ("id", "date", "type", "filename", "keywords", "findings", "latency")
+UNDATED = "undated"
+
+def _partition_of(date):
+    return date[:7] if len(date) >= 7 and date[4] == "-" else UNDATED
+
+def _encode_strings(values):
+    """Variable-length strings as (uint32 offsets, uint8 UTF-8 bytes)"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+def _decode_strings(offsets, data):
+    raw = data.tobytes()
+    return [raw[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+
+def _list_offsets(lists):
+    offsets = np.zeros(len(lists) + 1, dtype=np.uint32)
+    np.cumsum([len(items) for items in lists], out=offsets[1:])
+    return offsets
+
+
+class AnalysisColumns:
+    """Partitioned columnar export and mirror of the analysis store"""
+
+    def __init__(self, root=None, part_rows=100000, staging_rows=1000):
+        self.root = root or os.environ.get("ANALYSIS_COLUMNS_DIR", "analysis_columns")
+        self.part_rows = part_rows
+        self.staging_rows = staging_rows
+        self.staging_path = os.path.join(self.root, "staging.jsonl")
+        self._lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+        self.dictionary_path = os.path.join(self.root, "dictionary.json")
+        self._dictionary_stamp = None
+        self.dictionary = self._load_dictionary()
+
+    # Dictionaries (codes are stable: values are only ever appended, also by
+    # export(), so parts written by another process keep their meaning)
+    def _stamp(self):
+        try:
+            stat = os.stat(self.dictionary_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_dictionary(self):
+        self._dictionary_stamp = self._stamp()
+        if self._dictionary_stamp is not None:
+            with open(self.dictionary_path, "r") as f:
+                values = json.load(f)
+        else:
+            values = {"type": [], "keyword": []}
+        return {name: {value: code for code, value in enumerate(items)} for name, items in values.items()}
+
+    def _refresh_dictionary(self):
+        """Reload the dictionary if another process (e.g. an export) has appended to it"""
+        if self._stamp() != self._dictionary_stamp:
+            self.dictionary = self._load_dictionary()
+
+    def _save_dictionary(self):
+        """Save newly appended codes; returns False (and reloads) if another process saved first"""
+        if self._stamp() != self._dictionary_stamp:
+            self.dictionary = self._load_dictionary()
+            return False
+        temp_path = f"{self.dictionary_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({name: list(codes) for name, codes in self.dictionary.items()}, f)
+        os.replace(temp_path, self.dictionary_path)
+        self._dictionary_stamp = self._stamp()
+        return True
+
+    def _code(self, name, value):
+        codes = self.dictionary[name]
+        if value not in codes:
+            codes[value] = len(codes)
+        return codes[value]
+
+    def values(self, name):
+        """Dictionary values for 'type' or 'keyword', indexed by code"""
+        with self._lock:
+            self._refresh_dictionary()
+            return list(self.dictionary[name])
+
+    # Writing
+    @staticmethod
+    def _row(analysis):
+        return {
+            "id": analysis.get("id", ""),
+            "date": analysis.get("date") or "",
+            "type": analysis.get("type", "unknown"),
+            "filename": analysis.get("filename", ""),
+            "keywords": normalize_keywords(analysis.get("keywords", [])),
+            "findings": [str(finding) for finding in analysis.get("findings", [])],
+            "latency": analysis.get("latency"),
+        }
+
+    def _write_part(self, partition, rows):
+        """Encode rows (all in one partition) as a new immutable part file"""
+        # Codes come from the current dictionary; re-encode if another process appended meanwhile
+        self._refresh_dictionary()
+        while True:
+            columns = self._encode_part(rows)
+            if self._save_dictionary():
+                break
+
+        directory = os.path.join(self.root, f"date={partition}")
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.npz"
+        temp_path = os.path.join(directory, f".{name}.tmp")
+        with open(temp_path, "wb") as f:
+            np.savez_compressed(f, **columns)
+        os.replace(temp_path, os.path.join(directory, name))
+
+    def _encode_part(self, rows):
+        timestamps = np.array([np.datetime64(row["date"][:19]) if row["date"] else np.datetime64("NaT")
+                               for row in rows], dtype="datetime64[s]")
+        filename_offsets, filename_data = _encode_strings([row["filename"] for row in rows])
+        findings = [row["findings"] for row in rows]
+        finding_offsets, finding_data = _encode_strings([finding for items in findings for finding in items])
+        keyword_lists = [row["keywords"] for row in rows]
+        columns = {
+            "id": np.array([row["id"] for row in rows], dtype="S36"),
+            "date": timestamps.astype(np.int64),
+            "type": np.array([self._code("type", row["type"]) for row in rows], dtype=np.uint16),
+            "filename_offsets": filename_offsets,
+            "filename_data": filename_data,
+            "keywords_offsets": _list_offsets(keyword_lists),
+            "keywords_codes": np.array([self._code("keyword", keyword) for items in keyword_lists
+                                        for keyword in items], dtype=np.uint32),
+            "findings_offsets": _list_offsets(findings),
+            "findings_string_offsets": finding_offsets,
+            "findings_data": finding_data,
+            "latency": np.array([np.nan if row["latency"] is None else row["latency"] for row in rows],
+                                dtype=np.float32),
+        }
+        return columns
+
+    def _write_rows(self, rows):
+        partitions = defaultdict(list)
+        for row in rows:
+            partitions[_partition_of(row["date"])].append(row)
+        for partition, partition_rows in partitions.items():
+            for start in range(0, len(partition_rows), self.part_rows):
+                self._write_part(partition, partition_rows[start:start + self.part_rows])
+
+    def export(self, analyses):
+        """Rewrite the whole columnar copy from an iterable of analyses; returns the row count"""
+        with self._lock:
+            for entry in os.listdir(self.root):
+                path = os.path.join(self.root, entry)
+                if entry.startswith("date="):
+                    shutil.rmtree(path)
+                elif entry == "staging.jsonl":
+                    os.remove(path)
+            count, batch = 0, []
+            for analysis in analyses:
+                batch.append(self._row(analysis))
+                count += 1
+                if len(batch) >= self.part_rows * 4:
+                    self._write_rows(batch)
+                    batch = []
+            self._write_rows(batch)
+            return count
+
+    def append(self, analysis):
+        """Mirror one saved analysis; staged rows are written as a part every staging_rows"""
+        with self._lock:
+            with open(self.staging_path, "a") as f:
+                f.write(json.dumps(self._row(analysis)) + "\n")
+            if self._staged_count() >= self.staging_rows:
+                self.flush()
+
+    def _staged_rows(self):
+        if not os.path.exists(self.staging_path):
+            return []
+        with open(self.staging_path, "r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _staged_count(self):
+        if not os.path.exists(self.staging_path):
+            return 0
+        with open(self.staging_path, "rb") as f:
+            return sum(1 for _ in f)
+
+    def flush(self):
+        """Write staged rows as part files"""
+        with self._lock:
+            rows = self._staged_rows()
+            if rows:
+                self._write_rows(rows)
+            if os.path.exists(self.staging_path):
+                os.remove(self.staging_path)
+            return len(rows)
+
+    # Reading
+    def partitions(self, date_from=None, date_to=None):
+        """Partition names overlapping a date range (YYYY-MM-DD bounds, inclusive)"""
+        names = sorted(entry[5:] for entry in os.listdir(self.root) if entry.startswith("date="))
+        selected = []
+        for name in names:
+            if name == UNDATED:
+                if not date_from and not date_to:
+                    selected.append(name)
+                continue
+            if date_from and name < str(date_from)[:7]:
+                continue
+            if date_to and name > str(date_to)[:7]:
+                continue
+            selected.append(name)
+        return selected
+
+    def _read_part(self, path, columns):
+        """Decode only the requested columns of one part"""
+        with np.load(path, allow_pickle=False) as part:
+            result = {}
+            for column in columns:
+                if column in ("id", "date", "type", "latency"):
+                    result[column] = part[column]
+                elif column == "filename":
+                    result[column] = _decode_strings(part["filename_offsets"], part["filename_data"])
+                elif column == "keywords":
+                    result["keywords_offsets"] = part["keywords_offsets"]
+                    result["keywords_codes"] = part["keywords_codes"]
+                elif column == "findings":
+                    strings = _decode_strings(part["findings_string_offsets"], part["findings_data"])
+                    offsets = part["findings_offsets"]
+                    result[column] = [strings[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+            return result
+
+    def _staged_part(self, date_from, date_to):
+        """Staged rows in the same decoded form as a part"""
+        rows = [row for row in self._staged_rows()
+                if (not date_from or row["date"][:10] >= str(date_from))
+                and (not date_to or (row["date"] and row["date"][:10] <= str(date_to)))]
+        if not rows:
+            return None
+        keyword_lists = [row["keywords"] for row in rows]
+        return {
+            "id": np.array([row["id"] for row in rows], dtype="S36"),
+            "date": np.array([np.datetime64(row["date"][:19]) if row["date"] else np.datetime64("NaT")
+                              for row in rows], dtype="datetime64[s]").astype(np.int64),
+            "type": np.array([self._code("type", row["type"]) for row in rows], dtype=np.uint16),
+            "filename": [row["filename"] for row in rows],
+            "keywords_offsets": _list_offsets(keyword_lists),
+            "keywords_codes": np.array([self._code("keyword", keyword) for items in keyword_lists
+                                        for keyword in items], dtype=np.uint32),
+            "findings": [row["findings"] for row in rows],
+            "latency": np.array([np.nan if row["latency"] is None else row["latency"] for row in rows],
+                                dtype=np.float32),
+        }
+
+    def _scan(self, needed, date_from=None, date_to=None, types=None, keyword=None):
+        """Yield (decoded part, row mask) for every part in the date range"""
+        needed = set(needed)
+        if date_from or date_to:
+            needed.add("date")
+        if types:
+            needed.add("type")
+        if keyword:
+            needed.add("keywords")
+        with self._lock:
+            self._refresh_dictionary()
+            paths = [os.path.join(self.root, f"date={partition}", name)
+                     for partition in self.partitions(date_from, date_to)
+                     for name in sorted(os.listdir(os.path.join(self.root, f"date={partition}")))
+                     if name.endswith(".npz")]
+            staged = self._staged_part(date_from, date_to)
+        # Looked up after staging, which may code values not yet written in a part
+        type_codes = np.array([self.dictionary["type"][t] for t in types or [] if t in self.dictionary["type"]],
+                              dtype=np.uint16)
+        keyword_code = self.dictionary["keyword"].get(keyword.lower()) if keyword else None
+        if keyword and keyword_code is None:
+            return
+
+        start = np.datetime64(str(date_from), "s").astype(np.int64) if date_from else None
+        end = (np.datetime64(str(date_to), "D") + 1).astype("datetime64[s]").astype(np.int64) if date_to else None
+
+        parts = (self._read_part(path, needed) for path in paths)
+        if staged is not None:
+            parts = itertools.chain(parts, [staged])
+
+        for part in parts:
+            rows = self._row_count(part)
+            mask = np.ones(rows, dtype=bool)
+            if start is not None:
+                mask &= part["date"] >= start
+            if end is not None:
+                mask &= part["date"] < end
+            if types:
+                mask &= np.isin(part["type"], type_codes)
+            if keyword_code is not None:
+                counts = np.diff(part["keywords_offsets"].astype(np.int64))
+                row_of_code = np.repeat(np.arange(rows), counts)
+                has_keyword = np.zeros(rows, dtype=bool)
+                has_keyword[row_of_code[part["keywords_codes"] == keyword_code]] = True
+                mask &= has_keyword
+            yield part, mask
+
+    def query(self, columns=("id", "date", "type"), date_from=None, date_to=None, types=None, keyword=None):
+        """Scan only the needed partitions and columns; returns a dict of column values
+
+        date comes back as datetime64[s], type as its dictionary value,
+        keywords as a list of keyword lists, and filename/findings as lists.
+        Filters: inclusive date range (YYYY-MM-DD), a set of types and a
+        keyword every returned row must contain.
+        """
+        columns = list(columns)
+        chunks = [self._select(part, columns, mask)
+                  for part, mask in self._scan(columns, date_from, date_to, types, keyword)]
+        return self._concat(chunks, columns)
+
+    def keyword_counts(self, date_from=None, date_to=None, types=None):
+        """Keyword frequencies over a range, counted on the dictionary codes"""
+        with self._lock:
+            self._refresh_dictionary()
+        totals = np.zeros(len(self.dictionary["keyword"]), dtype=np.int64)
+        for part, mask in self._scan(["keywords"], date_from, date_to, types):
+            per_row = np.diff(part["keywords_offsets"].astype(np.int64))
+            codes = part["keywords_codes"][np.repeat(mask, per_row)]
+            totals += np.bincount(codes, minlength=len(totals))[:len(totals)]
+        keywords = self.values("keyword")
+        order = np.argsort(-totals, kind="stable")
+        return [(keywords[code], int(totals[code])) for code in order if totals[code]]
+
+    @staticmethod
+    def _row_count(part):
+        for key in ("id", "date", "type", "latency"):
+            if key in part:
+                return len(part[key])
+        return len(part["keywords_offsets"]) - 1
+
+    def _select(self, part, columns, mask):
+        selected = {}
+        indexes = np.flatnonzero(mask)
+        for column in columns:
+            if column == "keywords":
+                offsets = part["keywords_offsets"]
+                codes = part["keywords_codes"]
+                selected[column] = [codes[offsets[i]:offsets[i + 1]] for i in indexes]
+            elif column in ("filename", "findings"):
+                selected[column] = [part[column][i] for i in indexes]
+            else:
+                selected[column] = part[column][mask]
+        return selected
+
+    def _concat(self, chunks, columns):
+        keyword_values = self.values("keyword")
+        type_values = np.array(self.values("type") or [""], dtype=object)
+        result = {}
+        for column in columns:
+            if column == "keywords":
+                result[column] = [[keyword_values[code] for code in codes]
+                                  for chunk in chunks for codes in chunk[column]]
+            elif column in ("filename", "findings"):
+                result[column] = [value for chunk in chunks for value in chunk[column]]
+            elif column == "type":
+                codes = np.concatenate([chunk[column] for chunk in chunks]) if chunks else np.array([], dtype=np.uint16)
+                result[column] = type_values[codes] if len(codes) else np.array([], dtype=object)
+            elif column == "date":
+                dates = np.concatenate([chunk[column] for chunk in chunks]) if chunks else np.array([], dtype=np.int64)
+                result[column] = dates.astype("datetime64[s]")
+            else:
+                result[column] = np.concatenate([chunk[column] for chunk in chunks]) if chunks else np.array([])
+        return result
+
+
+_default_columns = None
+_default_lock = threading.Lock()
+
+def get_analysis_columns():
+    """Get the columnar mirror, or None unless ANALYSIS_COLUMNS_MIRROR is enabled"""
+    global _default_columns
+    if os.environ.get("ANALYSIS_COLUMNS_MIRROR", "").lower() not in ("1", "true", "yes"):
+        return None
+    with _default_lock:
+        if _default_columns is None:
+            _default_columns = AnalysisColumns()
+        return _default_columns
+
+
+if __name__ == "__main__":
+    import argparse
+    from utils_simple import get_all_analyses
+
+    parser = argparse.ArgumentParser(description="Columnar export of the analysis history")
+    parser.add_argument("--root", default=os.environ.get("ANALYSIS_COLUMNS_DIR", "analysis_columns"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("export", help="Rewrite the columnar copy from analysis_store.json")
+    subparsers.add_parser("flush", help="Write mirrored rows waiting in staging as part files")
+    query_parser = subparsers.add_parser("query", help="Print matching rows")
+    query_parser.add_argument("--columns", default="date,type,filename,keywords")
+    query_parser.add_argument("--from", dest="date_from")
+    query_parser.add_argument("--to", dest="date_to")
+    query_parser.add_argument("--type", dest="types", action="append")
+    query_parser.add_argument("--keyword")
+    args = parser.parse_args()
+
+    store = AnalysisColumns(args.root)
+    if args.command == "export":
+        start = time.time()
+        count = store.export(get_all_analyses())
+        print(f"Exported {count} analyses into {len(store.partitions())} partitions in {time.time() - start:.1f}s")
+    elif args.command == "flush":
+        print(f"Wrote {store.flush()} staged analyses")
+    else:
+        columns = args.columns.split(",")
+        start = time.perf_counter()
+        result = store.query(columns, args.date_from, args.date_to, args.types, args.keyword)
+        elapsed = time.perf_counter() - start
+        rows = len(result[columns[0]])
+        for i in range(min(rows, 20)):
+            print("  ".join(str(result[column][i]) for column in columns))
+        print(f"{rows} rows in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,327 @@
+import os
+import threading
+from datetime import date
+import numpy as np
+from analysis_stats import analysis_day, normalize_keywords
+from text_index import SegmentedIndex, unpack_payload
+
+# Full-text and faceted search over past analyses
+EPOCH = date(1970, 1, 1)
+
+def _day_number(day):
+    """Days since 1970-01-01 for a YYYY-MM-DD string (-1 if undated)"""
+    return (date.fromisoformat(day) - EPOCH).days if day else -1
+
+def _month_number(day):
+    """Months since 1970-01 for a YYYY-MM-DD string (-1 if undated)"""
+    return (int(day[:4]) - 1970) * 12 + int(day[5:7]) - 1 if day else -1
+
+def _month_label(month):
+    return f"{1970 + month // 12:04d}-{month % 12 + 1:02d}"
+
+def _extension(filename):
+    name = (filename or "").lower()
+    if name.endswith(".nii.gz"):
+        return "nii.gz"
+    return name.rsplit(".", 1)[-1] if "." in name else ""
+
+
+class AnalysisIndex(SegmentedIndex):
+    """Inverted index on analysis text, findings, keywords and filename with facet columns
+
+    Each save is flushed as a small segment and the recent segments are
+    merged once there are more than `merge_after` of them, so the index is
+    searchable straight away without many segments piling up. Facet
+    columns (type, day, file extension) are mirrored in NumPy arrays indexed
+    by document id, so filtering and facet counts don't touch SQLite.
+    """
+
+    doc_columns = {"analysis_id": "TEXT", "day": "TEXT", "type": "TEXT", "extension": "TEXT", "filename": "TEXT"}
+    field_weights = {"keywords": 3.0, "findings": 2.0, "filename": 1.5, "analysis": 1.0}
+
+    def __init__(self, path, batch_docs=20000, merge_after=16):
+        super().__init__(path, batch_docs=batch_docs)
+        self.merge_after = merge_after
+        self._facets = None
+        self._browse_order = None
+
+    # Facet arrays
+    def _load_facets(self):
+        row = self.conn.execute("SELECT MAX(doc_id) FROM docs").fetchone()
+        size = (row[0] or 0) + 1
+        self._facet_values = {"type": {}, "extension": {}}
+        self._facets = {
+            "type": np.full(size, -1, dtype=np.int16),
+            "extension": np.full(size, -1, dtype=np.int16),
+            "day": np.full(size, -1, dtype=np.int32),
+            "month": np.full(size, -1, dtype=np.int32),
+            "segment": np.full(size, -1, dtype=np.int32),
+        }
+        self._browse_order = None
+        # One index scan per distinct value; far cheaper than fetching whole rows
+        for name in ("type", "extension", "day", "segment"):
+            values = [row[0] for row in self.conn.execute(f"SELECT DISTINCT {name} FROM docs")]
+            for value in values:
+                ids = np.fromiter((row[0] for row in self.conn.execute(
+                    f"SELECT doc_id FROM docs WHERE {name} = ?", (value,))), dtype=np.int64)
+                if name == "day":
+                    self._facets["day"][ids] = _day_number(value)
+                    self._facets["month"][ids] = _month_number(value)
+                elif name == "segment":
+                    self._facets["segment"][ids] = value
+                else:
+                    self._facets[name][ids] = self._facet_code(name, value)
+
+    def _facet_code(self, name, value):
+        codes = self._facet_values[name]
+        if value not in codes:
+            codes[value] = len(codes)
+        return codes[value]
+
+    def _set_facets(self, doc_id, analysis_type, day, extension, segment):
+        if doc_id >= len(self._facets["type"]):
+            grow = max(doc_id + 1, len(self._facets["type"]) * 2)
+            for name, array in self._facets.items():
+                grown = np.full(grow, -1, dtype=array.dtype)
+                grown[:len(array)] = array
+                self._facets[name] = grown
+        self._facets["type"][doc_id] = self._facet_code("type", analysis_type)
+        self._facets["extension"][doc_id] = self._facet_code("extension", extension)
+        self._facets["day"][doc_id] = _day_number(day)
+        self._facets["month"][doc_id] = _month_number(day)
+        self._facets["segment"][doc_id] = segment
+        self._browse_order = None
+
+    def _ensure_facets(self):
+        with self._lock:
+            if self._facets is None:
+                self._load_facets()
+
+    # Writing
+    def _doc_id_for(self, analysis_id):
+        row = self.conn.execute("SELECT doc_id FROM docs WHERE analysis_id = ?", (analysis_id,)).fetchone()
+        if row:
+            return row[0]
+        row = self.conn.execute("SELECT MAX(doc_id) FROM docs").fetchone()
+        return (row[0] or 0) + 1
+
+    def add_analysis(self, analysis, flush=True):
+        """Index (or re-index) one analysis"""
+        keywords = normalize_keywords(analysis.get("keywords", []))
+        findings = [str(finding) for finding in analysis.get("findings", [])]
+        day = analysis_day(analysis) or ""
+        extension = _extension(analysis.get("filename"))
+        with self._lock:
+            self._ensure_facets()
+            doc_id = self._doc_id_for(analysis["id"])
+            self.add(
+                doc_id,
+                {
+                    "analysis": analysis.get("analysis", ""),
+                    "findings": " ".join(findings),
+                    "keywords": " ".join(keywords),
+                    "filename": (analysis.get("filename") or "").replace("_", " "),
+                },
+                {
+                    "id": analysis["id"],
+                    "filename": analysis.get("filename", ""),
+                    "date": analysis.get("date", ""),
+                    "type": analysis.get("type", "unknown"),
+                    "keywords": keywords,
+                    "findings": findings[:3],
+                    "snippet": " ".join((analysis.get("analysis") or "").split())[:240],
+                },
+                analysis_id=analysis["id"],
+                day=day,
+                type=analysis.get("type", "unknown"),
+                extension=extension,
+                filename=analysis.get("filename", ""),
+            )
+            self._set_facets(doc_id, analysis.get("type", "unknown"), day, extension, self._segment)
+            if flush:
+                self.flush()
+                self._merge_tail()
+
+    def remove_analysis(self, analysis_id):
+        """Drop an analysis from the index"""
+        with self._lock:
+            self._ensure_facets()
+            row = self.conn.execute("SELECT doc_id FROM docs WHERE analysis_id = ?", (analysis_id,)).fetchone()
+            if row:
+                self.delete(row[0])
+                self.conn.commit()
+                for array in self._facets.values():
+                    array[row[0]] = -1
+                self._browse_order = None
+
+    def _merge_tail(self):
+        """Fold small incremental segments into one once there are too many"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'base_segment'").fetchone()
+        base = int(row[0]) if row else 0
+        # Segment ids are allocated one per flush, so the tail length needs no scan
+        if self._segment - 1 - base > self.merge_after:
+            self._merged(base, self.merge_segments(base))
+
+    def _merged(self, after, merged_segment):
+        segments = self._facets["segment"]
+        segments[segments > after] = merged_segment
+
+    def rebuild(self, analyses):
+        """Re-index every analysis from scratch; returns the count"""
+        with self._lock:
+            self.conn.execute("DELETE FROM docs")
+            self.conn.execute("DELETE FROM postings")
+            self.conn.commit()
+            self._facets = None
+            self._ensure_facets()
+            count = 0
+            for analysis in analyses:
+                self.add_analysis(analysis, flush=False)
+                count += 1
+            self.optimize()
+            return count
+
+    def optimize(self):
+        with self._lock:
+            self._ensure_facets()
+            super().optimize()
+            self._merged(0, self._segment - 1)
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('base_segment', ?)", (str(self._segment - 1),))
+            self.conn.commit()
+
+    # Querying
+    def search_analyses(self, query="", types=None, date_from=None, date_to=None, extensions=None,
+                        filename=None, page=1, page_size=10):
+        """Ranked, filtered and paginated analyses with facet counts
+
+        Without a query, matches are ordered newest first. Returns a dict
+        with total, page, pages, results (stored summaries with a score)
+        and facets (type, month and extension counts over all matches).
+        """
+        self._ensure_facets()
+        with self._lock:
+            # Writers replace grown arrays and only ever set single entries,
+            # so holding references is enough to read a consistent view
+            facets = dict(self._facets)
+            values = {name: list(codes) for name, codes in self._facet_values.items()}
+            if self._browse_order is None:
+                live = np.flatnonzero(facets["type"] >= 0)
+                self._browse_order = live[np.lexsort((-live, -facets["day"][live]))]
+            browse_order = self._browse_order
+
+        if query and query.strip():
+            # Ranked after filtering, so only the surviving matches are sorted
+            ids, scores, newest = self.score(query, ranked=False)
+            # Drop postings superseded by a later re-index of the same document
+            known = ids < len(facets["type"])
+            ids, scores, newest = ids[known], scores[known], newest[known]
+            current = newest >= facets["segment"][ids]
+            ids, scores = ids[current], scores[current]
+        else:
+            ids = browse_order
+            scores = None
+
+        mask = facets["type"][ids] >= 0
+        for name, selected in (("type", types), ("extension", extensions)):
+            if selected:
+                # Lookup table by code; the extra last slot catches -1 (removed)
+                allowed = np.zeros(len(values[name]) + 1, dtype=bool)
+                allowed[[values[name].index(value) for value in selected if value in values[name]]] = True
+                mask &= allowed[facets[name][ids]]
+        if date_from:
+            mask &= facets["day"][ids] >= _day_number(str(date_from))
+        if date_to:
+            mask &= (facets["day"][ids] >= 0) & (facets["day"][ids] <= _day_number(str(date_to)))
+        if filename:
+            rows = self.conn.execute("SELECT doc_id FROM docs WHERE filename LIKE ?", (f"%{filename}%",)).fetchall()
+            mask &= np.isin(ids, np.array([row[0] for row in rows], dtype=np.int64))
+        ids = ids[mask]
+        if scores is not None:
+            order = np.argsort(-scores[mask], kind="stable")
+            ids, scores = ids[order], scores[mask][order]
+
+        # Facet counts over every match
+        facet_counts = {}
+        for name in ("type", "extension"):
+            counts = np.bincount(facets[name][ids], minlength=len(values[name])) if len(ids) else []
+            facet_counts[name] = sorted(((values[name][code], int(count)) for code, count in enumerate(counts) if count),
+                                        key=lambda item: item[1], reverse=True)
+        months = facets["month"][ids]
+        month_counts = np.bincount(months[months >= 0]) if len(ids) else []
+        facet_counts["month"] = [(_month_label(month), int(count))
+                                 for month, count in enumerate(month_counts) if count][::-1]
+
+        # Page of results (payloads fetched only for this page)
+        total = len(ids)
+        page = max(1, int(page))
+        start = (page - 1) * page_size
+        page_ids = [int(doc_id) for doc_id in ids[start:start + page_size]]
+        payloads = {}
+        if page_ids:
+            placeholders = ", ".join("?" for _ in page_ids)
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT doc_id, payload FROM docs WHERE doc_id IN ({placeholders})", page_ids
+                ).fetchall()
+            payloads = {row[0]: row[1] for row in rows}
+        results = []
+        for offset, doc_id in enumerate(page_ids):
+            if doc_id in payloads:
+                result = unpack_payload(payloads[doc_id])
+                result["score"] = float(scores[start + offset]) if scores is not None else None
+                results.append(result)
+        return {
+            "total": total,
+            "page": page,
+            "pages": max(1, -(-total // page_size)),
+            "results": results,
+            "facets": facet_counts,
+        }
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+def get_analysis_index():
+    """Get the shared analysis search index"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = AnalysisIndex(os.environ.get("ANALYSIS_INDEX_PATH", "analysis_index.db"))
+        return _default_index
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from utils_simple import get_all_analyses
+
+    parser = argparse.ArgumentParser(description="Search past analyses")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="Re-index analysis_store.json")
+    search_parser = subparsers.add_parser("search", help="Query the index")
+    search_parser.add_argument("query", nargs="?", default="")
+    search_parser.add_argument("--type", dest="types", action="append")
+    search_parser.add_argument("--from", dest="date_from")
+    search_parser.add_argument("--to", dest="date_to")
+    search_parser.add_argument("--page", type=int, default=1)
+    subparsers.add_parser("optimize", help="Merge segments")
+    args = parser.parse_args()
+
+    index = get_analysis_index()
+    if args.command == "rebuild":
+        start = time.time()
+        count = index.rebuild(get_all_analyses())
+        print(f"Indexed {count} analyses in {time.time() - start:.1f}s")
+    elif args.command == "search":
+        start = time.perf_counter()
+        found = index.search_analyses(args.query, types=args.types, date_from=args.date_from,
+                                      date_to=args.date_to, page=args.page)
+        elapsed = time.perf_counter() - start
+        for result in found["results"]:
+            print(f"{result['date'][:10]}  {result['type']:8s} {result['filename']:30s} {', '.join(result['keywords'])}")
+        print(f"{found['total']} matches (page {found['page']}/{found['pages']}) in {elapsed * 1000:.1f} ms")
+        print(found["facets"])
+    else:
+        index.optimize()
+        print(index.stats())
@@ -0,0 +1,229 @@
+import ast
+import itertools
+import os
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime
+
+# Running aggregates over the analysis store, updated as analyses are saved
+def normalize_keywords(value):
+    """Keyword list from a stored value (older records hold the list as a string)"""
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            value = value.split(",")
+        if isinstance(value, str):
+            value = [value]
+    return sorted({str(keyword).strip().lower() for keyword in value or [] if str(keyword).strip()})
+
+def analysis_day(analysis):
+    """Calendar day (YYYY-MM-DD) of an analysis, or None if undated"""
+    day = (analysis.get("date") or "")[:10]
+    try:
+        datetime.strptime(day, "%Y-%m-%d")
+    except ValueError:
+        return None
+    return day
+
+def analysis_week(day):
+    """ISO week label (e.g. 2025-W12) for a day"""
+    year, week, _ = datetime.strptime(day, "%Y-%m-%d").isocalendar()
+    return f"{year}-W{week:02d}"
+
+def compute_aggregates(analyses):
+    """Aggregates computed from scratch, in the same shape as AnalysisStats.snapshot()"""
+    types, keywords, pairs, daily, weekly = Counter(), Counter(), Counter(), Counter(), Counter()
+    total = 0
+    for analysis in analyses:
+        total += 1
+        types[analysis.get("type", "unknown")] += 1
+        analysis_keywords = normalize_keywords(analysis.get("keywords", []))
+        keywords.update(analysis_keywords)
+        pairs.update(itertools.combinations(analysis_keywords, 2))
+        day = analysis_day(analysis)
+        if day:
+            daily[day] += 1
+            weekly[analysis_week(day)] += 1
+    return {"total": total, "types": dict(types), "keywords": dict(keywords), "pairs": dict(pairs),
+            "daily": dict(daily), "weekly": dict(weekly)}
+
+
+class AnalysisStats:
+    """Counts by type, keyword frequencies, co-occurrence and time series in SQLite
+
+    record() and remove() apply one analysis as a delta, so reading the
+    statistics never scans the analysis store. Each analysis id is applied
+    at most once; rebuild() recomputes everything from the store and
+    check() compares the running totals against a fresh count.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("ANALYSIS_STATS_PATH", "analysis_stats.db")
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS applied (id TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS type_counts (type TEXT PRIMARY KEY, count INTEGER);
+            CREATE TABLE IF NOT EXISTS keyword_counts (keyword TEXT PRIMARY KEY, count INTEGER);
+            CREATE TABLE IF NOT EXISTS keyword_pairs (a TEXT, b TEXT, count INTEGER, PRIMARY KEY (a, b));
+            CREATE TABLE IF NOT EXISTS daily_counts (day TEXT PRIMARY KEY, count INTEGER);
+            CREATE TABLE IF NOT EXISTS weekly_counts (week TEXT PRIMARY KEY, count INTEGER);
+            CREATE INDEX IF NOT EXISTS keyword_counts_count ON keyword_counts (count);
+            CREATE INDEX IF NOT EXISTS keyword_pairs_count ON keyword_pairs (count);
+        """)
+        self.conn.commit()
+
+    def _bump(self, table, key_columns, keys, delta):
+        columns = ", ".join(key_columns)
+        placeholders = ", ".join("?" for _ in key_columns)
+        conflict = f"ON CONFLICT ({columns}) DO UPDATE SET count = count + excluded.count"
+        self.conn.execute(f"INSERT INTO {table} ({columns}, count) VALUES ({placeholders}, ?) {conflict}",
+                          (*keys, delta))
+
+    def _apply(self, analysis, delta):
+        keywords = normalize_keywords(analysis.get("keywords", []))
+        self._bump("type_counts", ["type"], [analysis.get("type", "unknown")], delta)
+        for keyword in keywords:
+            self._bump("keyword_counts", ["keyword"], [keyword], delta)
+        for a, b in itertools.combinations(keywords, 2):
+            self._bump("keyword_pairs", ["a", "b"], [a, b], delta)
+        day = analysis_day(analysis)
+        if day:
+            self._bump("daily_counts", ["day"], [day], delta)
+            self._bump("weekly_counts", ["week"], [analysis_week(day)], delta)
+
+    def record(self, analysis, commit=True):
+        """Add one saved analysis to the aggregates; returns False if already counted"""
+        with self._lock:
+            cursor = self.conn.execute("INSERT OR IGNORE INTO applied (id) VALUES (?)", (analysis["id"],))
+            if cursor.rowcount == 0:
+                return False
+            self._apply(analysis, 1)
+            if commit:
+                self.conn.commit()
+            return True
+
+    def remove(self, analysis):
+        """Take a deleted analysis back out of the aggregates"""
+        with self._lock:
+            cursor = self.conn.execute("DELETE FROM applied WHERE id = ?", (analysis["id"],))
+            if cursor.rowcount == 0:
+                return False
+            self._apply(analysis, -1)
+            for table in ("type_counts", "keyword_counts", "keyword_pairs", "daily_counts", "weekly_counts"):
+                self.conn.execute(f"DELETE FROM {table} WHERE count <= 0")
+            self.conn.commit()
+            return True
+
+    def rebuild(self, analyses):
+        """Recompute every aggregate from scratch; returns the number of analyses"""
+        with self._lock:
+            for table in ("applied", "type_counts", "keyword_counts", "keyword_pairs",
+                          "daily_counts", "weekly_counts"):
+                self.conn.execute(f"DELETE FROM {table}")
+            count = sum(1 for analysis in analyses if self.record(analysis, commit=False))
+            self.conn.commit()
+            return count
+
+    def total(self):
+        """Number of analyses counted (summed over the handful of types, not the id table)"""
+        return self.conn.execute("SELECT COALESCE(SUM(count), 0) FROM type_counts").fetchone()[0]
+
+    def snapshot(self):
+        """Every aggregate as plain dicts (for consistency checks)"""
+        with self._lock:
+            def table(sql):
+                return {tuple(row[:-1]) if len(row) > 2 else row[0]: row[-1] for row in self.conn.execute(sql)}
+            return {
+                "total": self.total(),
+                "types": table("SELECT type, count FROM type_counts"),
+                "keywords": table("SELECT keyword, count FROM keyword_counts"),
+                "pairs": table("SELECT a, b, count FROM keyword_pairs"),
+                "daily": table("SELECT day, count FROM daily_counts"),
+                "weekly": table("SELECT week, count FROM weekly_counts"),
+            }
+
+    def check(self, analyses):
+        """Compare running aggregates with a fresh count; returns a list of mismatches"""
+        expected = compute_aggregates(analyses)
+        actual = self.snapshot()
+        problems = []
+        if expected["total"] != actual["total"]:
+            problems.append(f"total: expected {expected['total']}, found {actual['total']}")
+        for name in ("types", "keywords", "pairs", "daily", "weekly"):
+            for key in set(expected[name]) | set(actual[name]):
+                if expected[name].get(key, 0) != actual[name].get(key, 0):
+                    problems.append(f"{name}[{key}]: expected {expected[name].get(key, 0)}, "
+                                    f"found {actual[name].get(key, 0)}")
+        return problems
+
+    def top_keywords(self, limit=None):
+        """(keyword, count) pairs, most frequent first"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT keyword, count FROM keyword_counts ORDER BY count DESC, keyword LIMIT ?",
+                (-1 if limit is None else limit,)
+            ).fetchall()
+
+    def summary(self, top=20, days=30, weeks=12):
+        """Report-sized view: totals, top keywords and pairs, recent time series"""
+        with self._lock:
+            total = self.total()
+            return {
+                "total": total,
+                "types": self.conn.execute("SELECT type, count FROM type_counts ORDER BY count DESC").fetchall(),
+                "keywords": self.top_keywords(top),
+                "pairs": self.conn.execute(
+                    "SELECT a, b, count FROM keyword_pairs ORDER BY count DESC, a, b LIMIT ?", (top // 2,)
+                ).fetchall(),
+                "daily": self.conn.execute(
+                    "SELECT day, count FROM daily_counts ORDER BY day DESC LIMIT ?", (days,)
+                ).fetchall()[::-1],
+                "weekly": self.conn.execute(
+                    "SELECT week, count FROM weekly_counts ORDER BY week DESC LIMIT ?", (weeks,)
+                ).fetchall()[::-1],
+            }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_default_stats = None
+_default_lock = threading.Lock()
+
+def get_analysis_stats():
+    """Get the shared statistics aggregates"""
+    global _default_stats
+    with _default_lock:
+        if _default_stats is None:
+            _default_stats = AnalysisStats()
+        return _default_stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from utils_simple import get_all_analyses
+
+    parser = argparse.ArgumentParser(description="Maintain the analysis statistics aggregates")
+    parser.add_argument("command", choices=["rebuild", "check", "show"])
+    args = parser.parse_args()
+
+    stats = get_analysis_stats()
+    if args.command == "rebuild":
+        start = time.time()
+        count = stats.rebuild(get_all_analyses())
+        print(f"Rebuilt aggregates from {count} analyses in {time.time() - start:.1f}s")
+    elif args.command == "check":
+        problems = stats.check(get_all_analyses())
+        for problem in problems[:50]:
+            print(problem)
+        print("OK" if not problems else f"{len(problems)} mismatches; run 'rebuild' to repair")
+        raise SystemExit(1 if problems else 0)
+    else:
+        for key, value in stats.summary().items():
+            print(f"{key}: {value}")
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# Cache of AI answers to repeated questions about the same context
+def normalize_question(question):
+    """Lowercase, drop punctuation and collapse whitespace, so trivial rewordings share an entry"""
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+# Words that flip or redirect a question while barely moving its embedding;
+# a near-duplicate must use exactly the same ones
+NEGATION_WORDS = {"no", "not", "never", "none", "nothing", "nor", "neither", "without", "cannot", "absent"}
+QUESTION_WORDS = {"what", "which", "who", "whom", "whose", "when", "where", "why", "how"}
+
+def question_signature(question):
+    """Sorted negation and question words of a question (n't counts as not)"""
+    words = re.sub(r"(\w)n t\b", r"\1 not", normalize_question(question)).split()
+    return sorted(word for word in words if word in NEGATION_WORDS or word in QUESTION_WORDS)
+
+def content_version(*parts):
+    """Short hash of the text an answer was based on; changes whenever that text does"""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+class AnswerCache:
+    """Answers keyed by normalized question, context ids and versions, model and prompt version
+
+    Entries live in SQLite with a TTL and LRU eviction. Each answer records
+    the analyses it was based on, so invalidate_analysis() drops them when
+    an analysis changes or is removed (a changed analysis also changes its
+    version, so stale entries could never be hit anyway). With an `embed`
+    function and `similarity` set, a question that misses exactly is
+    matched against cached questions for the same context by cosine
+    similarity of their embeddings (only those from the same embedder and
+    with the same negation and question words, see question_signature).
+    """
+
+    def __init__(self, path=None, ttl=None, max_entries=None, similarity=None):
+        self.path = path or os.environ.get("ANSWER_CACHE_PATH", "answer_cache.db")
+        self.ttl = ttl if ttl is not None else int(os.environ.get("ANSWER_CACHE_TTL", 7 * 24 * 3600))
+        self.max_entries = max_entries or int(os.environ.get("ANSWER_CACHE_MAX", 5000))
+        self.similarity = float(similarity if similarity is not None else os.environ.get("ANSWER_CACHE_SIMILARITY", 0.95))
+        self._lock = threading.RLock()
+        self._counts = {"hits": 0, "near_hits": 0, "misses": 0}
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                question TEXT,
+                answer TEXT,
+                embedding BLOB,
+                embedder TEXT,
+                created_at REAL,
+                last_access REAL
+            );
+            CREATE INDEX IF NOT EXISTS answers_scope ON answers (scope);
+            CREATE INDEX IF NOT EXISTS answers_access ON answers (last_access);
+            CREATE TABLE IF NOT EXISTS answer_sources (
+                key TEXT NOT NULL,
+                analysis_id TEXT NOT NULL,
+                PRIMARY KEY (analysis_id, key)
+            );
+        """)
+        # Caches created before embeddings were tagged with their provider
+        if "embedder" not in [row[1] for row in self.conn.execute("PRAGMA table_info(answers)")]:
+            self.conn.execute("ALTER TABLE answers ADD COLUMN embedder TEXT")
+        self.conn.commit()
+
+    @staticmethod
+    def make_scope(context, model, prompt_version):
+        """Everything but the question: sorted (id, version) context pairs, the model and the prompt version"""
+        pairs = sorted(f"{context_id}@{version}" for context_id, version in context)
+        return hashlib.sha1(f"{model}|{prompt_version}|{','.join(pairs)}".encode()).hexdigest()
+
+    @staticmethod
+    def make_key(question, scope):
+        return hashlib.sha1(f"{scope}|{normalize_question(question)}".encode()).hexdigest()
+
+    def _embedding(self, embed, question):
+        if embed is None or not self.similarity:
+            return None
+        try:
+            vector = embed(normalize_question(question))
+        except Exception as e:
+            print(f"Error embedding question for the answer cache: {e}")
+            return None
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def get(self, question, context, model, prompt_version, embed=None, embedder_name=""):
+        """Look up an answer; returns (answer or None, question embedding) so a miss can pass the embedding to put()"""
+        scope = self.make_scope(context, model, prompt_version)
+        key = self.make_key(question, scope)
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT answer, created_at FROM answers WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self.conn.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+                self._counts["hits"] += 1
+                return row[0], None
+
+        # Near-duplicates: only among answers for exactly the same context, model and prompt
+        embedding = self._embedding(embed, question)
+        if embedding is not None:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT key, answer, embedding, question FROM answers "
+                    "WHERE scope = ? AND embedder = ? AND embedding IS NOT NULL AND created_at >= ?",
+                    (scope, embedder_name, now - self.ttl)
+                ).fetchall()
+                signature = question_signature(question)
+                candidates = [row for row in rows
+                              if len(row[2]) == embedding.nbytes and question_signature(row[3]) == signature]
+                if candidates:
+                    matrix = np.frombuffer(b"".join(row[2] for row in candidates), dtype=np.float32).reshape(len(candidates), -1)
+                    scores = matrix @ embedding
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity:
+                        self.conn.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, candidates[best][0]))
+                        self.conn.commit()
+                        self._counts["near_hits"] += 1
+                        return candidates[best][1], embedding
+
+        with self._lock:
+            self._counts["misses"] += 1
+        return None, embedding
+
+    def put(self, question, context, model, prompt_version, answer, embedding=None, analysis_ids=(), embedder_name=""):
+        """Store an answer and the analyses it depends on, evicting expired and least recently used entries"""
+        scope = self.make_scope(context, model, prompt_version)
+        key = self.make_key(question, scope)
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO answers (key, scope, question, answer, embedding, embedder, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, normalize_question(question), answer,
+                 embedding.astype(np.float32).tobytes() if embedding is not None else None, embedder_name, now, now)
+            )
+            self.conn.executemany("INSERT OR IGNORE INTO answer_sources (key, analysis_id) VALUES (?, ?)",
+                                  ((key, analysis_id) for analysis_id in set(analysis_ids)))
+
+            # Drop expired entries first, then the least recently used
+            evicted = [row[0] for row in self.conn.execute("SELECT key FROM answers WHERE created_at < ?", (now - self.ttl,))]
+            excess = self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - len(evicted) - self.max_entries
+            if excess > 0:
+                evicted += [row[0] for row in self.conn.execute(
+                    "SELECT key FROM answers WHERE created_at >= ? ORDER BY last_access LIMIT ?", (now - self.ttl, excess)
+                )]
+            self._delete(evicted)
+            self.conn.commit()
+
+    def _delete(self, keys):
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            self.conn.execute(f"DELETE FROM answers WHERE key IN ({placeholders})", chunk)
+            self.conn.execute(f"DELETE FROM answer_sources WHERE key IN ({placeholders})", chunk)
+
+    def invalidate_analysis(self, analysis_id):
+        """Drop every answer based on an analysis; returns the number removed"""
+        with self._lock:
+            keys = [row[0] for row in self.conn.execute(
+                "SELECT key FROM answer_sources WHERE analysis_id = ?", (analysis_id,)
+            )]
+            self._delete(keys)
+            self.conn.commit()
+            return len(keys)
+
+    def clear(self):
+        """Remove every cached answer and reset the counters"""
+        with self._lock:
+            self.conn.execute("DELETE FROM answers")
+            self.conn.execute("DELETE FROM answer_sources")
+            self.conn.commit()
+            self._counts = {"hits": 0, "near_hits": 0, "misses": 0}
+
+    def stats(self):
+        """Entries, hits (exact and near-duplicate) and misses since start"""
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            return dict(self._counts, entries=entries, max_entries=self.max_entries, ttl=self.ttl,
+                        similarity=self.similarity)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_answer_cache():
+    """Get the shared answer cache"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = AnswerCache()
+        return _default_cache
@@ -4,20 +4,32 @@ import io
 from PIL import Image
 from datetime import datetime
 import json
-import base64
+import numpy as np
 from utils_simple import (
-    process_file, 
     analyze_image, 
-    generate_heatmap, 
     save_analysis,
     get_latest_analyses, 
-    generate_report,
-    search_pubmed,
-    generate_statistics_report
+    get_all_analyses,
+    get_analysis_by_id,
+    search_analyses,
+    attach_artifact
+)
+from app_cache import (
+    cached_process_file,
+    cached_generate_heatmap_bytes,
+    cached_search_pubmed,
+    get_shared_qa_chat,
+    render_cache_stats,
+    render_storage_status,
+    render_report_download,
+    render_statistics_download,
+    render_download
 )
 from chat_system import render_chat_interface, create_manual_chat_room
-from report_qa_chat import ReportQASystem, ReportQAChat
 from qa_interface import render_qa_chat_interface
+from report_export import filter_analyses, export_reports, default_export_path
+from heatmap_engine import COLORMAPS, encode_image
+from occlusion_xai import OcclusionExplainer, OpenAIAnalysisModel, generate_occlusion_heatmap
 
 # Set page configuration
 st.set_page_config(
@@ -63,6 +75,14 @@ with st.sidebar:
     # Explainable AI options
     st.subheader("Analysis Options")
     enable_xai = st.checkbox("Enable Explainable AI", value=True)
+    if enable_xai:
+        xai_method = st.radio(
+            "XAI Method",
+            options=["Intensity map", "Occlusion sensitivity"],
+            help="Occlusion sensitivity re-queries the model with regions masked out; it is slower and uses more API calls"
+        )
+        heatmap_colormap = st.selectbox("Heatmap Colormap", options=list(COLORMAPS.keys()))
+        heatmap_alpha = st.slider("Heatmap Opacity", min_value=0.0, max_value=1.0, value=0.5, step=0.05)
     include_references = st.checkbox("Include Medical References", value=True)
     
     # Recent analyses
@@ -71,14 +91,15 @@ with st.sidebar:
     for analysis in recent_analyses:
         st.caption(f"{analysis.get('filename', 'Unknown')} - {analysis.get('date', '')[:10]}")
     
-    # Statistics report
-    if st.button("Generate Statistics Report"):
-        stats_report = generate_statistics_report()
-        if stats_report:
-            # Create download link
-            b64_pdf = base64.b64encode(stats_report.read()).decode()
-            href = f'&lt;a href="data:application/pdf;base64,{b64_pdf}" download="statistics_report.pdf">Download Statistics Report&lt;/a>'
-            st.markdown(href, unsafe_allow_html=True)
+    # Cache hit rates
+    render_cache_stats()
+    
+    # Hot store and archive sizes
+    render_storage_status()
+    
+    # Statistics report (built when the download is clicked)
+    if recent_analyses:
+        render_statistics_download("Download Statistics Report", key="sidebar_statistics")
 
 # Main content area - tabbed interface
 tab1, tab2, tab3, tab4 = st.tabs(["Image Upload & Analysis", "Collaboration", "Report Q&A", "Reports"])
@@ -93,15 +114,17 @@ with tab1:
     if uploaded_file:
         # Process the file
         try:
-            file_data = process_file(uploaded_file)
+            # Decoded once per upload content; the session keeps a memory-mapped handle
+            file_data = cached_process_file(uploaded_file)
             
             if file_data:
+                image_hashes = {"image_hash": file_data.image_hash, "pixels_hash": file_data.pixels_hash}
                 st.session_state.file_data = file_data
                 st.session_state.file_name = uploaded_file.name
                 st.session_state.file_type = file_data["type"]
                 
                 # Display the image
-                st.image(file_data["data"], caption=f"Uploaded {file_data['type']} image", use_column_width=True)
+                st.image(file_data["data"], caption=f"Uploaded {file_data['type']} image", width="stretch")
                 
                 # Analysis button
                 if st.button("Analyze Image") and st.session_state.openai_key:
@@ -114,7 +137,12 @@ with tab1:
                         )
                         
                         # Store the analysis
-                        analysis_results = save_analysis(analysis_results, filename=uploaded_file.name)
+                        analysis_results = save_analysis(
+                            analysis_results,
+                            filename=uploaded_file.name,
+                            image_hashes=image_hashes,
+                            analysis_type=file_data["type"]
+                        )
                         
                         # Update session state
                         st.session_state.analysis_results = analysis_results
@@ -138,28 +166,56 @@ with tab1:
                         # Generate heatmap if XAI is enabled
                         if enable_xai:
                             st.subheader("Explainable AI Visualization")
-                            overlay, heatmap = generate_heatmap(file_data["array"])
+                            if xai_method == "Occlusion sensitivity":
+                                # Keep one explainer per API key so its result cache survives reruns
+                                explainer = st.session_state.get("occlusion_explainer")
+                                if explainer is None or explainer.model.api_key != st.session_state.openai_key:
+                                    explainer = OcclusionExplainer(OpenAIAnalysisModel(st.session_state.openai_key))
+                                    st.session_state.occlusion_explainer = explainer
+                                with st.spinner("Computing occlusion sensitivity..."):
+                                    overlay, heatmap, explanation = generate_occlusion_heatmap(
+                                        file_data["array"],
+                                        explainer,
+                                        baseline_analysis=analysis_results["analysis"],
+                                        colormap=heatmap_colormap,
+                                        alpha=heatmap_alpha
+                                    )
+                                st.caption(f"{explanation['queries']} occluded queries, {explanation['cache_hits']} served from cache")
+                                if explanation["failed_queries"]:
+                                    st.warning(f"{explanation['failed_queries']} occluded queries failed and are left out of the map")
+                                artifact_name = "occlusion_overlay"
+                                artifact_hash = attach_artifact(
+                                    analysis_results["id"],
+                                    artifact_name,
+                                    encode_image(np.asarray(overlay), format="webp")
+                                )
+                            else:
+                                overlay, heatmap = cached_generate_heatmap_bytes(
+                                    file_data,
+                                    colormap=heatmap_colormap,
+                                    alpha=heatmap_alpha,
+                                    format="webp"
+                                )
+                                artifact_name = "heatmap_overlay"
+                                artifact_hash = attach_artifact(analysis_results["id"], artifact_name, overlay)
+                            # Keep the in-session copy in step so the report embeds the overlay
+                            if artifact_hash:
+                                analysis_results.setdefault("artifacts", {})[artifact_name] = artifact_hash
                             col1, col2 = st.columns(2)
                             with col1:
-                                st.image(overlay, caption="Heatmap Overlay", use_column_width=True)
+                                st.image(overlay, caption="Heatmap Overlay", width="stretch")
                             with col2:
-                                st.image(heatmap, caption="Raw Heatmap", use_column_width=True)
+                                st.image(heatmap, caption="Raw Heatmap", width="stretch")
                         
                         # Show medical references if enabled
                         if include_references and analysis_results.get("keywords"):
                             st.subheader("Relevant Medical Literature")
-                            references = search_pubmed(analysis_results["keywords"], max_results=3)
+                            references = cached_search_pubmed(analysis_results["keywords"], max_results=3)
                             for ref in references:
                                 st.markdown(f"- **{ref['title']}**  \n{ref['journal']}, {ref['year']} (PMID: {ref['id']})")
                         
-                        # Generate PDF report
-                        st.subheader("Report Generation")
-                        pdf_buffer = generate_report(analysis_results, include_references=include_references)
-                        
-                        # Create download link for the PDF
-                        b64_pdf = base64.b64encode(pdf_buffer.read()).decode()
-                        href = f'&lt;a href="data:application/pdf;base64,{b64_pdf}" download="medical_report_{datetime.now().strftime("%Y%m%d")}.pdf">Download PDF Report&lt;/a>'
-                        st.markdown(href, unsafe_allow_html=True)
+                        # The PDF report is offered below, outside this branch
+                        st.session_state.setdefault("requested_reports", set()).add("current")
                         
                         # Option to start a discussion
                         st.subheader("Collaborate")
@@ -182,7 +238,7 @@ with tab1:
                             if st.button("Start Q&A Session"):
                                 # Create a QA room for this analysis
                                 if "qa_chat" not in st.session_state:
-                                    st.session_state.qa_chat = ReportQAChat()
+                                    st.session_state.qa_chat = get_shared_qa_chat()
                                 
                                 room_name = f"Q&A for {uploaded_file.name}"
                                 created_qa_id = st.session_state.qa_chat.create_qa_room("Dr. Anonymous", room_name)
@@ -191,6 +247,16 @@ with tab1:
                         
                 elif not st.session_state.openai_key:
                     st.warning("Please enter your OpenAI API key in the sidebar to enable analysis")
+                
+                # Generate PDF report; kept out of the button branch so it survives reruns while it renders
+                current_analysis = st.session_state.get("analysis_results")
+                if ("current" in st.session_state.get("requested_reports", ()) and current_analysis
+                        and current_analysis.get("filename") == uploaded_file.name):
+                    st.subheader("Report Generation")
+                    render_report_download(
+                        current_analysis, include_references, "Download PDF Report",
+                        f"medical_report_{datetime.now().strftime('%Y%m%d')}.pdf", key="report_current"
+                    )
             else:
                 st.error("Unable to process the uploaded file")
         except Exception as e:
@@ -209,12 +275,12 @@ with tab1:
         # Generate PDF report for previous analysis
         st.subheader("Report")
         if st.button("Generate PDF Report"):
-            pdf_buffer = generate_report(st.session_state.analysis_results, include_references=include_references)
-            
-            # Create download link for the PDF
-            b64_pdf = base64.b64encode(pdf_buffer.read()).decode()
-            href = f'&lt;a href="data:application/pdf;base64,{b64_pdf}" download="medical_report_{datetime.now().strftime("%Y%m%d")}.pdf">Download PDF Report&lt;/a>'
-            st.markdown(href, unsafe_allow_html=True)
+            st.session_state.setdefault("requested_reports", set()).add("previous")
+        if "previous" in st.session_state.get("requested_reports", ()):
+            render_report_download(
+                st.session_state.analysis_results, include_references, "Download PDF Report",
+                f"medical_report_{datetime.now().strftime('%Y%m%d')}.pdf", key="report_previous"
+            )
 
 with tab2:
     # Render the chat interface for collaboration
@@ -242,6 +308,60 @@ with tab4:
     # Reports and Analytics section
     st.subheader("Medical Reports & Analytics")
     
+    # Search past analyses
+    st.markdown("### Search Analyses")
+    col1, col2, col3 = st.columns([3, 2, 2])
+    with col1:
+        search_query = st.text_input("Search text, findings or keywords", key="search_query",
+                                     placeholder="e.g. pneumothorax")
+    with col2:
+        search_types = st.multiselect("Type", ["image", "dicom", "nifti"], key="search_types")
+    with col3:
+        search_dates = st.date_input("Date range", value=(), key="search_dates")
+    
+    # Start from the first page whenever the search changes
+    search_key = (search_query, tuple(search_types), tuple(search_dates))
+    if st.session_state.get("search_key") != search_key:
+        st.session_state.search_key = search_key
+        st.session_state.search_page = 1
+    
+    if search_query or search_types or search_dates:
+        date_from = search_dates[0] if len(search_dates) > 0 else None
+        date_to = search_dates[1] if len(search_dates) > 1 else date_from
+        found = search_analyses(search_query, types=search_types or None, date_from=date_from,
+                                date_to=date_to, page=st.session_state.search_page, page_size=10)
+        facet_text = " · ".join(f"{name} ({count})" for name, count in found["facets"]["type"])
+        month_text = " · ".join(f"{name} ({count})" for name, count in found["facets"]["month"][:6])
+        st.caption(f"{found['total']} matches. Types: {facet_text or '-'}. Months: {month_text or '-'}")
+        
+        for result in found["results"]:
+            with st.expander(f"{result['filename']} - {result['date'][:10]} ({result['type']})"):
+                st.markdown(result["snippet"])
+                if result["keywords"]:
+                    st.caption("Keywords: " + ", ".join(result["keywords"]))
+                if st.button("Generate Report", key=f"search_report_{result['id']}"):
+                    st.session_state.setdefault("requested_reports", set()).add(result["id"])
+                if result["id"] in st.session_state.get("requested_reports", ()):
+                    full_analysis = get_analysis_by_id(result["id"])
+                    if full_analysis:
+                        render_report_download(
+                            full_analysis, include_references, "Download Report",
+                            f"report_{result['id'][:8]}.pdf", key=f"search_{result['id']}"
+                        )
+        
+        # Pager
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("Previous", disabled=found["page"] <= 1, key="search_prev"):
+                st.session_state.search_page -= 1
+                st.rerun()
+        with col2:
+            st.caption(f"Page {found['page']} of {found['pages']}")
+        with col3:
+            if st.button("Next", disabled=found["page"] >= found["pages"], key="search_next"):
+                st.session_state.search_page += 1
+                st.rerun()
+    
     # Analysis history
     st.markdown("### Analysis History")
     recent_analyses = get_latest_analyses(limit=10)
@@ -260,21 +380,22 @@ with tab4:
                 
                 # Generate individual report
                 with col1:
+                    report_id = analysis.get("id", "unknown")
                     if st.button(f"Generate Report #{idx}"):
-                        pdf_buffer = generate_report(analysis, include_references=include_references)
-                        
-                        # Create download link
-                        b64_pdf = base64.b64encode(pdf_buffer.read()).decode()
-                        report_name = f"report_{analysis.get('id', 'unknown')[:8]}.pdf"
-                        href = f'&lt;a href="data:application/pdf;base64,{b64_pdf}" download="{report_name}">Download Report&lt;/a>'
-                        st.markdown(href, unsafe_allow_html=True)
+                        st.session_state.setdefault("requested_reports", set()).add(report_id)
+                    if report_id in st.session_state.get("requested_reports", ()):
+                        # Rendered in the background; cached PDFs come back at once
+                        render_report_download(
+                            analysis, include_references, "Download Report",
+                            f"report_{report_id[:8]}.pdf", key=f"report_{idx}"
+                        )
                 
                 # Ask questions about this report
                 with col2:
                     if st.button(f"Q&A on Report #{idx}"):
                         # Create a QA room specifically for this report
                         if "qa_chat" not in st.session_state:
-                            st.session_state.qa_chat = ReportQAChat()
+                            st.session_state.qa_chat = get_shared_qa_chat()
                         
                         report_name = f"Q&A for {analysis.get('filename', 'Unknown')}"
                         created_qa_id = st.session_state.qa_chat.create_qa_room("Dr. Anonymous", report_name)
@@ -285,14 +406,48 @@ with tab4:
     else:
         st.info("No previous analyses found. Upload and analyze an image to get started.")
     
+    # Bulk export section
+    st.markdown("### Bulk Export")
+    col1, col2 = st.columns(2)
+    with col1:
+        export_from = st.date_input("From", value=datetime.now().date().replace(day=1), key="export_from")
+        export_keyword = st.text_input("Keyword", key="export_keyword")
+    with col2:
+        export_to = st.date_input("To", value=datetime.now().date(), key="export_to")
+        export_type = st.selectbox("Type", ["All", "image", "dicom", "nifti"], key="export_type")
+    
+    if st.button("Export Reports to Zip"):
+        selected = list(filter_analyses(
+            get_all_analyses(export_from.isoformat(), export_to.isoformat()), export_from.isoformat(), export_to.isoformat(),
+            export_keyword or None, None if export_type == "All" else export_type
+        ))
+        if not selected:
+            st.info("No analyses match this filter.")
+        else:
+            progress_bar = st.progress(0.0)
+            progress_text = st.empty()
+            
+            def show_progress(done, total, pages, elapsed):
+                progress_bar.progress(done / total)
+                progress_text.caption(f"{done}/{total} reports, {pages / elapsed if elapsed else 0:.1f} pages/s")
+            
+            summary = export_reports(default_export_path(), selected,
+                                     include_references=include_references, progress=show_progress)
+            st.session_state.last_export = summary
+    
+    if st.session_state.get("last_export") and os.path.exists(st.session_state.last_export["path"]):
+        summary = st.session_state.last_export
+        st.caption(
+            f"{summary['reports']} reports, {summary['pages']} pages in {summary['seconds']:.1f}s "
+            f"({summary['pages_per_second']:.1f} pages/s), {len(summary['failed'])} failed"
+        )
+        export_path = summary["path"]
+        render_download("Download Export", None, os.path.basename(export_path),
+                        mime="application/zip", key="export_download", path=export_path)
+    
     # Statistics section
     st.markdown("### Statistics")
     
     # Generate statistics report
-    if st.button("Generate Comprehensive Statistics"):
-        stats_report = generate_statistics_report()
-        if stats_report:
-            # Create download link
-            b64_pdf = base64.b64encode(stats_report.read()).decode()
-            href = f'&lt;a href="data:application/pdf;base64,{b64_pdf}" download="statistics_report.pdf">Download Statistics Report&lt;/a>'
-            st.markdown(href, unsafe_allow_html=True)
+    if recent_analyses:
+        render_statistics_download("Generate Comprehensive Statistics", key="reports_statistics")
@@ -0,0 +1,259 @@
+import hashlib
+import io
+import os
+import threading
+import streamlit as st
+from utils_simple import (
+    process_file,
+    persist_image,
+    load_processed_image,
+    generate_heatmap_bytes,
+    generate_statistics_report,
+    search_pubmed,
+    placeholder_publications,
+    LiteratureUnavailable
+)
+from blob_store import get_blob_store
+from report_qa_chat import ReportQAChat
+from report_jobs import get_report_renderer
+from download_server import get_download_server
+from retention import get_retention_manager, store_sizes
+from answer_cache import get_answer_cache
+
+# Cache sizes and TTLs (seconds); override with e.g. APP_CACHE_TTL_SEARCH_PUBMED=600
+CACHE_DEFAULTS = {
+    "process_file": {"ttl": 3600, "max_entries": 64},
+    "generate_heatmap": {"ttl": 3600, "max_entries": 128},
+    "generate_statistics_report": {"ttl": 300, "max_entries": 4},
+    "search_pubmed": {"ttl": 86400, "max_entries": 512},
+}
+
+def cache_settings(name):
+    """Get the TTL and size for a cached function, applying env overrides"""
+    settings = dict(CACHE_DEFAULTS[name])
+    for key, env_name in (("ttl", "TTL"), ("max_entries", "MAX")):
+        value = os.environ.get(f"APP_CACHE_{env_name}_{name.upper()}")
+        if value:
+            settings[key] = int(value)
+    return settings
+
+# Seconds between checks on a report still rendering in the background
+REPORT_POLL_SECONDS = float(os.environ.get("REPORT_POLL_SECONDS", 1.0))
+
+# Hit/miss counters, shared by every session in this server process
+_stats = {name: {"calls": 0, "misses": 0} for name in CACHE_DEFAULTS}
+_stats_lock = threading.Lock()
+
+def _record(name, field):
+    with _stats_lock:
+        _stats[name][field] += 1
+
+def get_cache_stats():
+    """Get calls, hits, misses and hit rate for every cached function"""
+    with _stats_lock:
+        rows = []
+        for name, counts in _stats.items():
+            hits = counts["calls"] - counts["misses"]
+            rows.append({
+                "function": name,
+                "calls": counts["calls"],
+                "hits": hits,
+                "misses": counts["misses"],
+                "hit_rate": hits / counts["calls"] if counts["calls"] else 0.0
+            })
+        return rows
+
+def clear_caches():
+    """Drop every memoized result and reset the counters"""
+    for cached in (_decode_upload, _heatmap_bytes, _statistics_bytes, _pubmed_results):
+        cached.clear()
+    get_answer_cache().clear()
+    with _stats_lock:
+        for counts in _stats.values():
+            counts["calls"] = counts["misses"] = 0
+
+
+# Memoized pure functions (keyed by content)
+# Bumped when an upload's cached decode points at a garbage-collected blob
+_decode_generations = {}
+_decode_lock = threading.Lock()
+
+@st.cache_data(show_spinner=False, **cache_settings("process_file"))
+def _decode_upload(upload_hash, filename, generation, _file_bytes):
+    _record("process_file", "misses")
+    upload = io.BytesIO(_file_bytes)
+    upload.name = filename
+    processed = process_file(upload)
+    if processed is None:
+        return None
+    return {"type": processed.type, **persist_image(_file_bytes, processed)}
+
+def cached_process_file(uploaded_file):
+    """Decode an upload once per content; returns a memory-mapped ProcessedImage"""
+    _record("process_file", "calls")
+    file_bytes = uploaded_file.getvalue()
+    upload_hash = hashlib.sha256(file_bytes).hexdigest()
+    meta = _decode_upload(upload_hash, uploaded_file.name, _decode_generations.get(upload_hash, 0), file_bytes)
+    if meta is None:
+        return None
+    if not get_blob_store().exists(meta["pixels_hash"]):
+        # The blob was garbage-collected underneath this upload's entry; other entries stay cached
+        with _decode_lock:
+            generation = _decode_generations[upload_hash] = _decode_generations.get(upload_hash, 0) + 1
+        meta = _decode_upload(upload_hash, uploaded_file.name, generation, file_bytes)
+    return load_processed_image(meta["type"], meta["pixels_hash"], image_hash=meta["image_hash"])
+
+@st.cache_data(show_spinner=False, **cache_settings("generate_heatmap"))
+def _heatmap_bytes(pixels_hash, colormap, alpha, format):
+    _record("generate_heatmap", "misses")
+    image = load_processed_image(None, pixels_hash)
+    return generate_heatmap_bytes(image.array, colormap=colormap, alpha=alpha, format=format)
+
+def cached_generate_heatmap_bytes(processed_image, colormap="jet", alpha=0.5, format="png"):
+    """Heatmap bytes for a stored image, memoized by pixel hash and parameters"""
+    _record("generate_heatmap", "calls")
+    return _heatmap_bytes(processed_image.pixels_hash, colormap, alpha, format)
+
+@st.cache_data(show_spinner=False, **cache_settings("generate_statistics_report"))
+def _statistics_bytes(store_version):
+    _record("generate_statistics_report", "misses")
+    report = generate_statistics_report()
+    return report.getvalue() if report else None
+
+def cached_generate_statistics_report():
+    """Statistics PDF, rebuilt only when the analysis store changes"""
+    _record("generate_statistics_report", "calls")
+    store_version = None
+    if os.path.exists("analysis_store.json"):
+        stat = os.stat("analysis_store.json")
+        store_version = (stat.st_mtime_ns, stat.st_size)
+    report = _statistics_bytes(store_version)
+    return io.BytesIO(report) if report else None
+
+@st.cache_data(show_spinner=False, **cache_settings("search_pubmed"))
+def _pubmed_results(keywords, max_results):
+    _record("search_pubmed", "misses")
+    # A failed lookup raises, and Streamlit doesn't cache exceptions
+    return search_pubmed(list(keywords), max_results=max_results, placeholders=False)
+
+def cached_search_pubmed(keywords, max_results=5):
+    """PubMed results memoized by keyword set and result count (placeholders after a failure are not)"""
+    _record("search_pubmed", "calls")
+    try:
+        return _pubmed_results(tuple(keywords), max_results)
+    except LiteratureUnavailable:
+        return placeholder_publications(keywords, max_results)
+
+
+# Long-lived shared resources
+@st.cache_resource
+def get_shared_qa_chat():
+    """One QA chat store for every session, so rooms are never stale"""
+    return ReportQAChat()
+
+@st.cache_resource
+def get_shared_report_renderer():
+    """Background report renderer (process pool + PDF cache) for every session"""
+    return get_report_renderer()
+
+@st.cache_resource
+def get_shared_retention_manager():
+    """Retention manager shared by sessions; its periodic compaction thread starts once per server when enabled"""
+    manager = get_retention_manager()
+    if manager.background:
+        manager.start()
+    return manager
+
+
+def render_download(label, data, file_name, mime="application/pdf", key=None, blob_hash=None, path=None):
+    """Download control that only sends the file when clicked
+
+    Blobs and export files go through the signed, range-capable download
+    server when it is enabled; otherwise `data` (bytes or a callable
+    returning bytes) is fetched lazily by Streamlit's deferred download.
+    """
+    server = get_download_server()
+    if server is not None and blob_hash:
+        st.link_button(label, server.url_for_blob(blob_hash, file_name))
+    elif server is not None and path:
+        st.link_button(label, server.url_for_export(path, file_name))
+    else:
+        if data is None and path:
+            def data():
+                with open(path, "rb") as f:
+                    return f.read()
+        st.download_button(label, data=data, file_name=file_name, mime=mime, key=key, on_click="ignore")
+
+def render_report_download(analysis, include_references, label, filename, key):
+    """Start (or reuse) a background report render and offer the download once ready"""
+    renderer = get_shared_report_renderer()
+    job = renderer.submit(analysis, include_references)
+    if job.state == "running":
+        _render_report_status(job)
+        return
+    if job.state == "error":
+        st.error(f"Error generating report: {job.error}")
+        return
+    render_download(label, lambda: renderer.cache.get(job.key) or job.result(), filename,
+                    key=f"{key}_download", blob_hash=renderer.cache.blob_for(job.key))
+
+@st.fragment(run_every=REPORT_POLL_SECONDS)
+def _render_report_status(job):
+    """Placeholder that re-checks a running render on its own, then redraws the page once it finishes"""
+    if job.state != "running":
+        st.rerun(scope="app")
+    st.info("Rendering report in the background...")
+
+def render_statistics_download(label="Download Statistics Report", key=None):
+    """Deferred statistics report download; the PDF is built only on click"""
+    def build():
+        report = cached_generate_statistics_report()
+        return report.getvalue() if report else b""
+    render_download(label, build, "statistics_report.pdf", key=key)
+
+def render_cache_stats():
+    """Show cache hit rates in the sidebar"""
+    with st.expander("Cache Statistics"):
+        for row in get_cache_stats():
+            st.caption(
+                f"{row['function']}: {row['hits']}/{row['calls']} hits "
+                f"({row['hit_rate']:.0%}), {row['misses']} misses"
+            )
+        report_stats = get_shared_report_renderer().stats()
+        st.caption(
+            f"reports: {report_stats['cache_hits']} cached, {report_stats['cache_misses']} rendered, "
+            f"{report_stats['running']} running"
+        )
+        answer_stats = get_answer_cache().stats()
+        st.caption(
+            f"AI answers: {answer_stats['hits']} cached, {answer_stats['near_hits']} near-duplicate, "
+            f"{answer_stats['misses']} generated ({answer_stats['entries']} stored)"
+        )
+        if st.button("Clear Caches"):
+            clear_caches()
+            st.rerun()
+
+def render_storage_status():
+    """Show hot store and archive sizes, with a button to compact now"""
+    manager = get_shared_retention_manager()
+    with st.expander("Storage"):
+        sizes = store_sizes()
+        st.caption(
+            f"analyses: {sizes['analysis_store_bytes'] / 1e6:.1f} MB hot, "
+            f"{sizes['archived_analyses']} archived; chat: {sizes['chat_store_bytes'] / 1e6:.1f} MB hot, "
+            f"{sizes['archived_rooms']} rooms archived; archive {sizes['archive_bytes'] / 1e6:.1f} MB"
+        )
+        schedule = f"every {manager.interval // 3600}h" if manager.background else "on demand"
+        st.caption(f"Keeping {manager.hot_days} days hot; compaction {schedule}")
+        if manager.last_run:
+            last = manager.last_run
+            st.caption(
+                f"Last compaction {last['finished_at'][:16]}: {last['archived_analyses']} analyses, "
+                f"{last['archived_rooms']} rooms archived; latest analyses read "
+                f"{last['before']['latest_analyses_ms']:.1f} → {last['after']['latest_analyses_ms']:.1f} ms"
+            )
+        if manager.running():
+            st.caption("Compaction running…")
+        elif st.button("Compact Now"):
+            manager.run_async()
+            st.rerun()
@@ -0,0 +1,191 @@
+import gzip
+import heapq
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+# Immutable, compressed archive segments for records moved out of the hot stores
+class ArchiveStore:
+    """Gzipped JSON-lines segments with a manifest of their date ranges
+
+    Each segment holds one kind of record (e.g. "analyses" or "rooms"),
+    sorted by its date field, and is never modified once written. The
+    manifest records every segment's first and last date, so range queries
+    only open the segments that overlap.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.environ.get("ARCHIVE_DIR", "archive")
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # Manifest
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        return {"segments": []}
+
+    def _save_manifest(self, manifest):
+        temp_path = f"{self.manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(temp_path, self.manifest_path)
+
+    def segments(self, kind, date_from=None, date_to=None):
+        """Manifest entries for a kind overlapping a date range, newest first"""
+        with self._lock:
+            entries = [entry for entry in self._load_manifest()["segments"] if entry["kind"] == kind]
+        if date_from:
+            entries = [entry for entry in entries if entry["last"] >= date_from]
+        if date_to:
+            entries = [entry for entry in entries if entry["first"][:len(date_to)] <= date_to]
+        return sorted(entries, key=lambda entry: (entry["last"], entry["name"]), reverse=True)
+
+    # Writing
+    def write_segment(self, kind, records, date_key="date", publish=True):
+        """Write records as a new immutable segment; returns its manifest entry
+
+        Records whose id is already archived (e.g. by a pass interrupted
+        before it dropped them from the hot store) are skipped, so no record
+        is ever archived twice. With `publish` False the segment file is
+        written but only listed once publish_segment() is called.
+        """
+        records = sorted(records, key=lambda record: record.get(date_key) or "")
+        if records:
+            archived = self.find_many(kind, [record["id"] for record in records],
+                                      records[0].get(date_key) or None, records[-1].get(date_key) or None)
+            records = [record for record in records if record["id"] not in archived]
+        if not records:
+            return None
+        name = f"{kind}-{records[0].get(date_key, '')[:7] or 'undated'}-{uuid.uuid4().hex[:12]}.jsonl.gz"
+        path = os.path.join(self.root, name)
+        temp_path = f"{path}.tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")))
+                f.write("\n")
+        os.replace(temp_path, path)
+
+        entry = {
+            "kind": kind,
+            "name": name,
+            "date_key": date_key,
+            "count": len(records),
+            "first": records[0].get(date_key) or "",
+            "last": records[-1].get(date_key) or "",
+            "bytes": os.path.getsize(path),
+            "created_at": datetime.now().isoformat(),
+        }
+        if publish:
+            self.publish_segment(entry)
+        return entry
+
+    def publish_segment(self, entry):
+        """List a written segment in the manifest, making its records visible"""
+        with self._lock:
+            manifest = self._load_manifest()
+            manifest["segments"].append(entry)
+            self._save_manifest(manifest)
+
+    def discard_segment(self, entry):
+        """Delete a segment file that was never published"""
+        try:
+            os.remove(os.path.join(self.root, entry["name"]))
+        except FileNotFoundError:
+            pass
+
+    def remove_segment(self, entry):
+        """Drop a segment from the manifest and delete its file"""
+        with self._lock:
+            manifest = self._load_manifest()
+            manifest["segments"] = [item for item in manifest["segments"] if item["name"] != entry["name"]]
+            self._save_manifest(manifest)
+        try:
+            os.remove(os.path.join(self.root, entry["name"]))
+        except FileNotFoundError:
+            pass
+
+    # Reading
+    def read_segment(self, entry):
+        """Yield every record of a segment, oldest first"""
+        with gzip.open(os.path.join(self.root, entry["name"]), "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def iter_records(self, kind, date_from=None, date_to=None):
+        """Yield archived records in a date range (segments newest first)"""
+        for entry in self.segments(kind, date_from, date_to):
+            date_key = entry["date_key"]
+            for record in self.read_segment(entry):
+                value = record.get(date_key) or ""
+                if date_from and value < date_from:
+                    continue
+                if date_to and value[:len(date_to)] > date_to:
+                    continue
+                yield record
+
+    def find(self, kind, record_id):
+        """Look up one archived record by id, or None"""
+        needle = json.dumps(record_id)
+        for entry in self.segments(kind):
+            with gzip.open(os.path.join(self.root, entry["name"]), "rt", encoding="utf-8") as f:
+                for line in f:
+                    # Cheap substring test before parsing each line
+                    if needle in line:
+                        record = json.loads(line)
+                        if record.get("id") == record_id:
+                            return record
+        return None
+
+    def find_many(self, kind, record_ids, date_from=None, date_to=None):
+        """Archived records among `record_ids`, by id, searching only segments overlapping the date range"""
+        wanted = set(record_ids)
+        found = {}
+        for entry in self.segments(kind, date_from, date_to):
+            for record in self.read_segment(entry):
+                if record.get("id") in wanted:
+                    found[record["id"]] = record
+        return found
+
+    def latest(self, kind, limit):
+        """The newest `limit` archived records, newest first"""
+        newest = []
+        for entry in self.segments(kind):
+            # Segments are visited by last date; stop once none can beat the current set
+            if len(newest) >= limit and entry["last"] < newest[0][0]:
+                break
+            for record in self.read_segment(entry):
+                item = (record.get(entry["date_key"]) or "", record["id"], record)
+                if len(newest) < limit:
+                    heapq.heappush(newest, item)
+                elif item[:2] > newest[0][:2]:
+                    heapq.heapreplace(newest, item)
+        return [item[2] for item in sorted(newest, key=lambda item: item[:2], reverse=True)]
+
+    def stats(self):
+        """Segment count, record count and compressed bytes per kind"""
+        summary = {}
+        with self._lock:
+            entries = self._load_manifest()["segments"]
+        for entry in entries:
+            kind = summary.setdefault(entry["kind"], {"segments": 0, "records": 0, "bytes": 0})
+            kind["segments"] += 1
+            kind["records"] += entry["count"]
+            kind["bytes"] += entry["bytes"]
+        return summary
+
+
+_default_archive = None
+_default_lock = threading.Lock()
+
+def get_archive_store():
+    """Get the shared archive store"""
+    global _default_archive
+    with _default_lock:
+        if _default_archive is None:
+            _default_archive = ArchiveStore()
+        return _default_archive
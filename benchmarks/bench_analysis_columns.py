@@ -0,0 +1,112 @@
+"""Query the analysis history from JSON vs the partitioned columnar export.
+
+Writes N synthetic analyses both as analysis_store.json and as month
+partitions of compressed NumPy columns, then times three typical queries:
+type counts for one month, keyword frequencies for one quarter, and mean
+latency of DICOM analyses overall.
+
+Usage: python benchmarks/bench_analysis_columns.py [--records 1000000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from analysis_columns import AnalysisColumns
+
+FINDINGS = ["pneumonia", "pleural effusion", "pulmonary nodule", "cardiomegaly", "atelectasis",
+            "pulmonary edema", "rib fracture", "interstitial fibrosis", "emphysema", "pneumothorax",
+            "consolidation", "ground-glass opacities", "metastasis", "lung mass", "tuberculosis"]
+
+
+def synthetic_analyses(count, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    for i in range(count):
+        keywords = rng.sample(FINDINGS, rng.randint(1, 4))
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "analysis": f"Impression: {', '.join(keywords)}.",
+            "findings": [f"Findings consistent with {keyword}" for keyword in keywords[:2]],
+            "keywords": keywords,
+            "date": (start + timedelta(seconds=rng.randint(0, 86400 * 730))).isoformat(),
+            "type": rng.choice(["image", "image", "dicom", "nifti"]),
+            "filename": f"study_{i}.{rng.choice(['png', 'dcm', 'nii'])}",
+            "latency": round(rng.uniform(2, 12), 3),
+        }
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def json_queries(path):
+    with open(path, "r") as f:
+        analyses = json.load(f)["analyses"]
+    month = Counter(a["type"] for a in analyses if a["date"].startswith("2024-03"))
+    quarter = Counter(k for a in analyses if "2024-04-01" <= a["date"][:10] <= "2024-06-30" for k in a["keywords"])
+    latencies = [a["latency"] for a in analyses if a["type"] == "dicom"]
+    return dict(month), quarter.most_common(3), sum(latencies) / len(latencies)
+
+
+def column_queries(store):
+    types = store.query(["type"], date_from="2024-03-01", date_to="2024-03-31")["type"]
+    month = dict(Counter(types.tolist()))
+    quarter = store.keyword_counts(date_from="2024-04-01", date_to="2024-06-30")[:3]
+    latency = float(np.nanmean(store.query(["latency"], types=["dicom"])["latency"]))
+    return month, quarter, latency
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=1000000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    json_path = os.path.join(workdir, "analysis_store.json")
+
+    # Stream the JSON out so generating it doesn't need the whole list in memory
+    start = time.perf_counter()
+    with open(json_path, "w") as f:
+        f.write('{"analyses": [')
+        for i, analysis in enumerate(synthetic_analyses(args.records)):
+            f.write((", " if i else "") + json.dumps(analysis))
+        f.write("]}")
+    json_write = time.perf_counter() - start
+
+    store = AnalysisColumns(os.path.join(workdir, "columns"))
+    export_seconds, _ = timed(lambda: store.export(synthetic_analyses(args.records)))
+
+    print(f"{args.records} analyses")
+    print(f"  JSON:     {os.path.getsize(json_path) / 1e6:8.1f} MB written in {json_write:.1f}s")
+    print(f"  columnar: {directory_size(store.root) / 1e6:8.1f} MB in {len(store.partitions())} partitions, "
+          f"exported in {export_seconds:.1f}s")
+
+    json_seconds, json_result = timed(lambda: json_queries(json_path))
+    column_seconds, column_result = timed(lambda: column_queries(store))
+    assert json_result[0] == column_result[0]
+    assert [count for _, count in json_result[1]] == [count for _, count in column_result[1]]
+    assert abs(json_result[2] - column_result[2]) < 1e-3
+    print(f"  queries (month type counts, quarter keyword top 3, DICOM mean latency)")
+    print(f"    JSON load + scan: {json_seconds:8.2f}s")
+    print(f"    columnar:         {column_seconds:8.2f}s ({json_seconds / column_seconds:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Build the analysis search index over N synthetic analyses and time typical searches.
+
+Usage: python benchmarks/bench_analysis_search.py [--records 1000000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from analysis_search import AnalysisIndex
+
+FINDINGS = ["pneumonia", "pleural effusion", "pulmonary nodule", "cardiomegaly", "atelectasis",
+            "pulmonary edema", "rib fracture", "interstitial fibrosis", "emphysema", "pneumothorax",
+            "consolidation", "ground-glass opacities", "metastasis", "lung mass", "tuberculosis"]
+REGIONS = ["right upper lobe", "right lower lobe", "left upper lobe", "left lower lobe", "lingula", "apex"]
+
+
+def synthetic_analyses(count, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    for i in range(count):
+        keywords = rng.sample(FINDINGS, rng.randint(1, 3))
+        region = rng.choice(REGIONS)
+        analysis_type = rng.choice(["image", "image", "dicom", "nifti"])
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "analysis": f"Radiological Analysis: {' and '.join(keywords)} in the {region}. "
+                        f"Impression: findings suggest {keywords[0]}; clinical correlation recommended.",
+            "findings": [f"{keyword.capitalize()} in the {region}" for keyword in keywords],
+            "keywords": keywords,
+            "date": (start + timedelta(seconds=rng.randint(0, 86400 * 730))).isoformat(),
+            "type": analysis_type,
+            "filename": f"study_{i}.{ {'image': 'png', 'dicom': 'dcm', 'nifti': 'nii.gz'}[analysis_type]}",
+        }
+
+
+def timed(function, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=1000000)
+    args = parser.parse_args()
+
+    index = AnalysisIndex(os.path.join(tempfile.mkdtemp(), "analysis_index.db"))
+    start = time.perf_counter()
+    index.rebuild(synthetic_analyses(args.records))
+    print(f"indexed {args.records} analyses in {time.perf_counter() - start:.0f}s, "
+          f"{os.path.getsize(index.path) / 1e6:.0f} MB")
+
+    # A freshly opened index loads its facet arrays on the first query
+    index.close()
+    index = AnalysisIndex(index.path)
+    seconds, _ = timed(lambda: index.search_analyses("pneumothorax"), repeat=1)
+    print(f"  first query after opening (loads facets)   {seconds * 1000:8.1f} ms")
+
+    cases = [
+        ("pneumothorax", {}),
+        ("pneumothorax", {"date_from": "2024-03-01", "date_to": "2024-03-31"}),
+        ("pleural effusion lower lobe", {"types": ["dicom"]}),
+        ("", {"types": ["nifti"], "date_from": "2024-03-01", "date_to": "2024-03-31"}),
+        ("", {"page": 500}),
+    ]
+    for query, filters in cases:
+        seconds, found = timed(lambda: index.search_analyses(query, **filters))
+        label = f"{query or '(browse)'} {filters or ''}".strip()
+        print(f"  {label[:42]:42s} {seconds * 1000:8.1f} ms  {found['total']:>8} matches")
+
+    # Incremental update: save a new analysis and find it immediately
+    new = next(synthetic_analyses(1, seed=1))
+    new["analysis"] += " Incidental azygos lobe."
+    seconds, _ = timed(lambda: index.add_analysis(dict(new, id=str(uuid.uuid4()))), repeat=20)
+    found = index.search_analyses("azygos")
+    print(f"  add_analysis (incremental, median of 20)   {seconds * 1000:8.1f} ms  {found['total']:>8} matches for new term")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Measure how many completions the answer cache saves when rooms repeat questions about the same analyses.
+
+Simulates rooms that each ask a handful of common questions (with small
+rewordings) about one of a few analyses. A miss stands in for a completion
+with --completion-ms of latency; near-duplicates are matched with a
+hashed bag-of-words embedding, so no API key is needed. Also times the
+lookups themselves and the invalidation of one analysis.
+
+Usage: python benchmarks/bench_answer_cache.py [--rooms 500] [--analyses 20] [--completion-ms 1500]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from answer_cache import AnswerCache, content_version
+
+QUESTIONS = [
+    ["What's the differential?", "what is the differential", "What is the differential diagnosis?"],
+    ["Recommend follow-up?", "What follow-up do you recommend?", "recommend follow up"],
+    ["Is this urgent?", "is this urgent", "Is it urgent?"],
+    ["How confident is the primary diagnosis?", "How confident are you in the primary diagnosis?"],
+    ["Should we order a CT?", "should we order a CT scan"],
+]
+
+
+def embed(text, dims=256):
+    vector = np.zeros(dims, dtype=np.float32)
+    for word in text.split():
+        vector[zlib.crc32(word.encode()) % dims] += 1
+    return vector
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--analyses", type=int, default=20)
+    parser.add_argument("--questions-per-room", type=int, default=4)
+    parser.add_argument("--completion-ms", type=float, default=1500, help="Simulated latency of one completion")
+    parser.add_argument("--similarity", type=float, default=0.8)
+    args = parser.parse_args()
+
+    random.seed(0)
+    cache = AnswerCache(os.path.join(tempfile.mkdtemp(), "answer_cache.db"), similarity=args.similarity)
+    analyses = [(f"analysis-{i}", content_version(f"Findings for analysis {i}")) for i in range(args.analyses)]
+    lookup_times = []
+    completions = 0
+    for _ in range(args.rooms):
+        analysis = random.choice(analyses)
+        for variants in random.sample(QUESTIONS, args.questions_per_room):
+            question = random.choice(variants)
+            start = time.perf_counter()
+            answer, embedding = cache.get(question, [analysis], "gpt-3.5-turbo", "bench-1", embed)
+            lookup_times.append(time.perf_counter() - start)
+            if answer is None:
+                completions += 1
+                cache.put(question, [analysis], "gpt-3.5-turbo", "bench-1", f"Answer to {question}", embedding,
+                          analysis_ids=[analysis[0]])
+
+    stats = cache.stats()
+    asked = args.rooms * args.questions_per_room
+    print(f"{args.rooms} rooms, {asked} questions about {args.analyses} analyses")
+    print(f"  exact hits {stats['hits']}, near-duplicate hits {stats['near_hits']}, completions {completions} "
+          f"({1 - completions / asked:.0%} saved)")
+    print(f"  answer time: {asked * args.completion_ms / 1000:.0f}s uncached vs "
+          f"{completions * args.completion_ms / 1000 + sum(lookup_times):.0f}s with the cache")
+    print(f"  lookup median {statistics.median(lookup_times) * 1000:.2f} ms, max {max(lookup_times) * 1000:.2f} ms")
+
+    start = time.perf_counter()
+    removed = cache.invalidate_analysis(analyses[0][0])
+    print(f"  invalidating one analysis removed {removed} answers in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Measure prompt size and context-building cost of conversation memory as a discussion grows.
+
+Simulates a room where a doctor and the AI alternate, compacting after
+every reply as the chat does, and reports at several discussion lengths
+the size of the prompt history from ConversationMemory against sending the
+whole discussion, plus the time to build the context and to compact.
+Without an API key the extractive summarizer is used, so numbers cover
+storage and prompt assembly, not model latency.
+
+Usage: python benchmarks/bench_conversation_memory.py [--messages 2000] [--checkpoints 50 200 1000 2000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def prompt_chars(messages):
+    return sum(len(message["content"]) for message in messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--checkpoints", type=int, nargs="+", default=[50, 200, 1000, 2000])
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    from conversation_memory import ConversationMemory
+    from message_store import get_message_store
+
+    store = get_message_store()
+    memory = ConversationMemory()
+    room = "CASE-BENCH"
+    compact_times = []
+    print(f"recent turns {memory.recent_turns}, summary batch {memory.summary_batch}, "
+          f"summary cap {memory.summary_chars} chars")
+    for i in range(1, args.messages + 1):
+        if i % 2:
+            store.add(room, "Dr. Bench", f"Question {i}: is the opacity in the right lower lobe changing? "
+                                         f"The effusion looked smaller on the last film.")
+        else:
+            store.add(room, "Dr. AI Assistant", f"Answer {i}. The consolidation is stable and the effusion "
+                                                f"has decreased slightly; consider a follow-up film in two weeks.")
+            start = time.perf_counter()
+            memory.compact(room)
+            compact_times.append(time.perf_counter() - start)
+        if i in args.checkpoints:
+            start = time.perf_counter()
+            context = memory.prompt_messages(room, "Dr. AI Assistant")
+            build_ms = (time.perf_counter() - start) * 1000
+            full = store.room_messages(room)
+            print(f"  {i:6d} messages: memory {len(context):3d} turns / {prompt_chars(context):6d} chars "
+                  f"(built in {build_ms:.2f} ms), full history {len(full):6d} turns / {prompt_chars(full):8d} chars, "
+                  f"compact median {statistics.median(compact_times) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Compare the page payload of base64 data-URI report links with deferred downloads.
+
+Renders the same page twice with Streamlit's AppTest: once with inline
+<a href="data:application/pdf;base64,..."> links (the old approach) and once
+with deferred download buttons, and sums the serialized size of every element
+sent to the browser. Also checks that the download server honours range
+requests on a large export.
+
+Usage: python benchmarks/bench_download_payload.py [--reports 10] [--export-mb 64]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest
+
+
+def page_with_data_uris(report_count):
+    import base64
+    import streamlit as st
+    from utils_simple import generate_report
+
+    analysis = {"id": "bench", "analysis": "Impression: clear lungs. " * 200, "findings": ["clear lungs"],
+                "keywords": [], "filename": "bench.png", "date": "2025-03-17T10:00:00", "type": "image"}
+    pdf = generate_report(analysis, include_references=False).getvalue()
+    for idx in range(report_count):
+        b64_pdf = base64.b64encode(pdf).decode()
+        st.markdown(f'<a href="data:application/pdf;base64,{b64_pdf}" download="report_{idx}.pdf">Download Report</a>',
+                    unsafe_allow_html=True)
+
+
+def page_with_deferred_downloads(report_count):
+    import streamlit as st
+    from utils_simple import generate_report
+
+    analysis = {"id": "bench", "analysis": "Impression: clear lungs. " * 200, "findings": ["clear lungs"],
+                "keywords": [], "filename": "bench.png", "date": "2025-03-17T10:00:00", "type": "image"}
+    for idx in range(report_count):
+        st.download_button("Download Report", data=lambda: generate_report(analysis, include_references=False).getvalue(),
+                           file_name=f"report_{idx}.pdf", mime="application/pdf", key=f"report_{idx}",
+                           on_click="ignore")
+
+
+def payload_bytes(page, report_count):
+    at = AppTest.from_function(page, args=(report_count,), default_timeout=120).run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return sum(node.proto.ByteSize() for node in at.main if getattr(node, "proto", None) is not None)
+
+
+def check_range_requests(export_mb):
+    from download_server import DownloadServer
+
+    export_dir = tempfile.mkdtemp()
+    path = os.path.join(export_dir, "reports_bench.zip")
+    with open(path, "wb") as f:
+        for _ in range(export_mb):
+            f.write(os.urandom(1024 * 1024))
+    size = os.path.getsize(path)
+
+    server = DownloadServer(host="127.0.0.1", port=0, export_dir=export_dir)
+    url = server.url_for_export(path)
+    try:
+        request = urllib.request.Request(url, headers={"Range": "bytes=1048576-2097151"})
+        with urllib.request.urlopen(request) as response:
+            part = response.read()
+            print(f"range request: HTTP {response.status}, {response.headers['Content-Range']}, {len(part)} bytes")
+        with open(path, "rb") as f:
+            f.seek(1048576)
+            assert part == f.read(1048576)
+
+        start = time.perf_counter()
+        received = 0
+        with urllib.request.urlopen(url) as response:
+            while True:
+                chunk = response.read(1024 * 1024)
+                if not chunk:
+                    break
+                received += len(chunk)
+        elapsed = time.perf_counter() - start
+        assert received == size
+        print(f"full download: {received / 1e6:.0f} MB in {elapsed:.2f}s ({received / 1e6 / elapsed:.0f} MB/s)")
+    finally:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=10, help="Download links on the page")
+    parser.add_argument("--export-mb", type=int, default=64, help="Size of the synthetic bulk export")
+    args = parser.parse_args()
+
+    before = payload_bytes(page_with_data_uris, args.reports)
+    after = payload_bytes(page_with_deferred_downloads, args.reports)
+    print(f"{args.reports} report links")
+    print(f"  base64 data URIs:   {before / 1024:8.1f} KiB per rerun")
+    print(f"  deferred downloads: {after / 1024:8.1f} KiB per rerun ({before / max(after, 1):.0f}x smaller)")
+    check_range_requests(args.export_mb)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Bulk PubMed lookups against the stub E-utilities server.
+
+Compares the naive pattern (esearch + efetch per keyword set, no rate control)
+with EntrezClient.search_many (token bucket, retries, one history session),
+and checks that search_many shares one WebEnv and that a client over the
+limit retries 429s only after their Retry-After.
+
+Usage: python benchmarks/bench_entrez_client.py [--queries 30] [--rate 3]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+from entrez_client import EntrezClient
+from stub_entrez_server import start_stub_server, stub_pmids
+
+TERMS = ["pneumonia", "effusion", "nodule", "cardiomegaly", "atelectasis", "edema",
+         "fracture", "fibrosis", "emphysema", "pneumothorax"]
+
+
+def keyword_queries(count):
+    return [f"{TERMS[i % len(TERMS)]} AND {TERMS[(i * 3 + 1) % len(TERMS)]} AND case{i}" for i in range(count)]
+
+
+def naive(base_url, queries, retmax):
+    """One esearch + one efetch per query, fired back to back"""
+    failures = 0
+    for query in queries:
+        search = requests.get(base_url + "esearch.fcgi", params={"db": "pubmed", "term": query, "retmax": retmax})
+        if search.status_code != 200:
+            failures += 1
+            continue
+        ids = [part.split("</Id>")[0] for part in search.text.split("<Id>")[1:]]
+        fetch = requests.get(base_url + "efetch.fcgi", params={"db": "pubmed", "id": ",".join(ids)})
+        if fetch.status_code != 200:
+            failures += 1
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--retmax", type=int, default=3)
+    parser.add_argument("--rate", type=int, default=3, help="Requests/second the stub allows")
+    args = parser.parse_args()
+    queries = keyword_queries(args.queries)
+
+    server, state, base_url = start_stub_server(rate=args.rate)
+    try:
+        start = time.perf_counter()
+        failures = naive(base_url, queries, args.retmax)
+        print(f"naive        {time.perf_counter() - start:6.2f}s  requests={state.requests:4d}  "
+              f"throttled={state.throttled:4d}  failed queries={failures}")
+
+        state.requests = state.throttled = 0
+        time.sleep(1.1)
+        client = EntrezClient(base_url=base_url, rate=args.rate, backoff=0.2)
+        start = time.perf_counter()
+        results = client.search_many(queries, retmax=args.retmax)
+        complete = sum(1 for query in queries if len(results[query]) == args.retmax)
+        print(f"search_many  {time.perf_counter() - start:6.2f}s  requests={state.requests:4d}  "
+              f"throttled={state.throttled:4d}  complete queries={complete}/{len(queries)}")
+        # Every esearch shares one WebEnv; the ids are posted once and fetched in pages
+        unique_ids = {pmid for query in queries for pmid in stub_pmids(query, args.retmax)}
+        pages = -(-len(unique_ids) // client.fetch_batch_size)
+        assert complete == len(queries)
+        assert len(state.history) == 1, list(state.history)
+        assert state.requests - state.throttled == len(queries) + 1 + pages
+        assert client.request_count == state.requests
+
+        record = client.search("pneumonia AND effusion", retmax=2)
+        assert len(record) == 2 and record[0]["id"], record
+    finally:
+        server.shutdown()
+
+    # A client pacing itself above the server's limit: throttled requests wait out Retry-After
+    server, state, base_url = start_stub_server(rate=args.rate, retry_after=1)
+    try:
+        client = EntrezClient(base_url=base_url, rate=args.rate * 4, max_retries=8, backoff=0.05)
+        start = time.perf_counter()
+        results = [client.search(query, retmax=args.retmax) for query in queries[:6]]
+        print(f"over limit   {time.perf_counter() - start:6.2f}s  requests={state.requests:4d}  "
+              f"throttled={state.throttled:4d}  retried before Retry-After={state.early_retries}")
+        assert all(len(result) == args.retmax for result in results)
+        assert state.throttled > 0 and state.early_retries == 0
+
+        # Threads sharing the client count every request they send
+        state.requests = state.throttled = 0
+        client.request_count = 0
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda query: client.search(query, retmax=args.retmax), queries[:8]))
+        assert all(len(result) == args.retmax for result in results)
+        assert client.request_count == state.requests, (client.request_count, state.requests)
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
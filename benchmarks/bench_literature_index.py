@@ -0,0 +1,87 @@
+"""Build the offline literature index from a synthetic PubMed baseline dump and time queries.
+
+Usage: python benchmarks/bench_literature_index.py [--records 100000]
+"""
+import argparse
+import gzip
+import os
+import random
+import sys
+import tempfile
+import time
+from xml.sax.saxutils import escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from literature_index import LiteratureIndex
+
+FINDINGS = ["pneumonia", "pleural effusion", "pulmonary nodule", "cardiomegaly", "atelectasis",
+            "pulmonary edema", "rib fracture", "interstitial fibrosis", "emphysema", "pneumothorax",
+            "consolidation", "ground-glass opacities", "metastasis", "lung mass", "tuberculosis"]
+MODALITIES = ["chest radiography", "computed tomography", "MRI", "ultrasound", "PET-CT"]
+JOURNALS = [("Radiology", "Radiology"), ("Eur Radiol", "European radiology"),
+            ("AJR Am J Roentgenol", "AJR. American journal of roentgenology"),
+            ("J Thorac Imaging", "Journal of thoracic imaging"), ("Clin Radiol", "Clinical radiology")]
+
+
+def article_xml(pmid, rng):
+    finding, other = rng.sample(FINDINGS, 2)
+    modality = rng.choice(MODALITIES)
+    abbrev, title = rng.choice(JOURNALS)
+    year = rng.randint(1995, 2025)
+    return (
+        "<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article>"
+        "<Journal><JournalIssue><PubDate><Year>{year}</Year></PubDate></JournalIssue>"
+        "<Title>{title}</Title><ISOAbbreviation>{abbrev}</ISOAbbreviation></Journal>"
+        "<ArticleTitle>{finding_t} on {modality}: diagnostic performance and differential with {other}</ArticleTitle>"
+        "<Abstract><AbstractText>We reviewed {n} patients with suspected {finding} imaged with {modality}. "
+        "Readers distinguished {finding} from {other} with high agreement.</AbstractText></Abstract>"
+        "<AuthorList><Author><LastName>Author{a}</LastName><Initials>A</Initials></Author></AuthorList>"
+        "<ELocationID EIdType=\"doi\">10.1000/bench.{pmid}</ELocationID>"
+        "</Article><MeshHeadingList><MeshHeading><DescriptorName>{finding_t}</DescriptorName></MeshHeading>"
+        "<MeshHeading><DescriptorName>Humans</DescriptorName></MeshHeading></MeshHeadingList>"
+        "</MedlineCitation></PubmedArticle>\n"
+    ).format(pmid=pmid, year=year, title=escape(title), abbrev=escape(abbrev), finding=finding,
+             finding_t=finding.capitalize(), modality=modality, other=other,
+             n=rng.randint(20, 2000), a=rng.randint(1, 5000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_litindex_")
+    dump = os.path.join(workdir, "pubmed25n0001.xml.gz")
+    rng = random.Random(42)
+    with gzip.open(dump, "wt") as f:
+        f.write("<?xml version=\"1.0\"?>\n<PubmedArticleSet>\n")
+        for i in range(args.records):
+            f.write(article_xml(30_000_000 + i, rng))
+        f.write("</PubmedArticleSet>\n")
+
+    index_path = os.path.join(workdir, "literature_index.db")
+    index = LiteratureIndex(index_path)
+    start = time.perf_counter()
+    count = index.ingest(dump)
+    elapsed = time.perf_counter() - start
+    print(f"ingested {count} records in {elapsed:.1f}s ({count / elapsed:,.0f} records/s)")
+    print(f"dump {os.path.getsize(dump) / 2**20:.1f} MiB gz, index {os.path.getsize(index_path) / 2**20:.1f} MiB, "
+          f"{index.stats()}")
+
+    queries = [["pneumonia"], ["pleural", "effusion"], ["pulmonary", "nodule", "computed", "tomography"],
+               ["pneumothorax", "ultrasound"], ["cardiomegaly", "radiology"]]
+    for keywords in queries:
+        index.search_publications(keywords, max_results=5)
+        start = time.perf_counter()
+        runs = 20
+        for _ in range(runs):
+            results = index.search_publications(keywords, max_results=5)
+        ms = (time.perf_counter() - start) * 1000 / runs
+        print(f"{' '.join(keywords):45s} {ms:7.2f} ms  top: {results[0]['title'][:60] if results else '-'}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
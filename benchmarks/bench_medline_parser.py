@@ -0,0 +1,107 @@
+"""Parse 10k MEDLINE records from the recorded fixture.
+
+Compares the old whole-string split parser with the streaming
+medline_parser.iter_medline_records on time, peak memory and how many
+titles/years come through intact.
+
+Usage: python benchmarks/bench_medline_parser.py [--records 10000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from medline_parser import iter_medline_records
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "pubmed_sample.medline")
+
+
+def legacy_parse(text):
+    """The parser search_pubmed used before the streaming parser"""
+    publications = []
+    for record in text.split('\n\n'):
+        if not record.strip():
+            continue
+        pub_data = {"id": "", "title": "", "journal": "", "year": ""}
+        for line in record.split('\n'):
+            if line.startswith('PMID- '):
+                pub_data["id"] = line[6:].strip()
+            elif line.startswith('TI  - '):
+                pub_data["title"] = line[6:].strip()
+            elif line.startswith('TA  - '):
+                pub_data["journal"] = line[6:].strip()
+            elif line.startswith('DP  - '):
+                year_match = line[6:].strip().split()[0]
+                pub_data["year"] = year_match if year_match.isdigit() else "2024"
+        if pub_data["id"]:
+            publications.append(pub_data)
+    return publications
+
+
+def build_dump(records, path):
+    """Write `records` records by cycling the fixture with fresh PMIDs"""
+    with open(FIXTURE) as f:
+        templates = [block.strip("\n") for block in f.read().split("\n\n") if block.strip()]
+    with open(path, "w") as out:
+        for i in range(records):
+            template = templates[i % len(templates)]
+            original = template.split("\n", 1)[0][6:]
+            out.write(template.replace(original, str(40_000_000 + i)) + "\n\n")
+
+
+def measure(label, parse, consume):
+    start = time.perf_counter()
+    records = parse()
+    elapsed = time.perf_counter() - start
+
+    # Peak memory while only consuming the records (not keeping them)
+    tracemalloc.start()
+    consume()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    truncated = sum(1 for r in records if not r["title"].endswith("."))
+    guessed = sum(1 for r in records if r["year"] == "2024")
+    print(f"{label:10s} records={len(records):6d}  {elapsed * 1000:8.1f} ms  "
+          f"peak while consuming={peak / 2**20:6.2f} MiB  truncated titles={truncated}  '2024' years={guessed}")
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=10_000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_medline_"), "dump.medline")
+    build_dump(args.records, path)
+
+    def legacy():
+        with open(path) as f:
+            return legacy_parse(f.read())
+
+    def streaming():
+        with open(path, "rb") as f:
+            return list(iter_medline_records(f))
+
+    def legacy_consume():
+        for _ in legacy():
+            pass
+
+    def streaming_consume():
+        with open(path, "rb") as f:
+            for _ in iter_medline_records(f):
+                pass
+
+    measure("legacy", legacy, legacy_consume)
+    records = measure("streaming", streaming, streaming_consume)
+    with_fields = sum(1 for r in records if r["abstract"] and r["mesh"] and r["authors"])
+    print(f"streaming records with authors+abstract+MeSH: {with_fields}, with DOI: {sum(1 for r in records if r['doi'])}")
+
+
+if __name__ == "__main__":
+    main()
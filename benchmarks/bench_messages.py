@@ -0,0 +1,74 @@
+"""Compare fetching room messages from the JSON chat store with cursor queries on the message store.
+
+Builds one long discussion (plus other rooms) both ways and times what a
+rerun of the collaboration view costs: loading the whole JSON store to show
+the latest messages, versus fetching only messages after the last cursor.
+
+Usage: python benchmarks/bench_messages.py [--messages 100000] [--rooms 50]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from message_store import MessageStore
+
+
+def timed(function, repeat=20):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100000, help="Messages in the long discussion")
+    parser.add_argument("--rooms", type=int, default=50, help="Other rooms with 1000 messages each")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    json_path = os.path.join(workdir, "chat_store.json")
+    store = MessageStore(os.path.join(workdir, "message_store.db"))
+
+    def messages(count):
+        return [{"id": str(uuid.uuid4()), "user": "Dr. Bench", "content": "Looks consistent with effusion. " * 4,
+                 "type": "text", "timestamp": datetime.now().isoformat()} for _ in range(count)]
+
+    rooms = {"LONG": {"id": "LONG", "messages": messages(args.messages)}}
+    for i in range(args.rooms):
+        rooms[f"ROOM-{i}"] = {"id": f"ROOM-{i}", "messages": messages(1000)}
+    with open(json_path, "w") as f:
+        json.dump({"rooms": rooms}, f)
+    for room_id, room in rooms.items():
+        store.import_messages(room_id, room["messages"])
+
+    def json_latest():
+        with open(json_path) as f:
+            return json.load(f)["rooms"]["LONG"]["messages"][-50:]
+
+    latest = store.get_messages("LONG")
+    cursor = latest[-1]["cursor"]
+    store.add("LONG", "Dr. Bench", "One new message")
+
+    print(f"{args.messages} messages in one room, {args.rooms} other rooms "
+          f"(chat_store.json {os.path.getsize(json_path) / 1e6:.0f} MB)")
+    print(f"  JSON store, latest 50:          {timed(json_latest, repeat=5):8.2f} ms")
+    print(f"  message store, latest 50:       {timed(lambda: store.get_messages('LONG')):8.2f} ms")
+    print(f"  message store, after cursor:    {timed(lambda: store.get_messages('LONG', cursor)):8.2f} ms")
+    print(f"  message store, 50 before first: {timed(lambda: store.get_messages_before('LONG', latest[0]['cursor'])):8.2f} ms")
+    print(f"  message store, add message:     {timed(lambda: store.add('LONG', 'Dr. Bench', 'Noted.')):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
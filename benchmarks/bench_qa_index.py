@@ -0,0 +1,139 @@
+"""Measure how quickly a newly saved analysis becomes searchable in report QA, against a full rebuild.
+
+Writes N synthetic analyses to a scratch analysis_store.json and builds the
+QA index once. Then it saves new analyses through save_analysis, which
+records them in the change log, and times the refresh and search that find
+each one. It also removes one through the change log. Embeddings come from
+one of the local providers (hashing, tfidf), or from "api": a stand-in for
+the embeddings API that hashes words and adds --embed-ms of latency per
+call. The number of embedding calls is reported as well.
+
+Usage: python benchmarks/bench_qa_index.py [--records 5000] [--saves 20] [--provider hashing|tfidf|api] [--embed-ms 200]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FINDINGS = ["pneumonia", "pleural effusion", "pulmonary nodule", "cardiomegaly", "atelectasis",
+            "pulmonary edema", "rib fracture", "emphysema", "pneumothorax", "consolidation"]
+
+
+def synthetic_analysis(rng, date, marker=""):
+    keywords = rng.sample(FINDINGS, rng.randint(1, 3))
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "analysis": (f"Radiological Analysis: {', '.join(keywords)} {marker}.\n\n" +
+                     "Impression: findings are described in detail with comparison to prior studies. " * 12),
+        "findings": [keyword.capitalize() for keyword in keywords],
+        "date": date.isoformat(),
+        "type": "image",
+        "filename": f"study_{rng.randint(0, 10**6)}.png",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--saves", type=int, default=20)
+    parser.add_argument("--provider", choices=["hashing", "tfidf", "api"], default="hashing")
+    parser.add_argument("--embed-ms", type=float, default=200, help="Simulated latency of one API embedding call")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    from qa_index import QAIndex
+    from utils_simple import save_analysis, get_analysis_search
+    from analysis_changes import get_analysis_changes
+    from embeddings import get_embedding_provider
+
+    calls = [0]
+
+    class SimulatedAPI:
+        name = "simulated-api"
+
+        def encode(self, texts, dims=256):
+            calls[0] += 1
+            time.sleep(args.embed_ms / 1000)
+            vectors = np.zeros((len(texts), dims), dtype=np.float32)
+            for i, text in enumerate(texts):
+                for word in text.lower().split():
+                    vectors[i, zlib.crc32(word.encode()) % dims] += 1
+            return vectors
+
+        def needs_fit(self, corpus_size):
+            return False
+
+    if args.provider == "api":
+        provider = SimulatedAPI()
+    else:
+        provider = get_embedding_provider(kind=args.provider)
+        encode = provider.encode
+
+        def counted(texts):
+            calls[0] += 1
+            return encode(texts)
+        provider.encode = counted
+
+    def embed(text):
+        return provider.encode([text])[0]
+
+    rng = random.Random(0)
+    now = datetime.now()
+    with open("analysis_store.json", "w") as f:
+        json.dump({"analyses": [synthetic_analysis(rng, now - timedelta(minutes=i)) for i in range(args.records)]}, f)
+    get_analysis_search()
+
+    index = QAIndex("qa_index.db", embedder=provider)
+    start = time.perf_counter()
+    index.refresh()
+    build_seconds = time.perf_counter() - start
+    print(f"{args.records} analyses, {index.stats()['chunks']} chunks, {provider.name} embeddings")
+    print(f"  full build:             {build_seconds:8.2f} s, {calls[0]} embedding calls (batched)")
+
+    start = time.perf_counter()
+    QAIndex("qa_index.db", embedder=provider)
+    print(f"  reload after restart:   {time.perf_counter() - start:8.2f} s, no embedding calls")
+
+    latencies, found = [], 0
+    for i in range(args.saves):
+        marker = f"marker{i}xyz"
+        analysis = save_analysis(synthetic_analysis(rng, now, marker), "new.png")
+        calls[0] = 0
+        start = time.perf_counter()
+        index.refresh()
+        results = index.search(marker, embed(marker), top_k=1)
+        latencies.append(time.perf_counter() - start)
+        found += bool(results) and results[0]["id"] == analysis["id"]
+    print(f"  save -> searchable:     {statistics.median(latencies) * 1000:8.2f} ms median, "
+          f"{max(latencies) * 1000:.2f} ms max ({found}/{args.saves} found first, {calls[0]} embedding calls each)")
+
+    get_analysis_changes().record(analysis["id"], "delete")
+    start = time.perf_counter()
+    index.refresh()
+    results = index.search(f"marker{args.saves - 1}xyz", top_k=1)
+    print(f"  delete -> gone:         {(time.perf_counter() - start) * 1000:8.2f} ms "
+          f"(still found: {bool(results) and results[0]['id'] == analysis['id']})")
+
+    query = "pleural effusion with cardiomegaly"
+    start = time.perf_counter()
+    query_embedding = embed(query)
+    embed_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    index.search(query, query_embedding)
+    print(f"  query: embed {embed_ms:.2f} ms + search {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
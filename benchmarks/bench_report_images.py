@@ -0,0 +1,100 @@
+"""Time report rendering and measure PDF size with embedded images.
+
+Stores a large synthetic DICOM-derived image and a heatmap overlay in a
+temporary blob store, then renders the report four ways: without images,
+embedding the full-resolution PNGs directly, and through the print-resolution
+JPEG cache (cold, then warm as a second report would see it).
+
+Usage: python benchmarks/bench_report_images.py [--size 3072] [--repeat 5]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["BLOB_STORE_DIR"] = tempfile.mkdtemp()
+
+import numpy as np
+from PIL import Image
+from reportlab.platypus import Image as RPImage
+import utils_simple
+from blob_store import get_blob_store
+from heatmap_engine import encode_image
+
+
+def synthetic_scan(size):
+    """Smooth grayscale 'scan' with noise, like a normalized DICOM slice"""
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    body = np.exp(-((x - 0.5) ** 2 + (y - 0.5) ** 2) * 6)
+    noise = np.random.default_rng(0).normal(0, 0.05, (size, size))
+    return np.clip((body + noise) * 220, 0, 255).astype(np.uint8)
+
+
+def render(analysis):
+    start = time.perf_counter()
+    pdf = utils_simple.generate_report(analysis, include_references=False).getvalue()
+    return time.perf_counter() - start, len(pdf)
+
+
+def full_resolution_flowables(data):
+    """Embed the stored images directly at full resolution (PNG, Flate)"""
+    blob_store = get_blob_store()
+    flowables = []
+    for blob_hash, is_array in ((data["pixels_hash"], True), (data["artifacts"]["heatmap_overlay"], False)):
+        if is_array:
+            image = Image.fromarray(np.asarray(blob_store.load_array(blob_hash)))
+        else:
+            image = Image.open(io.BytesIO(blob_store.get(blob_hash)))
+        png = io.BytesIO()
+        image.save(png, format="PNG")
+        flowables.append(RPImage(io.BytesIO(png.getvalue()), width=utils_simple.REPORT_IMAGE_WIDTH,
+                                 height=utils_simple.REPORT_IMAGE_WIDTH))
+    return flowables
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=3072, help="Image side length in pixels")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    blob_store = get_blob_store()
+    scan = synthetic_scan(args.size)
+    overlay, _ = utils_simple.generate_heatmap_bytes(scan, format="webp")
+    base = {"id": "bench", "analysis": "Impression: no acute findings.", "findings": ["no acute findings"],
+            "keywords": [], "filename": "scan.dcm"}
+    with_images = dict(base, pixels_hash=blob_store.put_array(scan),
+                       artifacts={"heatmap_overlay": blob_store.put(overlay)})
+
+    print(f"{args.size}x{args.size} image, overlay {len(overlay) / 1024:.0f} KiB webp")
+    rows = []
+    seconds, size = render(base)
+    rows.append(("no images", seconds, size))
+
+    original = utils_simple.report_image_flowables
+    utils_simple.report_image_flowables = full_resolution_flowables
+    try:
+        seconds, size = render(with_images)
+        rows.append(("full-resolution PNG", seconds, size))
+    finally:
+        utils_simple.report_image_flowables = original
+
+    seconds, size = render(with_images)
+    rows.append(("print JPEG, cold cache", seconds, size))
+    warm = [render(dict(with_images, id=f"bench-{i}"))[0] for i in range(args.repeat)]
+    rows.append(("print JPEG, warm cache", sorted(warm)[len(warm) // 2], size))
+
+    utils_simple.get_report_image.cache_clear()
+    seconds, size = render(with_images)
+    rows.append(("print JPEG, new process", seconds, size))
+
+    for label, seconds, size in rows:
+        print(f"  {label:26s} {seconds * 1000:8.1f} ms  {size / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
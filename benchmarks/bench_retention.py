@@ -0,0 +1,135 @@
+"""Compact a synthetic history into archive segments and compare store size and read latency.
+
+Writes N analyses spread over two years (plus chat rooms, some closed) into
+a scratch directory, runs one retention pass keeping 90 days hot, and
+reports analysis_store.json size and get_latest_analyses latency before and
+after. Analyses are saved from another thread during the pass to show
+writers are not held up, and archived records are read back on demand.
+
+Usage: python benchmarks/bench_retention.py [--records 50000] [--rooms 200]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FINDINGS = ["pneumonia", "pleural effusion", "pulmonary nodule", "cardiomegaly", "atelectasis",
+            "pulmonary edema", "rib fracture", "emphysema", "pneumothorax", "consolidation"]
+
+
+def synthetic_analysis(rng, date):
+    keywords = rng.sample(FINDINGS, rng.randint(1, 3))
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "analysis": ("Radiological Analysis: " + ", ".join(keywords) + ". " +
+                     "Impression: findings are described in detail with comparison to prior studies. " * 12),
+        "findings": [keyword.capitalize() for keyword in keywords],
+        "keywords": keywords,
+        "date": date.isoformat(),
+        "type": rng.choice(["image", "dicom", "nifti"]),
+        "filename": f"study_{rng.randint(0, 10**6)}.png",
+        "latency": rng.random() * 20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--rooms", type=int, default=200)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    from utils_simple import (get_analysis_by_id, get_all_analyses, get_analysis_store, save_analysis,
+                              get_statistics, get_analysis_search)
+    from chat_system import get_chat_room
+    from retention import RetentionManager
+
+    rng = random.Random(0)
+    now = datetime.now()
+    analyses = [synthetic_analysis(rng, now - timedelta(seconds=rng.randint(0, 730 * 86400)))
+                for _ in range(args.records)]
+    with open("analysis_store.json", "w") as f:
+        json.dump({"analyses": analyses}, f)
+    rooms = {}
+    for i in range(args.rooms):
+        created = now - timedelta(days=rng.randint(0, 365))
+        room = {"id": f"CASE-{i}", "created_at": created.isoformat(), "creator": "Dr. Bench",
+                "description": f"Case {i}", "participants": ["Dr. Bench"],
+                "messages": [{"id": str(uuid.uuid4()), "user": "Dr. Bench", "content": "Comment " * 30,
+                              "type": "text", "timestamp": created.isoformat()} for _ in range(50)]}
+        if i % 2:
+            room["closed_at"] = (created + timedelta(days=7)).isoformat()
+            room["closed_by"] = "Dr. Bench"
+        rooms[room["id"]] = room
+    with open("chat_store.json", "w") as f:
+        json.dump({"rooms": rooms}, f)
+
+    # Build the statistics and search index up front so saves only pay for themselves
+    get_statistics()
+    get_analysis_search()
+    writer_rng = random.Random(1)
+    saved_ids = []
+
+    def timed_save():
+        start = time.perf_counter()
+        saved_ids.append(save_analysis(synthetic_analysis(writer_rng, datetime.now()), filename="live.png")["id"])
+        return time.perf_counter() - start
+
+    idle_times = [timed_save() for _ in range(5)]
+
+    # Save analyses from another thread while the pass runs
+    manager = RetentionManager(hot_days=90, purge_days=0)
+    write_times = []
+    done = threading.Event()
+
+    def writer():
+        while not done.is_set():
+            write_times.append(timed_save())
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    summary = manager.run()
+    done.set()
+    thread.join()
+    # Nothing saved during the pass may be lost when the hot store is rewritten
+    hot_ids = {analysis["id"] for analysis in get_analysis_store()["analyses"]}
+    assert all(analysis_id in hot_ids for analysis_id in saved_ids)
+
+    before, after = summary["before"], summary["after"]
+    print(f"{args.records} analyses, {args.rooms} rooms; pass took {summary['seconds']:.1f}s")
+    print(f"  archived {summary['archived_analyses']} analyses and {summary['archived_rooms']} rooms "
+          f"into {after['archive_bytes'] / 1e6:.1f} MB of segments")
+    print(f"  analysis_store.json   {before['analysis_store_bytes'] / 1e6:8.1f} MB -> "
+          f"{after['analysis_store_bytes'] / 1e6:8.1f} MB")
+    print(f"  chat_store.json       {before['chat_store_bytes'] / 1e6:8.1f} MB -> "
+          f"{after['chat_store_bytes'] / 1e6:8.1f} MB")
+    print(f"  get_latest_analyses   {before['latest_analyses_ms']:8.1f} ms -> {after['latest_analyses_ms']:8.1f} ms")
+    print(f"  save_analysis before the pass: median {statistics.median(idle_times) * 1000:.0f} ms; "
+          f"during it: {len(write_times)} saves, median {statistics.median(write_times) * 1000:.0f} ms, "
+          f"max {max(write_times) * 1000:.0f} ms")
+    print(f"  save_analysis after the pass:  median {statistics.median([timed_save() for _ in range(5)]) * 1000:.0f} ms")
+
+    # Archived records stay reachable on demand
+    oldest = min(analyses, key=lambda analysis: analysis["date"])
+    start = time.perf_counter()
+    assert get_analysis_by_id(oldest["id"])["id"] == oldest["id"]
+    print(f"  archived lookup by id {(time.perf_counter() - start) * 1000:8.1f} ms")
+    start = time.perf_counter()
+    month = oldest["date"][:7]
+    count = sum(1 for _ in get_all_analyses(f"{month}-01", f"{month}-31"))
+    print(f"  one archived month    {(time.perf_counter() - start) * 1000:8.1f} ms ({count} analyses)")
+    assert get_chat_room("CASE-1")["closed_at"]
+
+
+if __name__ == "__main__":
+    main()
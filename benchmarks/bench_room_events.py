@@ -0,0 +1,95 @@
+"""Measure end-to-end message propagation through room events with many participants.
+
+Each simulated participant subscribes to the room and, like the live chat
+fragment, fetches messages after its last cursor whenever a message event
+arrives. A publisher posts through chat_system.add_message at a fixed rate;
+latency is from the post until a participant holds the new message. The
+browser adds at most CHAT_LIVE_POLL_SECONDS on top, as the fragment polls
+its subscription.
+
+Usage: python benchmarks/bench_room_events.py [--participants 10 100 500] [--messages 200] [--rate 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(participants, message_count, rate):
+    from chat_system import add_message, create_chat_room, get_messages
+    from room_events import get_event_bus
+
+    room = f"BENCH-{participants}"
+    create_chat_room(room, "Dr. Bench", "Propagation benchmark")
+    sent_at = {}
+    latencies = []
+    latencies_lock = threading.Lock()
+    ready = threading.Barrier(participants + 1)
+    bus = get_event_bus()
+
+    def participant():
+        subscription = bus.subscribe(room)
+        after = get_messages(room)[-1]["cursor"]
+        received = 0
+        ready.wait()
+        while received < message_count:
+            events = subscription.wait(timeout=5)
+            if not events:
+                break
+            if not any(event["type"] == "message_added" for event in events):
+                continue
+            messages = get_messages(room, after, 500)
+            now = time.perf_counter()
+            with latencies_lock:
+                latencies.extend(now - sent_at[message["content"]] for message in messages)
+            received += len(messages)
+            after = messages[-1]["cursor"] if messages else after
+        subscription.close()
+
+    threads = [threading.Thread(target=participant, daemon=True) for _ in range(participants)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+
+    start = time.perf_counter()
+    for i in range(message_count):
+        # Recorded before posting so a fast participant never misses the timestamp
+        sent_at[f"Message {i}"] = time.perf_counter()
+        add_message(room, "Dr. Bench", f"Message {i}")
+        time.sleep(max(0.0, start + (i + 1) / rate - time.perf_counter()))
+    for thread in threads:
+        thread.join()
+
+    expected = participants * message_count
+    print(f"  {participants:4d} participants: {len(latencies)}/{expected} deliveries, "
+          f"p50 {statistics.median(latencies) * 1000:6.1f} ms, p95 {percentile(latencies, 0.95) * 1000:6.1f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:6.1f} ms, max {max(latencies) * 1000:6.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=20, help="Messages posted per second")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    backend = "Redis" if os.environ.get("ROOM_EVENTS_REDIS_URL") else "in-process"
+    print(f"{backend} event bus, {args.messages} messages at {args.rate:.0f}/s")
+    for participants in args.participants:
+        run(participants, args.messages, args.rate)
+
+
+if __name__ == "__main__":
+    main()
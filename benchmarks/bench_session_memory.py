@@ -0,0 +1,114 @@
+"""Memory held by simulated Streamlit sessions that each keep a large DICOM image.
+
+Scenarios (each run in a fresh interpreter):
+  legacy  - the old file_data dict: PIL image plus a separate NumPy copy
+  compact - ProcessedImage: one pixel buffer with zero-copy views
+  blob    - ProcessedImage handle memory-mapped from the blob store
+
+Usage: python benchmarks/bench_session_memory.py [--sessions 50] [--size 2048]
+"""
+import argparse
+import io
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_dicom(rows, cols, seed):
+    """Build an in-memory 12-bit MONOCHROME2 DICOM upload"""
+    import numpy as np
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    pixels = np.random.default_rng(seed).integers(0, 4096, (rows, cols), dtype=np.uint16)
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.1"
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Rows, ds.Columns = rows, cols
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit = 16, 12, 11
+    ds.PixelRepresentation = 0
+    ds.PixelData = pixels.tobytes()
+
+    buffer = io.BytesIO()
+    ds.save_as(buffer, enforce_file_format=True)
+    upload = io.BytesIO(buffer.getvalue())
+    upload.name = f"session_{seed}.dcm"
+    return upload
+
+
+def read_rss():
+    """Return (anonymous, file-backed) resident memory in MiB"""
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                key, value = line.split(":")
+                values[key] = int(value.split()[0]) / 1024
+    return values.get("RssAnon", 0.0), values.get("RssFile", 0.0)
+
+
+def run_scenario(scenario, sessions, size):
+    import gc
+    from PIL import Image
+    from utils_simple import process_file, persist_image, load_processed_image
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_sessions_"))
+    gc.collect()
+    anon_before, file_before = read_rss()
+
+    held = []
+    for seed in range(sessions):
+        upload = make_dicom(size, size, seed)
+        processed = process_file(upload)
+        if scenario == "legacy":
+            held.append({"type": processed.type,
+                         "data": Image.fromarray(processed.array.copy()),
+                         "array": processed.array.copy()})
+        elif scenario == "compact":
+            held.append(processed)
+        else:
+            hashes = persist_image(upload.getvalue(), processed)
+            handle = load_processed_image(processed.type, **hashes)
+            # Touch the pixels the way a rerun would (display + heatmap input)
+            handle.data.load()
+            int(handle.array.sum())
+            held.append(handle)
+        del upload, processed
+        gc.collect()
+
+    anon_after, file_after = read_rss()
+    print(f"{scenario:8s} sessions={sessions} size={size}x{size} "
+          f"anon={anon_after - anon_before:8.1f} MiB  file-backed={file_after - file_before:8.1f} MiB  "
+          f"per-session anon={(anon_after - anon_before) / sessions:6.2f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--size", type=int, default=2048)
+    parser.add_argument("--scenario", choices=["legacy", "compact", "blob"])
+    args = parser.parse_args()
+
+    if args.scenario:
+        run_scenario(args.scenario, args.sessions, args.size)
+        return
+
+    for scenario in ("legacy", "compact", "blob"):
+        subprocess.run([sys.executable, __file__, "--scenario", scenario,
+                        "--sessions", str(args.sessions), "--size", str(args.size)], check=True)
+
+
+if __name__ == "__main__":
+    main()
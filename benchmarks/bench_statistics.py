@@ -0,0 +1,70 @@
+"""Statistics report render time against archive size: full recount vs running aggregates.
+
+Usage: python benchmarks/bench_statistics.py [--sizes 1000 10000 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from analysis_stats import AnalysisStats, compute_aggregates
+import utils_simple
+
+FINDINGS = ["pneumonia", "pleural effusion", "pulmonary nodule", "cardiomegaly", "atelectasis",
+            "pulmonary edema", "rib fracture", "interstitial fibrosis", "emphysema", "pneumothorax",
+            "consolidation", "ground-glass opacities", "metastasis", "lung mass", "tuberculosis"]
+
+
+def synthetic_analyses(count, rng):
+    start = datetime(2024, 1, 1)
+    for _ in range(count):
+        yield {
+            "id": str(uuid.uuid4()),
+            "type": rng.choice(["image", "image", "dicom", "nifti"]),
+            "keywords": rng.sample(FINDINGS, rng.randint(1, 4)),
+            "date": (start + timedelta(minutes=rng.randint(0, 60 * 24 * 540))).isoformat(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    workdir = tempfile.mkdtemp()
+    print(f"{'analyses':>10}  {'recount':>10}  {'report':>10}  {'record one':>10}")
+    print("(recount = counting alone from the store; report = full PDF from running aggregates)")
+    for size in args.sizes:
+        analyses = list(synthetic_analyses(size, rng))
+
+        start = time.perf_counter()
+        compute_aggregates(analyses)
+        recount = time.perf_counter() - start
+
+        stats = AnalysisStats(os.path.join(workdir, f"stats_{size}.db"))
+        stats.rebuild(analyses)
+        utils_simple.get_statistics = lambda: stats
+        start = time.perf_counter()
+        utils_simple.generate_statistics_report()
+        report = time.perf_counter() - start
+
+        extra = next(synthetic_analyses(1, rng))
+        start = time.perf_counter()
+        stats.record(extra)
+        record = time.perf_counter() - start
+        assert not stats.check(analyses + [extra])
+        stats.close()
+
+        print(f"{size:>10}  {recount * 1000:>8.1f}ms  {report * 1000:>8.1f}ms  {record * 1000:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
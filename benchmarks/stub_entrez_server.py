@@ -0,0 +1,164 @@
+"""Local stand-in for NCBI E-utilities (esearch, epost, efetch) used by the benchmarks.
+
+It serves deterministic PubMed-like records, keeps a per-WebEnv history server
+and answers HTTP 429 when clients exceed the configured requests per second,
+the same way NCBI throttles (optionally with a Retry-After header).
+
+Usage: python benchmarks/stub_entrez_server.py [--port 8765] [--rate 3] [--retry-after 1]
+"""
+import argparse
+import hashlib
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def stub_pmids(term, count):
+    """Deterministic PMIDs for a search term"""
+    seed = int(hashlib.sha256(term.lower().encode()).hexdigest()[:8], 16)
+    return [str(10_000_000 + (seed + i * 7919) % 9_000_000) for i in range(count)]
+
+
+def stub_medline(pmid):
+    """A MEDLINE record with a wrapped title and abstract"""
+    return (
+        f"PMID- {pmid}\n"
+        f"TI  - Imaging features of study {pmid}: a retrospective multicentre analysis of\n"
+        f"      radiological findings\n"
+        f"AB  - Background: stub abstract for {pmid}. Methods: retrospective review.\n"
+        f"      Results: findings were consistent across centres.\n"
+        f"FAU - Doe, Jane\n"
+        f"AU  - Doe J\n"
+        f"AU  - Roe R\n"
+        f"TA  - Radiology\n"
+        f"JT  - Radiology\n"
+        f"DP  - {2000 + int(pmid) % 25} Mar\n"
+        f"MH  - Radiography, Thoracic\n"
+        f"MH  - *Pneumonia/diagnostic imaging\n"
+        f"AID - 10.1000/stub.{pmid} [doi]\n"
+    )
+
+
+class StubEntrezState:
+    def __init__(self, rate, retry_after=None):
+        self.rate = rate
+        self.retry_after = retry_after
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.history = {}
+        self.recent = deque()
+        self.requests = 0
+        self.throttled = 0
+        # Requests that arrived before the Retry-After of an earlier 429 had passed
+        self.early_retries = 0
+
+    def allow(self):
+        """Sliding one-second window rate check"""
+        with self.lock:
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] > 1.0:
+                self.recent.popleft()
+            self.requests += 1
+            if now < self.blocked_until:
+                self.early_retries += 1
+            if len(self.recent) >= self.rate:
+                self.throttled += 1
+                if self.retry_after:
+                    self.blocked_until = now + self.retry_after
+                return False
+            self.recent.append(now)
+            return True
+
+    def store(self, webenv, ids):
+        with self.lock:
+            webenv = webenv or f"STUB_{uuid.uuid4().hex}"
+            keys = self.history.setdefault(webenv, [])
+            keys.append(ids)
+            return webenv, str(len(keys))
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _params(self):
+            params = parse_qs(urlparse(self.path).query)
+            if self.command == "POST":
+                length = int(self.headers.get("Content-Length", 0))
+                params.update(parse_qs(self.rfile.read(length).decode()))
+            return {key: values[0] for key, values in params.items()}
+
+        def _send(self, status, body, content_type="text/xml"):
+            payload = body.encode()
+            self.send_response(status)
+            if status == 429 and state.retry_after:
+                self.send_header("Retry-After", str(state.retry_after))
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _handle(self):
+            if not state.allow():
+                self._send(429, '{"error":"API rate limit exceeded"}', "application/json")
+                return
+            params = self._params()
+            endpoint = urlparse(self.path).path.rsplit("/", 1)[-1]
+
+            if endpoint == "esearch.fcgi":
+                ids = stub_pmids(params.get("term", ""), int(params.get("retmax", 20)))
+                body = f"<eSearchResult><Count>{len(ids)}</Count><RetMax>{len(ids)}</RetMax>"
+                if params.get("usehistory") == "y":
+                    webenv, query_key = state.store(params.get("WebEnv"), ids)
+                    body += f"<QueryKey>{query_key}</QueryKey><WebEnv>{webenv}</WebEnv>"
+                body += "<IdList>" + "".join(f"<Id>{pmid}</Id>" for pmid in ids) + "</IdList></eSearchResult>"
+                self._send(200, body)
+            elif endpoint == "epost.fcgi":
+                webenv, query_key = state.store(params.get("WebEnv"), params.get("id", "").split(","))
+                self._send(200, f"<ePostResult><QueryKey>{query_key}</QueryKey><WebEnv>{webenv}</WebEnv></ePostResult>")
+            elif endpoint == "efetch.fcgi":
+                if "id" in params:
+                    ids = params["id"].split(",")
+                else:
+                    keys = state.history.get(params.get("WebEnv"), [])
+                    index = int(params.get("query_key", 0)) - 1
+                    if not 0 <= index < len(keys):
+                        self._send(400, "<ERROR>Unknown query_key</ERROR>")
+                        return
+                    start = int(params.get("retstart", 0))
+                    ids = keys[index][start:start + int(params.get("retmax", 20))]
+                self._send(200, "\n".join(stub_medline(pmid) for pmid in ids), "text/plain")
+            else:
+                self._send(404, "<ERROR>Unknown endpoint</ERROR>")
+
+        do_GET = _handle
+        do_POST = _handle
+
+    return Handler
+
+
+def start_stub_server(port=0, rate=3, retry_after=None):
+    """Start the stub in a background thread; returns (server, state, base_url)"""
+    state = StubEntrezState(rate, retry_after)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/entrez/eutils/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub NCBI E-utilities server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", type=int, default=3)
+    parser.add_argument("--retry-after", type=int, help="Seconds to send in Retry-After with each 429")
+    args = parser.parse_args()
+    server, state, url = start_stub_server(args.port, args.rate, args.retry_after)
+    print(f"Stub E-utilities listening at {url} (ENTREZ_BASE_URL={url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,226 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import uuid
+import numpy as np
+
+# Content-addressed storage for uploaded images and derived artifacts
+class BlobStore:
+    """SHA-256 addressed blobs in sharded directories with reference counts"""
+
+    def __init__(self, root=None):
+        self.root = root or os.environ.get("BLOB_STORE_DIR", "blob_store")
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.refs_path = os.path.join(self.root, "refs.json")
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def path_for(self, blob_hash):
+        """Get the on-disk path of a blob (two levels of sharding)"""
+        return os.path.join(self.objects_dir, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    def exists(self, blob_hash):
+        """Check whether a blob is stored"""
+        return os.path.exists(self.path_for(blob_hash))
+
+    def put(self, data):
+        """Store bytes and return their hash; identical content is stored once"""
+        blob_hash = hashlib.sha256(data).hexdigest()
+        path = self.path_for(blob_hash)
+        if os.path.exists(path):
+            # Touch so a fresh unreferenced upload isn't collected straight away
+            os.utime(path)
+            return blob_hash
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return blob_hash
+
+    def put_array(self, array):
+        """Store a NumPy array in .npy format so it can be memory-mapped"""
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+        return self.put(buffer.getvalue())
+
+    def get(self, blob_hash):
+        """Read a blob's bytes"""
+        with open(self.path_for(blob_hash), "rb") as f:
+            return f.read()
+
+    def open(self, blob_hash):
+        """Open a blob as a binary file"""
+        return open(self.path_for(blob_hash), "rb")
+
+    def load_array(self, blob_hash):
+        """Load a stored array lazily through a read-only memory map"""
+        return np.load(self.path_for(blob_hash), mmap_mode="r", allow_pickle=False)
+
+    def size(self, blob_hash):
+        """Get a blob's size in bytes"""
+        return os.path.getsize(self.path_for(blob_hash))
+
+    # Derived variants (e.g. print-resolution copies), linked from their source blob;
+    # gc keeps a variant for as long as it keeps the source
+    def _derived_path(self, source_hash, variant):
+        return os.path.join(self.root, "derived", source_hash[:2], f"{source_hash}.{variant}")
+
+    def get_derived(self, source_hash, variant):
+        """Get the hash of a stored variant of a blob, or None"""
+        try:
+            with open(self._derived_path(source_hash, variant), "r") as f:
+                blob_hash = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return blob_hash if self.exists(blob_hash) else None
+
+    def put_derived(self, source_hash, variant, data):
+        """Store a variant of a blob and link it from the source hash"""
+        blob_hash = self.put(data)
+        path = self._derived_path(source_hash, variant)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(blob_hash)
+        os.replace(temp_path, path)
+        return blob_hash
+
+    def iter_derived(self):
+        """Yield (link path, source hash, variant hash) for every derived variant"""
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "derived")):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    with open(path, "r") as f:
+                        blob_hash = f.read().strip()
+                except FileNotFoundError:
+                    continue
+                yield path, filename.split(".", 1)[0], blob_hash
+
+    # Reference counting
+    def _load_refs(self):
+        if os.path.exists(self.refs_path):
+            with open(self.refs_path, "r") as f:
+                return json.load(f)
+        return {"refs": {}}
+
+    def _save_refs(self, refs):
+        temp_path = f"{self.refs_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(refs, f)
+        os.replace(temp_path, self.refs_path)
+
+    def incref(self, *blob_hashes):
+        """Add a reference to each blob"""
+        with self._lock:
+            refs = self._load_refs()
+            for blob_hash in blob_hashes:
+                if blob_hash:
+                    refs["refs"][blob_hash] = refs["refs"].get(blob_hash, 0) + 1
+            self._save_refs(refs)
+
+    def decref(self, *blob_hashes):
+        """Drop a reference from each blob"""
+        with self._lock:
+            refs = self._load_refs()
+            for blob_hash in blob_hashes:
+                if blob_hash in refs["refs"]:
+                    refs["refs"][blob_hash] -= 1
+                    if refs["refs"][blob_hash] <= 0:
+                        del refs["refs"][blob_hash]
+            self._save_refs(refs)
+
+    def refcount(self, blob_hash):
+        """Get the number of references to a blob"""
+        with self._lock:
+            return self._load_refs()["refs"].get(blob_hash, 0)
+
+    def iter_blobs(self):
+        """Yield the hash of every stored blob"""
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for filename in filenames:
+                if not filename.endswith(".tmp"):
+                    yield filename
+
+    def _recent(self, blob_hash, cutoff):
+        try:
+            return os.path.getmtime(self.path_for(blob_hash)) > cutoff
+        except FileNotFoundError:
+            return False
+
+    def gc(self, grace_seconds=3600):
+        """Delete unreferenced blobs older than the grace period
+
+        Derived variants carry no references of their own; they are kept
+        while their source is, and their links are dropped with it.
+        """
+        removed, freed = 0, 0
+        cutoff = time.time() - grace_seconds
+        with self._lock:
+            referenced = self._load_refs()["refs"]
+            links = list(self.iter_derived())
+            kept_variants = {blob_hash for _, source_hash, blob_hash in links
+                             if referenced.get(source_hash, 0) > 0 or self._recent(source_hash, cutoff)}
+            for blob_hash in list(self.iter_blobs()):
+                path = self.path_for(blob_hash)
+                if referenced.get(blob_hash, 0) > 0 or blob_hash in kept_variants:
+                    continue
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    continue
+            for link_path, source_hash, blob_hash in links:
+                if not self.exists(source_hash) or not self.exists(blob_hash):
+                    try:
+                        os.remove(link_path)
+                    except FileNotFoundError:
+                        pass
+        return {"removed": removed, "bytes_freed": freed}
+
+    def stats(self):
+        """Summarize blob count, total size and referenced blobs"""
+        count, total = 0, 0
+        for blob_hash in self.iter_blobs():
+            count += 1
+            total += self.size(blob_hash)
+        with self._lock:
+            referenced = len(self._load_refs()["refs"])
+        return {"blobs": count, "bytes": total, "referenced": referenced}
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def get_blob_store():
+    """Get the shared blob store"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = BlobStore()
+        return _default_store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the image blob store")
+    parser.add_argument("command", choices=["stats", "gc"])
+    parser.add_argument("--grace", type=int, default=3600, help="Seconds an unreferenced blob is kept")
+    args = parser.parse_args()
+
+    store = get_blob_store()
+    if args.command == "gc":
+        print(store.gc(grace_seconds=args.grace))
+    else:
+        print(store.stats())
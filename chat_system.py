@@ -6,82 +6,237 @@ import json
 import os
 import uuid
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import openai
+from utils_simple import get_openai_client
+from archive_store import get_archive_store
+from message_store import get_message_store
+from room_events import get_event_bus
+from conversation_memory import get_conversation_memory
+from answer_cache import get_answer_cache, content_version
+from embeddings import get_embedding_provider, encode_one
+
+# Seconds between checks for room events while a discussion is open
+LIVE_POLL_SECONDS = float(os.environ.get("CHAT_LIVE_POLL_SECONDS", 1.0))
+
+# Model and prompt version for case discussion answers (part of the answer cache key)
+CHAT_MODEL = "gpt-3.5-turbo"
+CHAT_PROMPT_VERSION = "case-discussion-1"
+
+# Seconds between saves of a reply that is still streaming in
+REPLY_UPDATE_SECONDS = 0.25
+
+# Canned consultant replies
+DOCTOR_RESPONSES = {
+    "Dr. Johnson": "From a cardiac perspective, I'd want to rule out any cardiac involvement. The mild cardiomegaly noted in the image warrants further cardiac workup, possibly an echocardiogram.",
+    "Dr. Chen": "These infiltrates have a distribution pattern typical of atypical pneumonia. I'd recommend a sputum culture and respiratory pathogen panel to identify the causative agent.",
+    "Dr. Patel": "The radiographic findings show bilateral infiltrates with ground-glass opacities. This pattern is most consistent with an inflammatory process, likely infectious in etiology."
+}
 
 # Chat system storage
-def get_chat_store():
-    """Get the chat storage"""
+# Held for each read-modify-write of chat_store.json (room metadata and archiving)
+chat_store_lock = threading.RLock()
+
+def _read_chat_store():
     if os.path.exists("chat_store.json"):
         with open("chat_store.json", "r") as f:
             return json.load(f)
     return {"rooms": {}}
 
+_inline_checked = False
+
+def _move_inline_messages():
+    """Move messages that older stores kept inside chat_store.json into the message store (once)"""
+    global _inline_checked
+    if _inline_checked:
+        return
+    with chat_store_lock:
+        store = _read_chat_store()
+        if any("messages" in room for room in store["rooms"].values()):
+            message_store = get_message_store()
+            for room_id, room in store["rooms"].items():
+                if "messages" in room:
+                    message_store.import_messages(room_id, room.pop("messages"))
+            save_chat_store(store)
+        _inline_checked = True
+
+def get_chat_store():
+    """Get the chat storage (open rooms; messages live in the message store)"""
+    _move_inline_messages()
+    return _read_chat_store()
+
 def save_chat_store(store):
-    """Save the chat storage"""
-    with open("chat_store.json", "w") as f:
+    """Save the chat storage atomically, so readers never see a partial file"""
+    temp_path = f"chat_store.json.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w") as f:
         json.dump(store, f)
+    os.replace(temp_path, "chat_store.json")
+
+def get_chat_room(case_id):
+    """Get a room from the chat store, falling back to the archive"""
+    room = get_chat_store()["rooms"].get(case_id)
+    if room is None:
+        # Archived rooms carry their messages with them
+        room = get_archive_store().find("rooms", case_id)
+    return room
 
 def create_chat_room(case_id, creator_name, case_description):
     """Create a new chat room for a case"""
-    store = get_chat_store()
+    with chat_store_lock:
+        store = get_chat_store()
     
-    # Generate a unique room ID if one doesn't exist
-    if case_id not in store["rooms"]:
-        room_data = {
-            "id": case_id,
-            "created_at": datetime.now().isoformat(),
-            "creator": creator_name,
-            "description": case_description,
-            "participants": [creator_name, "Dr. AI Assistant", "Dr. Johnson", "Dr. Chen", "Dr. Patel"],
-            "messages": []
-        }
-        # Add an initial welcome message from AI
-        welcome_message = {
-            "id": str(uuid.uuid4()),
-            "user": "Dr. AI Assistant",
-            "content": f"Welcome to the case discussion for '{case_description}'. I've analyzed the image and I'm here to assist with the diagnosis. Feel free to ask me specific questions about the findings.",
-            "type": "text",
-            "timestamp": datetime.now().isoformat()
-        }
-        room_data["messages"].append(welcome_message)
-        
-        store["rooms"][case_id] = room_data
-        save_chat_store(store)
+        # Generate a unique room ID if one doesn't exist
+        if case_id not in store["rooms"]:
+            room_data = {
+                "id": case_id,
+                "created_at": datetime.now().isoformat(),
+                "creator": creator_name,
+                "description": case_description,
+                "participants": [creator_name, "Dr. AI Assistant", "Dr. Johnson", "Dr. Chen", "Dr. Patel"]
+            }
+            store["rooms"][case_id] = room_data
+            save_chat_store(store)
+            
+            # Add an initial welcome message from AI
+            get_message_store().add(
+                case_id, "Dr. AI Assistant",
+                f"Welcome to the case discussion for '{case_description}'. I've analyzed the image and I'm here to assist with the diagnosis. Feel free to ask me specific questions about the findings."
+            )
     
     return case_id
 
 def join_chat_room(case_id, user_name):
     """Join an existing chat room"""
-    store = get_chat_store()
-    
-    if case_id in store["rooms"]:
-        if user_name not in store["rooms"][case_id]["participants"]:
-            store["rooms"][case_id]["participants"].append(user_name)
-            save_chat_store(store)
-        return True
+    with chat_store_lock:
+        store = get_chat_store()
+        
+        if case_id in store["rooms"] and not store["rooms"][case_id].get("closed_at"):
+            if user_name not in store["rooms"][case_id]["participants"]:
+                store["rooms"][case_id]["participants"].append(user_name)
+                save_chat_store(store)
+                get_event_bus().publish(case_id, "participant_joined", user=user_name)
+            return True
     
     return False
 
 def add_message(case_id, user_name, message, message_type="text"):
-    """Add a message to a chat room"""
-    store = get_chat_store()
+    """Add a message to a chat room (an indexed insert; chat_store.json isn't rewritten)"""
+    room = get_chat_store()["rooms"].get(case_id)
     
-    if case_id in store["rooms"]:
-        message_data = {
-            "id": str(uuid.uuid4()),
-            "user": user_name,
-            "content": message,
-            "type": message_type,
-            "timestamp": datetime.now().isoformat()
-        }
-        store["rooms"][case_id]["messages"].append(message_data)
-        save_chat_store(store)
+    if room is not None and not room.get("closed_at"):
+        message_data = get_message_store().add(case_id, user_name, message, message_type)
+        get_event_bus().publish(case_id, "message_added", cursor=message_data["cursor"], user=user_name)
         return message_data
     
     return None
 
+def close_chat_room(case_id, user_name):
+    """Close a discussion; closed rooms are read-only and archived by the retention job"""
+    with chat_store_lock:
+        store = get_chat_store()
+        
+        room = store["rooms"].get(case_id)
+        if room is None or room.get("closed_at"):
+            return False
+        room["closed_at"] = datetime.now().isoformat()
+        room["closed_by"] = user_name
+        save_chat_store(store)
+        get_event_bus().publish(case_id, "room_closed", user=user_name)
+        return True
+
+def get_messages(case_id, after_cursor=None, limit=50):
+    """Messages after a cursor, oldest first; without a cursor, the latest `limit`"""
+    _move_inline_messages()
+    return get_message_store().get_messages(case_id, after_cursor, limit)
+
+def get_messages_before(case_id, cursor=None, limit=50):
+    """The `limit` messages before a cursor, oldest first (for loading older history)"""
+    _move_inline_messages()
+    return get_message_store().get_messages_before(case_id, cursor, limit)
+
+def message_window(room_id, page_size=50):
+    """Messages on screen for a room, kept in session state and topped up by cursor
+
+    The first render loads the latest page; later reruns only fetch
+    messages after the newest cursor already shown, plus any replies on
+    screen that were still being generated.
+    """
+    key = f"messages_{room_id}"
+    window = st.session_state.get(key)
+    if window is None:
+        messages = get_messages_before(room_id, None, page_size)
+        window = {"messages": messages, "has_older": len(messages) == page_size}
+        st.session_state[key] = window
+    else:
+        _fetch_new_messages(window, room_id, page_size)
+        pending = [message["cursor"] for message in window["messages"] if message["type"] == "pending"]
+        if pending:
+            _refresh_messages(window, room_id, pending)
+    return window
+
+def _fetch_new_messages(window, room_id, page_size=50):
+    while True:
+        after = window["messages"][-1]["cursor"] if window["messages"] else 0
+        new_messages = get_messages(room_id, after, page_size)
+        window["messages"].extend(new_messages)
+        if len(new_messages) < page_size:
+            return
+
+def load_older_messages(room_id, page_size=50):
+    """Prepend the page of messages before the oldest one on screen"""
+    window = message_window(room_id, page_size)
+    oldest = window["messages"][0]["cursor"] if window["messages"] else None
+    older = get_messages_before(room_id, oldest, page_size)
+    window["messages"][:0] = older
+    window["has_older"] = len(older) == page_size
+
+def room_subscription(room_id):
+    """This session's subscription to a room's events"""
+    key = f"events_{room_id}"
+    if key not in st.session_state:
+        st.session_state[key] = get_event_bus().subscribe(room_id)
+    return st.session_state[key]
+
+def render_message(msg, user_name):
+    with st.chat_message(name=msg["user"], avatar="👨‍⚕️" if msg["user"] != user_name else "🧑‍⚕️"):
+        if msg["type"] == "annotation":
+            st.write("📝 **Image Annotation:**")
+        if msg["type"] == "pending":
+            # A reply still being generated in the background
+            if msg["content"]:
+                st.write(msg["content"] + " ▌")
+            else:
+                st.caption(f"{msg['user']} is thinking…")
+        else:
+            st.write(msg["content"])
+
+def _refresh_messages(window, room_id, cursors):
+    updated = {message["cursor"]: message for message in get_message_store().get_by_cursors(room_id, cursors)}
+    window["messages"] = [updated.get(message["cursor"], message) for message in window["messages"]]
 
+@st.fragment(run_every=LIVE_POLL_SECONDS)
+def render_live_messages(case_id, user_name):
+    """Messages posted since the last full run, redrawn on their own as room events arrive
 
+    Between events this only drains an in-memory queue; the message store
+    is queried when a message event comes in, and only after the newest
+    cursor on screen (or for the replies that were updated).
+    """
+    window = st.session_state[f"messages_{case_id}"]
+    events = room_subscription(case_id).drain()
+    if any(event["type"] == "room_closed" for event in events):
+        st.rerun(scope="app")
+    if any(event["type"] == "message_added" for event in events):
+        _fetch_new_messages(window, case_id)
+    updated = {event["cursor"] for event in events if event["type"] in ("message_updated", "ai_reply_ready")}
+    if updated:
+        _refresh_messages(window, case_id, updated)
+    for event in events:
+        if event["type"] == "participant_joined" and event["user"] != user_name:
+            st.toast(f"{event['user']} joined the discussion")
+    for msg in window["messages"][window["live_from"]:]:
+        render_message(msg, user_name)
 
 def get_available_rooms():
     """Get a list of all available chat rooms"""
@@ -89,6 +244,8 @@ def get_available_rooms():
     rooms = []
     
     for room_id, room_data in store["rooms"].items():
+        if room_data.get("closed_at"):
+            continue
         rooms.append({
             "id": room_id,
             "description": room_data["description"],
@@ -101,14 +258,7 @@ def get_available_rooms():
     rooms.sort(key=lambda x: x["created_at"], reverse=True)
     return rooms
 
-def get_openai_response(user_question, case_description, findings=None, api_key=None):
-    """Get a response from OpenAI based on the medical context and user question"""
-    if not api_key:
-        return "Please configure your OpenAI API key in the sidebar to get AI responses."
-    
-    # Set up OpenAI client
-    client = openai.OpenAI(api_key=api_key)
-    
+def _system_prompt(case_description, findings=None):
     # Create the findings text if available
     findings_text = ""
     if findings and len(findings) > 0:
@@ -117,7 +267,7 @@ def get_openai_response(user_question, case_description, findings=None, api_key=
             findings_text += f"{i}. {finding}\n"
     
     # Create system prompt with medical context
-    system_prompt = f"""You are Dr. AI Assistant, a medical specialist analyzing a medical image. 
+    return f"""You are Dr. AI Assistant, a medical specialist analyzing a medical image. 
     The image is from a case described as: "{case_description}". 
     {findings_text}
     
@@ -126,25 +276,132 @@ def get_openai_response(user_question, case_description, findings=None, api_key=
     Respond as if you are speaking directly to the doctor in a collaborative setting.
     Keep your response concise but informative, focusing on the relevant medical details.
     """
+
+def stream_openai_response(user_question, case_description, findings=None, api_key=None, history=None):
+    """Yield a response from OpenAI piece by piece as it is generated
+
+    `history` is the room's conversation memory (see ConversationMemory.prompt_messages).
+    Answers are cached per question, case (description and findings) and
+    memory, so the same question about the same case with the same earlier
+    discussion is answered once.
+    """
+    if not api_key:
+        yield "Please configure your OpenAI API key in the sidebar to get AI responses."
+        return
+    
+    # Set up OpenAI client
+    client = get_openai_client(api_key)
+    
+    # Repeated questions about the same case are answered from the cache
+    cache = get_answer_cache()
+    context = [("case", content_version(case_description, findings))]
+    # The answer also depends on the earlier discussion; only identical memory shares it
+    if history:
+        context.append(("history", content_version(history)))
+    embedder = get_embedding_provider(api_key)
+    answer, embedding = cache.get(user_question, context, CHAT_MODEL, CHAT_PROMPT_VERSION,
+                                  lambda text: encode_one(embedder, text), embedder.name)
+    if answer is not None:
+        yield answer
+        return
     
     try:
         # Make the API call to OpenAI
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",  # You can use "gpt-4" for more advanced responses
+        stream = client.chat.completions.create(
+            model=CHAT_MODEL,  # You can use "gpt-4" for more advanced responses
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": _system_prompt(case_description, findings)},
+                *(history or []),
                 {"role": "user", "content": user_question}
             ],
             max_tokens=300,
             temperature=0.2,  # Lower temperature for more consistent medical responses
+            stream=True,
         )
-        
-        # Extract and return the response text
-        return response.choices[0].message.content
+        answer = ""
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                answer += chunk.choices[0].delta.content
+                yield chunk.choices[0].delta.content
+        cache.put(user_question, context, CHAT_MODEL, CHAT_PROMPT_VERSION, answer, embedding,
+                  embedder_name=embedder.name)
     
     except Exception as e:
         print(f"Error with OpenAI API: {e}")
-        return f"I apologize, but I encountered an error while analyzing your question. Please try again or rephrase your question. Error details: {str(e)}"
+        yield f"I apologize, but I encountered an error while analyzing your question. Please try again or rephrase your question. Error details: {str(e)}"
+
+def get_openai_response(user_question, case_description, findings=None, api_key=None, history=None):
+    """Get a response from OpenAI based on the medical context and user question"""
+    return "".join(stream_openai_response(user_question, case_description, findings, api_key, history))
+
+# Background replies: generated off the session thread, so posting never blocks
+_reply_executor = None
+_reply_lock = threading.Lock()
+
+def get_reply_executor():
+    """Thread pool shared by every session for AI and consultant replies"""
+    global _reply_executor
+    with _reply_lock:
+        if _reply_executor is None:
+            _reply_executor = ThreadPoolExecutor(
+                max_workers=int(os.environ.get("CHAT_REPLY_WORKERS", 4)), thread_name_prefix="chat-reply"
+            )
+        return _reply_executor
+
+def _fill_reply(case_id, cursor, chunks, api_key=None):
+    """Write a reply into its placeholder as it streams in, announcing each update
+
+    Once the reply is delivered, older turns are folded into the room's
+    conversation memory.
+    """
+    message_store, bus = get_message_store(), get_event_bus()
+    content, last_update = "", time.monotonic()
+    try:
+        for chunk in chunks:
+            content += chunk
+            if time.monotonic() - last_update >= REPLY_UPDATE_SECONDS:
+                message_store.update(cursor, content)
+                bus.publish(case_id, "message_updated", cursor=cursor)
+                last_update = time.monotonic()
+    except Exception as e:
+        content += f"\n\n(Reply interrupted: {e})"
+    message_store.update(cursor, content, message_type="text")
+    bus.publish(case_id, "ai_reply_ready", cursor=cursor)
+    try:
+        get_conversation_memory().compact(case_id, api_key)
+    except Exception as e:
+        print(f"Error updating conversation memory: {e}")
+
+def _start_reply(case_id, author, chunks, api_key=None):
+    placeholder = add_message(case_id, author, "", message_type="pending")
+    if placeholder is None:
+        return None
+    get_reply_executor().submit(_fill_reply, case_id, placeholder["cursor"], chunks, api_key)
+    return placeholder
+
+def _ai_reply(case_id, question, question_cursor, case_description, findings, api_key):
+    # Runs on the worker: the room's memory is read there, not in the session
+    history = get_conversation_memory().prompt_messages(case_id, "Dr. AI Assistant", question_cursor)
+    yield from stream_openai_response(question, case_description, findings, api_key, history)
+
+def request_ai_reply(case_id, question, case_description, findings=None, api_key=None, question_cursor=None):
+    """Post a "thinking" placeholder at once and stream the AI reply into it in the background
+
+    The AI sees the room's conversation memory up to `question_cursor`
+    (the posted question), or up to the reply without it.
+    """
+    chunks = _ai_reply(case_id, question, question_cursor, case_description, findings, api_key)
+    return _start_reply(case_id, "Dr. AI Assistant", chunks, api_key)
+
+def _typed_reply(text, delay=1.0):
+    # Consultants take a moment to start typing
+    time.sleep(delay)
+    yield text
+
+def request_doctor_reply(case_id, doctor_name, api_key=None):
+    """Post a placeholder for a consultant and fill it in the background"""
+    text = DOCTOR_RESPONSES.get(doctor_name, "I concur with the assessment. Let's monitor the patient's response to treatment.")
+    return _start_reply(case_id, doctor_name, _typed_reply(text), api_key)
 
 def render_chat_interface():
     """Render the chat interface in the Streamlit app"""
@@ -206,11 +463,20 @@ def render_chat_interface():
     # Active chat display
     if "current_case_id" in st.session_state:
         case_id = st.session_state.current_case_id
-        store = get_chat_store()
+        room_data = get_chat_room(case_id)
         
-        if case_id in store["rooms"]:
-            room_data = store["rooms"][case_id]
-            
+        if room_data and room_data.get("closed_at"):
+            # Closed (possibly archived) discussions are shown read-only
+            st.subheader(f"Case Discussion: {room_data['description']}")
+            st.caption(f"Closed by {room_data.get('closed_by', 'unknown')} on {room_data['closed_at'][:10]}")
+            messages = room_data["messages"] if "messages" in room_data else message_window(case_id)["messages"]
+            for msg in messages:
+                render_message(msg, user_name)
+            if st.button("Return to Room Selection"):
+                del st.session_state.current_case_id
+                st.rerun()
+        
+        elif room_data:
             # Display chat header
             st.subheader(f"Case Discussion: {room_data['description']}")
             st.caption(f"Created by {room_data['creator']} • {len(room_data['participants'])} participants")
@@ -232,55 +498,38 @@ def render_chat_interface():
                         # Extract just the name part
                         doctor_name = doctor_name.split(" (")[0]
             
-            # Display messages
-            messages = get_messages(case_id)
+            # Display messages (only new ones are fetched on each rerun)
+            subscription = room_subscription(case_id)
+            subscription.drain()
+            window = message_window(case_id)
+            if window["has_older"] and st.button("Load earlier messages"):
+                load_older_messages(case_id)
+            
+            # Replies still streaming in and later messages are drawn by the live fragment
+            pending = [idx for idx, msg in enumerate(window["messages"]) if msg["type"] == "pending"]
+            window["live_from"] = pending[0] if pending else len(window["messages"])
             
             chat_container = st.container()
             with chat_container:
-                for msg in messages:
-                    with st.chat_message(name=msg["user"], avatar="👨‍⚕️" if msg["user"] != user_name else "🧑‍⚕️"):
-                        if msg["type"] == "text":
-                            st.write(msg["content"])
-                        elif msg["type"] == "annotation":
-                            st.write("📝 **Image Annotation:**")
-                            st.write(msg["content"])
+                for msg in window["messages"][:window["live_from"]]:
+                    render_message(msg, user_name)
+                render_live_messages(case_id, user_name)
             
             # Message input
             message = st.chat_input("Type your message here")
             if message:
                 # Add user message
-                add_message(case_id, user_name, message)
+                posted = add_message(case_id, user_name, message)
+                api_key = st.session_state.get("OPENAI_API_KEY", None)
                 
-                # Get response from OpenAI or another doctor based on settings
+                # Replies are generated in the background and stream into a placeholder
                 if get_ai_response:
-                    # Add a small delay to simulate AI thinking
-                    with st.spinner("AI Assistant is analyzing..."):
-                        time.sleep(1)
-                    
-                    # Get findings if available
                     findings = st.session_state.get("findings", None)
-                    
-                    # Get API key from session state
-                    api_key = st.session_state.get("OPENAI_API_KEY", None)
-                    
-                    # Generate and add AI response using OpenAI
-                    ai_response = get_openai_response(message, room_data["description"], findings, api_key)
-                    add_message(case_id, "Dr. AI Assistant", ai_response)
+                    request_ai_reply(case_id, message, room_data["description"], findings, api_key,
+                                     question_cursor=posted["cursor"] if posted else None)
                 
                 elif doctor_response:
-                    # Use simulated doctor responses (these could also be OpenAI generated with different prompts)
-                    with st.spinner(f"{doctor_name} is typing..."):
-                        time.sleep(1)
-                    
-                    # Simple doctor response generation
-                    doctor_responses = {
-                        "Dr. Johnson": "From a cardiac perspective, I'd want to rule out any cardiac involvement. The mild cardiomegaly noted in the image warrants further cardiac workup, possibly an echocardiogram.",
-                        "Dr. Chen": "These infiltrates have a distribution pattern typical of atypical pneumonia. I'd recommend a sputum culture and respiratory pathogen panel to identify the causative agent.",
-                        "Dr. Patel": "The radiographic findings show bilateral infiltrates with ground-glass opacities. This pattern is most consistent with an inflammatory process, likely infectious in etiology."
-                    }
-                    
-                    doc_response = doctor_responses.get(doctor_name, "I concur with the assessment. Let's monitor the patient's response to treatment.")
-                    add_message(case_id, doctor_name, doc_response)
+                    request_doctor_reply(case_id, doctor_name, api_key)
                 
                 st.rerun()
             
@@ -290,6 +539,10 @@ def render_chat_interface():
                 if st.button("Submit Annotation"):
                     add_message(case_id, user_name, annotation, message_type="annotation")
                     st.rerun()
+            
+            if st.button("Close Discussion"):
+                close_chat_room(case_id, user_name)
+                st.rerun()
         else:
             # Handle case where room no longer exists
             st.error("This case discussion no longer exists")
@@ -0,0 +1,253 @@
+import json
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from text_index import SegmentedIndex
+
+# Local ClinicalTrials.gov snapshot: importer, index and query API
+STATUS_LABELS = {
+    "RECRUITING": "Recruiting",
+    "NOT_YET_RECRUITING": "Not yet recruiting",
+    "ENROLLING_BY_INVITATION": "Enrolling by invitation",
+    "ACTIVE_NOT_RECRUITING": "Active, not recruiting",
+    "COMPLETED": "Completed",
+    "SUSPENDED": "Suspended",
+    "TERMINATED": "Terminated",
+    "WITHDRAWN": "Withdrawn",
+    "UNKNOWN": "Unknown status",
+    "AVAILABLE": "Available",
+    "NO_LONGER_AVAILABLE": "No longer available",
+    "TEMPORARILY_NOT_AVAILABLE": "Temporarily not available",
+    "APPROVED_FOR_MARKETING": "Approved for marketing",
+    "WITHHELD": "Withheld",
+}
+OPEN_STATUSES = ("Recruiting", "Not yet recruiting", "Enrolling by invitation", "Active, not recruiting")
+
+def normalize_status(status):
+    """Map API v2 enum or legacy XML status text to one label"""
+    if not status:
+        return "Unknown status"
+    return STATUS_LABELS.get(status.strip().upper().replace(", ", "_").replace(" ", "_"), status.strip())
+
+def normalize_phase(phases):
+    """Phase list ("PHASE2", "Phase 2", "EARLY_PHASE1", "NA") to a display label"""
+    labels = []
+    for phase in phases:
+        phase = phase.strip().upper().replace(" ", "")
+        if phase in ("NA", "N/A", ""):
+            continue
+        if phase.startswith("EARLY_PHASE"):
+            labels.append(f"Early Phase {phase[-1]}")
+        elif phase.startswith("PHASE"):
+            labels.append(f"Phase {phase[5:]}")
+        else:
+            labels.append(phase.title())
+    return "/".join(labels) or "N/A"
+
+def parse_study_json(study):
+    """Normalize one ClinicalTrials.gov API v2 study object"""
+    protocol = study.get("protocolSection", {})
+    ident = protocol.get("identificationModule", {})
+    status = protocol.get("statusModule", {})
+    design = protocol.get("designModule", {})
+    locations = protocol.get("contactsLocationsModule", {}).get("locations", [])
+    return {
+        "id": ident.get("nctId", ""),
+        "title": ident.get("briefTitle") or ident.get("officialTitle", ""),
+        "status": normalize_status(status.get("overallStatus")),
+        "phase": normalize_phase(design.get("phases", [])),
+        "conditions": protocol.get("conditionsModule", {}).get("conditions", []),
+        "keywords": protocol.get("conditionsModule", {}).get("keywords", []),
+        "interventions": [item.get("name", "") for item in
+                          protocol.get("armsInterventionsModule", {}).get("interventions", [])],
+        "locations": [", ".join(part for part in (loc.get("facility"), loc.get("city"), loc.get("country")) if part)
+                      for loc in locations],
+        "summary": protocol.get("descriptionModule", {}).get("briefSummary", ""),
+        "last_update": status.get("lastUpdatePostDateStruct", {}).get("date", ""),
+    }
+
+def parse_study_xml(root):
+    """Normalize one legacy <clinical_study> XML document"""
+    def text(path):
+        return (root.findtext(path) or "").strip()
+
+    locations = []
+    for location in root.findall("location"):
+        parts = [location.findtext("facility/name"), location.findtext("facility/address/city"),
+                 location.findtext("facility/address/country")]
+        locations.append(", ".join(part.strip() for part in parts if part))
+    last_update = text("last_update_posted") or text("lastchanged_date")
+    try:
+        last_update = time.strftime("%Y-%m-%d", time.strptime(last_update, "%B %d, %Y"))
+    except ValueError:
+        pass
+    return {
+        "id": text("id_info/nct_id"),
+        "title": text("brief_title") or text("official_title"),
+        "status": normalize_status(text("overall_status")),
+        "phase": normalize_phase(text("phase").split("/")),
+        "conditions": [el.text.strip() for el in root.findall("condition") if el.text],
+        "keywords": [el.text.strip() for el in root.findall("keyword") if el.text],
+        "interventions": [el.text.strip() for el in root.findall("intervention/intervention_name") if el.text],
+        "locations": locations,
+        "summary": text("brief_summary/textblock"),
+        "last_update": last_update,
+    }
+
+def iter_studies(path):
+    """Yield normalized studies from an export file, directory or zip archive
+
+    Accepts API v2 JSON (single study, {"studies": [...]} pages or JSON
+    lines) and legacy per-study XML. Members are read one at a time.
+    """
+    def from_bytes(name, data):
+        if name.endswith(".xml"):
+            yield parse_study_xml(ET.fromstring(data))
+            return
+        text = data.decode("utf-8").strip()
+        if not text:
+            return
+        if text.startswith("["):
+            for study in json.loads(text):
+                yield parse_study_json(study)
+        elif text.startswith("{") and "\n{" not in text:
+            document = json.loads(text)
+            for study in document.get("studies", [document]):
+                yield parse_study_json(study)
+        else:
+            for line in text.splitlines():
+                if line.strip():
+                    yield parse_study_json(json.loads(line))
+
+    if os.path.isdir(path):
+        for dirpath, _, filenames in os.walk(path):
+            for filename in sorted(filenames):
+                if filename.endswith((".json", ".jsonl", ".xml")):
+                    with open(os.path.join(dirpath, filename), "rb") as f:
+                        yield from from_bytes(filename, f.read())
+    elif path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                if member.endswith((".json", ".jsonl", ".xml")):
+                    yield from from_bytes(member, archive.read(member))
+    else:
+        with open(path, "rb") as f:
+            yield from from_bytes(path, f.read())
+
+
+class TrialIndex(SegmentedIndex):
+    """Indexed local store of clinical trials"""
+
+    doc_columns = {"status": "TEXT", "phase": "TEXT", "last_update": "TEXT"}
+    field_weights = {"title": 3.0, "conditions": 3.0, "interventions": 2.0, "keywords": 1.5,
+                     "summary": 1.0, "locations": 0.5}
+
+    @staticmethod
+    def doc_id(nct_id):
+        return int(nct_id[3:]) if nct_id.upper().startswith("NCT") and nct_id[3:].isdigit() else None
+
+    def add_trial(self, trial):
+        """Index one trial unless the stored copy is already as recent; returns True if written"""
+        doc_id = self.doc_id(trial["id"])
+        if doc_id is None:
+            return False
+        row = self.conn.execute("SELECT last_update FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row and row[0] and trial["last_update"] and row[0] >= trial["last_update"]:
+            return False
+
+        self.add(
+            doc_id,
+            {
+                "title": trial["title"],
+                "conditions": " ".join(trial["conditions"]),
+                "interventions": " ".join(trial["interventions"]),
+                "keywords": " ".join(trial["keywords"]),
+                "summary": trial["summary"],
+                "locations": " ".join(trial["locations"]),
+            },
+            {key: trial[key] for key in ("id", "title", "status", "phase", "conditions",
+                                         "interventions", "locations", "last_update")},
+            status=trial["status"],
+            phase=trial["phase"],
+            last_update=trial["last_update"],
+        )
+        return True
+
+    def import_export(self, path, progress=None):
+        """Import (or incrementally refresh from) a bulk export; returns (seen, written)"""
+        seen, written = 0, 0
+        for trial in iter_studies(path):
+            seen += 1
+            if self.add_trial(trial):
+                written += 1
+            if progress and seen % 10000 == 0:
+                progress(seen, written)
+        self.flush()
+        return seen, written
+
+    def search_trials(self, keywords, conditions=None, status=None, phase=None, max_results=3):
+        """Ranked trials for keywords/conditions, optionally filtered by status and phase"""
+        where, params = [], []
+        if status:
+            statuses = [status] if isinstance(status, str) else list(status)
+            where.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        if phase:
+            where.append("phase LIKE ?")
+            params.append(f"%{phase}%")
+        query = " ".join(list(keywords) + list(conditions or []))
+        results = self.search(query, limit=max_results, where=" AND ".join(where) or None, params=params)
+        return [payload for _, _, payload in results]
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+def get_trial_index():
+    """Get the shared trial index, or None if no snapshot has been imported"""
+    global _default_index
+    path = os.environ.get("TRIALS_INDEX_PATH", "trials_index.db")
+    with _default_lock:
+        if _default_index is None and os.path.exists(path):
+            _default_index = TrialIndex(path)
+        return _default_index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import and query a local ClinicalTrials.gov snapshot")
+    parser.add_argument("--index", default=os.environ.get("TRIALS_INDEX_PATH", "trials_index.db"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import or refresh from export files (JSON/XML, dir or zip)")
+    import_parser.add_argument("paths", nargs="+")
+    search_parser = subparsers.add_parser("search", help="Query the index")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--status", action="append")
+    search_parser.add_argument("--phase")
+    search_parser.add_argument("--max-results", type=int, default=5)
+    subparsers.add_parser("optimize", help="Merge segments and drop superseded postings")
+    subparsers.add_parser("stats", help="Show index size")
+    args = parser.parse_args()
+
+    index = TrialIndex(args.index)
+    if args.command == "import":
+        for path in args.paths:
+            start = time.time()
+            seen, written = index.import_export(path, progress=lambda s, w: print(f"{s} studies read, {w} written", flush=True))
+            print(f"{path}: {seen} studies read, {written} new or updated in {time.time() - start:.1f}s")
+    elif args.command == "search":
+        start = time.perf_counter()
+        results = index.search_trials(args.query.split(), status=args.status, phase=args.phase,
+                                      max_results=args.max_results)
+        for trial in results:
+            print(f"{trial['id']}  {trial['status']:24s} {trial['phase']:16s} {trial['title']}")
+        print(f"{len(results)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
+    elif args.command == "optimize":
+        index.optimize()
+        print(index.stats())
+    else:
+        print(index.stats())
+    index.close()
@@ -0,0 +1,135 @@
+import os
+import threading
+from collections import defaultdict
+from utils_simple import get_openai_client
+from message_store import get_message_store
+
+SUMMARY_PROMPT = """You maintain the running summary of a medical case discussion.
+Update the summary with the new messages below. Keep findings, measurements,
+diagnoses considered, decisions and open questions, and who raised them.
+Drop greetings and repetition. Reply with the updated summary only, in at most {words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+"""
+
+# Per-room conversation memory: recent turns verbatim, older turns in a rolling summary
+class ConversationMemory:
+    """Bounded prompt context for a chat or QA room, persisted in the message store
+
+    The latest `recent_turns` messages are sent verbatim. Older ones are
+    folded into the room's summary `summary_batch` messages at a time, so
+    each update only reads the previous summary and one batch, and the
+    summary never grows past `summary_chars`. Compaction is meant to run
+    after a reply is delivered, off the request path.
+    """
+
+    def __init__(self, recent_turns=None, summary_batch=None, summary_chars=None, message_store=None):
+        self.recent_turns = int(recent_turns or os.environ.get("CHAT_MEMORY_RECENT_TURNS", 8))
+        self.summary_batch = int(summary_batch or os.environ.get("CHAT_MEMORY_SUMMARY_BATCH", 8))
+        self.summary_chars = int(summary_chars or os.environ.get("CHAT_MEMORY_SUMMARY_CHARS", 2000))
+        self.message_store = message_store or get_message_store()
+        self._room_locks = defaultdict(threading.Lock)
+        self._locks_lock = threading.Lock()
+
+    def _room_lock(self, room):
+        with self._locks_lock:
+            return self._room_locks[room]
+
+    @staticmethod
+    def _turn(message, assistant):
+        if message["user"] == assistant:
+            return {"role": "assistant", "content": message["content"]}
+        prefix = "[annotation] " if message["type"] == "annotation" else ""
+        return {"role": "user", "content": f"{message['user']}: {prefix}{message['content']}"}
+
+    def prompt_messages(self, room, assistant, before_cursor=None):
+        """Chat messages for a prompt: the summary (if any), then the turns since it, before a cursor
+
+        At most `recent_turns + summary_batch` turns are returned, even when
+        compaction has fallen behind.
+        """
+        memory = self.message_store.get_memory(room)
+        recent = self.message_store.get_messages_before(room, before_cursor, self.recent_turns + self.summary_batch)
+        messages = []
+        if memory["summary"]:
+            messages.append({"role": "system", "content": f"Summary of the earlier discussion:\n{memory['summary']}"})
+        messages.extend(self._turn(message, assistant) for message in recent
+                        if message["cursor"] > memory["through_cursor"] and message["type"] != "pending")
+        return messages
+
+    def compact(self, room, api_key=None):
+        """Fold full batches of messages older than the recent window into the summary; returns the number folded"""
+        with self._room_lock(room):
+            recent = self.message_store.get_messages_before(room, None, self.recent_turns)
+            if len(recent) < self.recent_turns:
+                return 0
+            memory = self.message_store.get_memory(room)
+            summary, through = memory["summary"], memory["through_cursor"]
+            folded = 0
+            while True:
+                batch = []
+                for message in self.message_store.get_messages(room, through, self.summary_batch):
+                    # A reply still being generated is folded in once it's final, so stop before it
+                    if message["cursor"] >= recent[0]["cursor"] or message["type"] == "pending":
+                        break
+                    batch.append(message)
+                # Only whole batches, so every summary update has enough new material
+                if len(batch) < self.summary_batch:
+                    break
+                summary = self.summarize(summary, batch, api_key)
+                through = batch[-1]["cursor"]
+                folded += len(batch)
+                self.message_store.set_memory(room, summary, through)
+            return folded
+
+    def summarize(self, summary, messages, api_key=None):
+        """The summary updated with new messages: by the model when there is a key, otherwise extractively"""
+        lines = "\n".join(f"{message['user']}: {message['content']}" for message in messages)
+        if api_key:
+            try:
+                client = get_openai_client(api_key)
+                response = client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[{"role": "user", "content": SUMMARY_PROMPT.format(
+                        words=self.summary_chars // 6, summary=summary or "(none yet)", messages=lines
+                    )}],
+                    max_tokens=self.summary_chars // 4,
+                    temperature=0.0,
+                )
+                return response.choices[0].message.content.strip()[:self.summary_chars]
+            except Exception as e:
+                print(f"Error summarizing conversation: {e}")
+        return self._extractive_summary(summary, messages)
+
+    def _extractive_summary(self, summary, messages):
+        # The first sentence of each message; the oldest lines give way once the summary is full
+        lines = summary.splitlines() if summary else []
+        for message in messages:
+            first = message["content"].strip().split(". ")[0][:200]
+            if first:
+                lines.append(f"- {message['user']}: {first}")
+        while lines and len("\n".join(lines)) > self.summary_chars:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def clear(self, room):
+        """Forget the room's history so far (the messages themselves are kept)"""
+        latest = self.message_store.get_messages_before(room, None, 1)
+        with self._room_lock(room):
+            self.message_store.set_memory(room, "", latest[-1]["cursor"] if latest else 0)
+
+
+_default_memory = None
+_default_lock = threading.Lock()
+
+def get_conversation_memory():
+    """Get the shared conversation memory"""
+    global _default_memory
+    with _default_lock:
+        if _default_memory is None:
+            _default_memory = ConversationMemory()
+        return _default_memory
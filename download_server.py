@@ -0,0 +1,170 @@
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlencode, urlparse
+from blob_store import get_blob_store
+
+# Signed, range-capable download links for cached reports and bulk exports
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 256 * 1024
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single-range Range header; None if absent, False if unsatisfiable"""
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(match.group(2)), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+class DownloadServer:
+    """Small threaded HTTP server that streams files from the blob store and export directory
+
+    Links are signed with a per-process secret and expire, so only files
+    the app handed out can be fetched. Range requests are honoured, so
+    large archives can be resumed or fetched in parts.
+    """
+
+    def __init__(self, host="0.0.0.0", port=8502, base_url=None, export_dir=None, ttl=3600):
+        self.export_dir = os.path.abspath(export_dir or os.environ.get("REPORT_EXPORT_DIR", "exports"))
+        self.ttl = ttl
+        self.secret = secrets.token_bytes(32)
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.base_url = (base_url or f"http://localhost:{self.port}").rstrip("/")
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def _sign(self, kind, name, expires):
+        message = f"{kind}/{name}/{expires}".encode()
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def url_for(self, kind, name, filename):
+        """Signed URL for a blob ('blob', sha256) or an export ('export', file name)"""
+        expires = int(time.time()) + self.ttl
+        query = urlencode({"exp": expires, "sig": self._sign(kind, name, expires), "filename": filename})
+        return f"{self.base_url}/{kind}/{quote(name)}?{query}"
+
+    def url_for_blob(self, blob_hash, filename):
+        return self.url_for("blob", blob_hash, filename)
+
+    def url_for_export(self, path, filename=None):
+        name = os.path.basename(path)
+        return self.url_for("export", name, filename or name)
+
+    def resolve(self, kind, name):
+        """File path for a link target, or None"""
+        if kind == "blob" and re.fullmatch(r"[0-9a-f]{64}", name):
+            path = get_blob_store().path_for(name)
+        elif kind == "export" and name == os.path.basename(name) and not name.startswith("."):
+            path = os.path.join(self.export_dir, name)
+        else:
+            return None
+        return path if os.path.isfile(path) else None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._serve(send_body=False)
+
+            def do_GET(self):
+                self._serve(send_body=True)
+
+            def _serve(self, send_body):
+                url = urlparse(self.path)
+                parts = url.path.strip("/").split("/")
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if len(parts) != 2 or not params.get("exp", "").isdigit():
+                    self.send_error(404)
+                    return
+                kind, name = parts
+                expected = server._sign(kind, name, params["exp"])
+                if int(params["exp"]) < time.time() or not hmac.compare_digest(expected, params.get("sig", "")):
+                    self.send_error(403)
+                    return
+                path = server.resolve(kind, name)
+                if path is None:
+                    self.send_error(404)
+                    return
+
+                size = os.path.getsize(path)
+                byte_range = parse_range(self.headers.get("Range"), size)
+                if byte_range is False:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.end_headers()
+                    return
+                start, end = byte_range or (0, size - 1)
+                filename = params.get("filename", name).replace('"', "")
+                content_type = "application/zip" if filename.endswith(".zip") else "application/pdf"
+
+                self.send_response(206 if byte_range else 200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(end - start + 1))
+                if byte_range:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                self.end_headers()
+                if not send_body:
+                    return
+
+                # Stream from disk in chunks; nothing is loaded whole
+                with open(path, "rb") as f:
+                    f.seek(start)
+                    remaining = end - start + 1
+                    try:
+                        while remaining > 0:
+                            chunk = f.read(min(CHUNK_SIZE, remaining))
+                            if not chunk:
+                                break
+                            self.wfile.write(chunk)
+                            remaining -= len(chunk)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+
+        return Handler
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_default_server = None
+_default_lock = threading.Lock()
+
+def get_download_server():
+    """Get the shared download server, or None unless DOWNLOAD_SERVER_PORT is set"""
+    global _default_server
+    port = os.environ.get("DOWNLOAD_SERVER_PORT")
+    if not port:
+        return None
+    with _default_lock:
+        if _default_server is None:
+            _default_server = DownloadServer(
+                host=os.environ.get("DOWNLOAD_SERVER_HOST", "0.0.0.0"),
+                port=int(port),
+                base_url=os.environ.get("DOWNLOAD_BASE_URL")
+            )
+        return _default_server
@@ -0,0 +1,140 @@
+import os
+import threading
+import joblib
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from utils_simple import get_openai_client
+
+# Embedding providers for QA retrieval
+# Each has a `name` (stored with the index, so vectors from different
+# providers are never mixed), encode(texts) returning an (n, dims) float32
+# array or None when unavailable, and fit/needs_fit/save/load for models
+# that are trained on the corpus.
+class OpenAIEmbeddings:
+    """Embeddings from the OpenAI API, one request per batch"""
+
+    def __init__(self, api_key, model="text-embedding-ada-002", batch_size=100):
+        self.api_key = api_key
+        self.model = model
+        self.batch_size = batch_size
+        self.name = f"openai:{model}"
+
+    def encode(self, texts):
+        if not self.api_key:
+            return None
+        try:
+            client = get_openai_client(self.api_key)
+            vectors = []
+            for start in range(0, len(texts), self.batch_size):
+                response = client.embeddings.create(input=texts[start:start + self.batch_size], model=self.model)
+                vectors.extend(item.embedding for item in response.data)
+            return np.asarray(vectors, dtype=np.float32)
+        except Exception as e:
+            print(f"Error getting embeddings: {e}")
+            return None
+
+    def needs_fit(self, corpus_size):
+        return False
+
+
+class HashingEmbeddings:
+    """Local, stateless embeddings: L2-normalized counts of hashed words and bigrams
+
+    Nothing to train or save, so any deployment produces the same vectors.
+    There is no stop list: it would drop "no" and "not", and a negated
+    question would embed exactly like the original.
+    """
+
+    def __init__(self, dims=None):
+        self.dims = int(dims or os.environ.get("QA_EMBEDDING_DIMS", 1024))
+        self.name = f"hashing:{self.dims}:all-words"
+        self._vectorizer = HashingVectorizer(n_features=self.dims, ngram_range=(1, 2), alternate_sign=False,
+                                             norm="l2")
+
+    def encode(self, texts):
+        return self._vectorizer.transform(texts).astype(np.float32).toarray()
+
+    def needs_fit(self, corpus_size):
+        return False
+
+
+class TfidfSvdEmbeddings:
+    """Local embeddings from TF-IDF reduced by truncated SVD (latent semantic analysis), fitted on the corpus
+
+    The model is refitted once the corpus has doubled since the last fit;
+    a refit changes `name`, so the index re-embeds everything (locally).
+    A refit is built aside and swapped in whole, so encode() calls made
+    meanwhile keep using the previous model.
+    """
+
+    def __init__(self, dims=None):
+        self.dims = int(dims or os.environ.get("QA_EMBEDDING_DIMS", 256))
+        self.fitted_on = 0
+        self.name = f"tfidf-svd:{self.dims}:unfitted"
+        self._vectorizer = None
+        self._svd = None
+        self._lock = threading.Lock()
+
+    def needs_fit(self, corpus_size):
+        return corpus_size >= 2 and corpus_size >= 2 * self.fitted_on
+
+    def fit(self, texts):
+        # No stop list (see HashingEmbeddings); IDF already discounts common words
+        vectorizer = TfidfVectorizer(ngram_range=(1, 2), min_df=1, max_features=50000, sublinear_tf=True)
+        matrix = vectorizer.fit_transform(texts)
+        components = min(self.dims, matrix.shape[0] - 1, matrix.shape[1] - 1)
+        if components < 1:
+            return
+        svd = TruncatedSVD(n_components=components, random_state=0).fit(matrix)
+        with self._lock:
+            self._vectorizer, self._svd = vectorizer, svd
+            self.fitted_on = len(texts)
+            self.name = f"tfidf-svd:{components}:{self.fitted_on}"
+
+    def encode(self, texts):
+        with self._lock:
+            vectorizer, svd = self._vectorizer, self._svd
+        if svd is None:
+            return None
+        return svd.transform(vectorizer.transform(texts)).astype(np.float32)
+
+    def save(self, path):
+        with self._lock:
+            state = {"dims": self.dims, "fitted_on": self.fitted_on, "name": self.name,
+                     "vectorizer": self._vectorizer, "svd": self._svd}
+        joblib.dump(state, path)
+
+    def load(self, path):
+        state = joblib.load(path)
+        if state["dims"] == self.dims:
+            with self._lock:
+                self.fitted_on, self.name = state["fitted_on"], state["name"]
+                self._vectorizer, self._svd = state["vectorizer"], state["svd"]
+
+
+def encode_one(provider, text):
+    """One text's vector from a provider, or None if it is unavailable"""
+    vectors = provider.encode([text])
+    return None if vectors is None else vectors[0]
+
+
+EMBEDDING_PROVIDERS = {"hashing": HashingEmbeddings, "tfidf": TfidfSvdEmbeddings, "openai": OpenAIEmbeddings}
+
+_local_providers = {}
+_default_lock = threading.Lock()
+
+def get_embedding_provider(api_key=None, kind=None):
+    """The deployment's embedding provider (QA_EMBEDDINGS: hashing, tfidf or openai; default hashing)
+
+    Local providers are shared by every session; the OpenAI one is per key.
+    """
+    kind = kind or os.environ.get("QA_EMBEDDINGS", "hashing")
+    if kind not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider {kind!r}; expected one of {', '.join(EMBEDDING_PROVIDERS)}")
+    if kind == "openai":
+        return OpenAIEmbeddings(api_key)
+    with _default_lock:
+        if kind not in _local_providers:
+            _local_providers[kind] = EMBEDDING_PROVIDERS[kind]()
+        return _local_providers[kind]
@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+import requests
+from medline_parser import iter_medline_records
+
+# NCBI E-utilities client with rate limiting, retries and history-server batching
+NCBI_EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+
+class EntrezError(Exception):
+    """Raised when an E-utilities request fails after all retries"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class EntrezClient:
+    """E-utilities client that stays within NCBI's request-rate limits
+
+    Without an API key NCBI allows 3 requests/second, with one 10/second.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, base_url=None, api_key=None, email=None, tool="medical-imaging-agent",
+                 rate=None, max_retries=4, backoff=0.5, fetch_batch_size=200, timeout=30,
+                 connect_timeout=5):
+        self.base_url = (base_url or os.environ.get("ENTREZ_BASE_URL", NCBI_EUTILS_URL)).rstrip("/") + "/"
+        self.api_key = api_key if api_key is not None else os.environ.get("NCBI_API_KEY")
+        self.email = email or os.environ.get("NCBI_EMAIL", "your_email@example.com")
+        self.tool = tool
+        # Pace slightly under the limit so network jitter can't push a burst over it
+        self.limiter = TokenBucket((rate or (10 if self.api_key else 3)) * 0.9)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.fetch_batch_size = fetch_batch_size
+        # Fail fast when outbound traffic is blocked; reads can take longer
+        self.timeout = (connect_timeout, timeout)
+        self.session = requests.Session()
+        self.request_count = 0
+
+    def _request(self, endpoint, params, post=False):
+        """Send one request and return the response body as text"""
+        response = self._open(endpoint, params, post=post)
+        return response.text
+
+    def _open(self, endpoint, params, post=False):
+        """Send one rate-limited request, retrying throttling and transient errors
+
+        The response body is streamed; callers read it incrementally.
+        """
+        params = {**params, "tool": self.tool, "email": self.email}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        url = self.base_url + endpoint
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            with self.limiter._lock:
+                self.request_count += 1
+            try:
+                if post:
+                    response = self.session.post(url, data=params, timeout=self.timeout, stream=True)
+                else:
+                    response = self.session.get(url, params=params, timeout=self.timeout, stream=True)
+            except requests.RequestException as e:
+                last_error = e
+            else:
+                if response.status_code == 200:
+                    return response
+                response.close()
+                last_error = EntrezError(f"{endpoint} returned HTTP {response.status_code}")
+                if response.status_code not in self.RETRY_STATUSES:
+                    break
+                retry_after = response.headers.get("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    time.sleep(int(retry_after))
+                    continue
+
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * (2 ** attempt))
+
+        raise EntrezError(f"{endpoint} failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def esearch(self, term, retmax=20, usehistory=False, webenv=None):
+        """Search a database; returns ids plus history-server handles when requested"""
+        params = {"db": "pubmed", "term": term, "retmax": retmax, "retmode": "xml"}
+        if usehistory:
+            params["usehistory"] = "y"
+        if webenv:
+            params["WebEnv"] = webenv
+
+        root = ET.fromstring(self._request("esearch.fcgi", params))
+        error = root.findtext("ERROR")
+        if error:
+            raise EntrezError(f"esearch error: {error}")
+        return {
+            "ids": [id_el.text for id_el in root.findall("IdList/Id")],
+            "count": int(root.findtext("Count") or 0),
+            "webenv": root.findtext("WebEnv"),
+            "query_key": root.findtext("QueryKey"),
+        }
+
+    def epost(self, ids, webenv=None):
+        """Upload ids to the history server; returns (webenv, query_key)"""
+        params = {"db": "pubmed", "id": ",".join(ids)}
+        if webenv:
+            params["WebEnv"] = webenv
+        root = ET.fromstring(self._request("epost.fcgi", params, post=True))
+        return root.findtext("WebEnv"), root.findtext("QueryKey")
+
+    def efetch(self, ids=None, webenv=None, query_key=None, retstart=0, retmax=None):
+        """Fetch MEDLINE records by id list or by history-server query key"""
+        params = {"db": "pubmed", "rettype": "medline", "retmode": "text"}
+        if ids is not None:
+            params["id"] = ",".join(ids)
+        else:
+            params.update({"WebEnv": webenv, "query_key": query_key, "retstart": retstart,
+                           "retmax": retmax or self.fetch_batch_size})
+        # Parse the MEDLINE stream as it arrives instead of buffering the whole body
+        with self._open("efetch.fcgi", params, post=ids is not None) as response:
+            return list(iter_medline_records(response.iter_content(chunk_size=64 * 1024)))
+
+    def search(self, term, retmax=5):
+        """Search and fetch publication records for one query (two requests)"""
+        result = self.esearch(term, retmax=retmax, usehistory=True)
+        if not result["ids"]:
+            return []
+        return self.efetch(webenv=result["webenv"], query_key=result["query_key"], retmax=retmax)
+
+    def search_many(self, terms, retmax=5):
+        """Run many queries, fetching all their records through one history session
+
+        Each esearch lands on the same WebEnv; the union of ids is posted once
+        and fetched in pages of fetch_batch_size, instead of one efetch per query.
+        """
+        webenv = None
+        ids_by_term = {}
+        for term in dict.fromkeys(terms):
+            result = self.esearch(term, retmax=retmax, usehistory=True, webenv=webenv)
+            webenv = result["webenv"] or webenv
+            ids_by_term[term] = result["ids"]
+
+        unique_ids = list(dict.fromkeys(pmid for ids in ids_by_term.values() for pmid in ids))
+        records = {}
+        if unique_ids:
+            webenv, query_key = self.epost(unique_ids, webenv=webenv)
+            for retstart in range(0, len(unique_ids), self.fetch_batch_size):
+                for record in self.efetch(webenv=webenv, query_key=query_key, retstart=retstart,
+                                          retmax=self.fetch_batch_size):
+                    records[record["id"]] = record
+
+        return {term: [records[pmid] for pmid in ids if pmid in records]
+                for term, ids in ids_by_term.items()}
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+def get_entrez_client():
+    """Get the shared client, so every caller draws from the same rate limit"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = EntrezClient()
+        return _default_client
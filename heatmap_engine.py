@@ -0,0 +1,193 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import cv2
+from PIL import Image
+
+# Colormaps available to the XAI view
+COLORMAPS = {
+    "jet": cv2.COLORMAP_JET,
+    "inferno": cv2.COLORMAP_INFERNO,
+    "viridis": cv2.COLORMAP_VIRIDIS,
+    "hot": cv2.COLORMAP_HOT,
+    "bone": cv2.COLORMAP_BONE,
+}
+
+_LUTS = {}
+_LUT_LOCK = threading.Lock()
+
+def get_colormap_lut(colormap="jet"):
+    """Get the precomputed 256-entry RGB lookup table for a colormap"""
+    if colormap not in COLORMAPS:
+        raise ValueError(f"Unknown colormap '{colormap}'. Choose from: {', '.join(COLORMAPS)}")
+
+    with _LUT_LOCK:
+        if colormap not in _LUTS:
+            # Run the colormap once over the full 0-255 ramp; OpenCV returns BGR
+            ramp = np.arange(256, dtype=np.uint8).reshape(256, 1)
+            lut = cv2.applyColorMap(ramp, COLORMAPS[colormap]).reshape(256, 3)[:, ::-1]
+            lut = np.ascontiguousarray(lut)
+            lut.setflags(write=False)
+            _LUTS[colormap] = lut
+        return _LUTS[colormap]
+
+def to_uint8(array):
+    """Scale an array to uint8 using its global min/max"""
+    if array.dtype == np.uint8:
+        return array
+    array = np.asarray(array, dtype=np.float32)
+    low, high = float(array.min()), float(array.max())
+    if high <= low:
+        return np.zeros(array.shape, dtype=np.uint8)
+    return ((array - low) * (255.0 / (high - low))).astype(np.uint8)
+
+def to_grayscale(images):
+    """Convert RGB images (..., 3) to grayscale with OpenCV's integer weights"""
+    if images.ndim >= 3 and images.shape[-1] == 3:
+        rgb = images.astype(np.uint32)
+        gray = (rgb[..., 0] * 9798 + rgb[..., 1] * 19235 + rgb[..., 2] * 3735 + 16384) >> 15
+        return gray.astype(np.uint8)
+    return images
+
+def image_hash(array):
+    """Hash an image array's pixels, shape and dtype"""
+    digest = hashlib.sha256()
+    digest.update(f"{array.shape}|{array.dtype}".encode())
+    digest.update(np.ascontiguousarray(array).data)
+    return digest.hexdigest()
+
+def encode_image(array, format="png", quality=80):
+    """Encode an RGB/grayscale array to compressed PNG or WebP bytes"""
+    format = format.lower()
+    if array.ndim == 3:
+        array = cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
+    if format == "png":
+        ok, encoded = cv2.imencode(".png", array, [cv2.IMWRITE_PNG_COMPRESSION, 6])
+    elif format == "webp":
+        ok, encoded = cv2.imencode(".webp", array, [cv2.IMWRITE_WEBP_QUALITY, int(quality)])
+    elif format in ("jpg", "jpeg"):
+        ok, encoded = cv2.imencode(".jpg", array, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    else:
+        raise ValueError(f"Unsupported image format: {format}")
+    if not ok:
+        raise RuntimeError(f"Failed to encode image as {format}")
+    return encoded.tobytes()
+
+
+class HeatmapEngine:
+    """Vectorized heatmap overlays for single images, batches and volumes"""
+
+    def __init__(self, colormap="jet", alpha=0.5, cache_size=32):
+        self.colormap = colormap
+        self.alpha = alpha
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _blend(self, images, gray, colormap, alpha):
+        """Colour and blend a stack of images in one pass"""
+        lut = get_colormap_lut(colormap)
+        heatmaps = lut[gray]
+
+        # Fixed-point blend: weight in 1/256ths for the heatmap
+        weight = int(round(min(max(alpha, 0.0), 1.0) * 256))
+        if images.ndim == gray.ndim:
+            # Grayscale input: the overlay only depends on the grey level,
+            # so blend the LUT once and gather
+            levels = np.arange(256, dtype=np.uint16)[:, None]
+            blended_lut = ((lut.astype(np.uint16) * weight + levels * (256 - weight) + 128) >> 8).astype(np.uint8)
+            overlays = blended_lut[gray]
+        else:
+            overlays = ((heatmaps.astype(np.uint16) * weight
+                         + images.astype(np.uint16) * (256 - weight) + 128) >> 8).astype(np.uint8)
+        return overlays, heatmaps
+
+    def render_batch(self, images, colormap=None, alpha=None):
+        """Render overlays for a batch shaped (N, H, W) or (N, H, W, 3)"""
+        colormap = colormap or self.colormap
+        alpha = self.alpha if alpha is None else alpha
+        images = to_uint8(np.asarray(images))
+        return self._blend(images, to_grayscale(images), colormap, alpha)
+
+    def render_volume(self, volume, axis=-1, colormap=None, alpha=None):
+        """Render overlays for every slice of a 3D volume along an axis"""
+        volume = np.moveaxis(np.asarray(volume), axis, 0)
+        return self.render_batch(volume, colormap=colormap, alpha=alpha)
+
+    def _cached(self, key, compute):
+        """Look up a cache entry, computing and storing it on a miss"""
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return value
+
+    def render(self, image_array, colormap=None, alpha=None):
+        """Render (overlay, heatmap) arrays for a single image, with caching"""
+        colormap = colormap or self.colormap
+        alpha = self.alpha if alpha is None else alpha
+        key = (image_hash(image_array), colormap, round(alpha, 3), "array")
+
+        def compute():
+            overlays, heatmaps = self.render_batch(image_array[None], colormap=colormap, alpha=alpha)
+            overlay, heatmap = overlays[0], heatmaps[0]
+            overlay.setflags(write=False)
+            heatmap.setflags(write=False)
+            return overlay, heatmap
+
+        return self._cached(key, compute)
+
+    def render_encoded(self, image_array, colormap=None, alpha=None, format="png", quality=80):
+        """Render (overlay, heatmap) straight to compressed image bytes, with caching"""
+        colormap = colormap or self.colormap
+        alpha = self.alpha if alpha is None else alpha
+        key = (image_hash(image_array), colormap, round(alpha, 3), format.lower(), quality)
+
+        def compute():
+            overlay, heatmap = self.render(image_array, colormap=colormap, alpha=alpha)
+            return (encode_image(overlay, format=format, quality=quality),
+                    encode_image(heatmap, format=format, quality=quality))
+
+        return self._cached(key, compute)
+
+    def render_images(self, image_array, colormap=None, alpha=None):
+        """Render (overlay, heatmap) as PIL images"""
+        overlay, heatmap = self.render(image_array, colormap=colormap, alpha=alpha)
+        return Image.fromarray(overlay), Image.fromarray(heatmap)
+
+    def render_map(self, image_array, scalar_map, colormap=None, alpha=None):
+        """Overlay a [0, 1] scalar map (e.g. a saliency map) on an image"""
+        colormap = colormap or self.colormap
+        alpha = self.alpha if alpha is None else alpha
+        image = to_uint8(np.asarray(image_array))
+        if image.ndim == 2:
+            image = np.repeat(image[..., None], 3, axis=-1)
+
+        levels = (np.clip(scalar_map, 0.0, 1.0) * 255).astype(np.uint8)
+        if levels.shape != image.shape[:2]:
+            levels = cv2.resize(levels, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_LINEAR)
+        return self._blend(image, levels, colormap, alpha)
+
+    def clear_cache(self):
+        """Drop all cached renders"""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Shared engine used by the app and report generation
+default_engine = HeatmapEngine()
@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+# Persistent cache for literature lookups (PubMed today)
+class LiteratureCache:
+    """TTL + LRU cache of literature results, persisted to a JSON file
+
+    Concurrent lookups for the same key share one fetch.
+    """
+
+    def __init__(self, path=None, ttl=None, max_entries=None):
+        self.path = path or os.environ.get("LITERATURE_CACHE_PATH", "literature_cache.json")
+        self.ttl = ttl if ttl is not None else int(os.environ.get("LITERATURE_CACHE_TTL", 7 * 24 * 3600))
+        self.max_entries = max_entries or int(os.environ.get("LITERATURE_CACHE_MAX", 2000))
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._entries = self._load()
+
+    @staticmethod
+    def make_key(keywords, max_results, source="pubmed"):
+        """Normalize a keyword set into a cache key (order and case don't matter)"""
+        normalized = sorted({keyword.strip().lower() for keyword in keywords if keyword.strip()})
+        return f"{source}:{'|'.join(normalized)}#{max_results}"
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    return json.load(f).get("entries", {})
+            except (OSError, ValueError):
+                return {}
+        return {}
+
+    def _save(self):
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"entries": self._entries}, f)
+        os.replace(temp_path, self.path)
+
+    def get(self, key):
+        """Get cached results, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["created_at"] > self.ttl:
+                del self._entries[key]
+                return None
+            entry["last_access"] = time.time()
+            return entry["results"]
+
+    def put(self, key, results):
+        """Store results, evicting least recently used entries over the size limit"""
+        with self._lock:
+            now = time.time()
+            self._entries[key] = {"results": results, "created_at": now, "last_access": now}
+
+            # Drop expired entries first, then the least recently used
+            expired = [k for k, entry in self._entries.items() if now - entry["created_at"] > self.ttl]
+            for k in expired:
+                del self._entries[k]
+            if len(self._entries) > self.max_entries:
+                by_access = sorted(self._entries, key=lambda k: self._entries[k]["last_access"])
+                for k in by_access[:len(self._entries) - self.max_entries]:
+                    del self._entries[k]
+
+            self._save()
+
+    def get_or_fetch(self, key, fetch):
+        """Return cached results or run fetch() once, sharing it with concurrent callers"""
+        results = self.get(key)
+        if results is not None:
+            return results
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            results = fetch()
+            self.put(key, results)
+            future.set_result(results)
+            return results
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            self._entries = {}
+            self._save()
+
+    def stats(self):
+        """Summarize cache size"""
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "ttl": self.ttl}
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_literature_cache():
+    """Get the shared literature cache"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LiteratureCache()
+        return _default_cache
@@ -0,0 +1,130 @@
+import gzip
+import os
+import threading
+import time
+from medline_parser import iter_pubmed_xml_records
+from text_index import SegmentedIndex
+
+# Offline PubMed index built from baseline/update XML dumps
+class LiteratureIndex(SegmentedIndex):
+    """Searchable local copy of PubMed (title, abstract, MeSH, journal, year)"""
+
+    doc_columns = {"year": "INTEGER"}
+    field_weights = {"title": 3.0, "mesh": 3.0, "journal": 1.0, "abstract": 1.0}
+
+    def add_record(self, record):
+        """Index one parsed PubMed record"""
+        if not record["id"].isdigit():
+            return
+        mesh = " ".join(heading.replace("*", " ").replace("/", " ") for heading in record["mesh"])
+        self.add(
+            int(record["id"]),
+            {
+                "title": record["title"],
+                "abstract": record["abstract"],
+                "mesh": mesh,
+                "journal": f"{record['journal']} {record['journal_title']}",
+            },
+            {
+                "id": record["id"],
+                "title": record["title"],
+                "journal": record["journal"],
+                "year": record["year"],
+                "authors": record["authors"][:10],
+                "doi": record["doi"],
+                "mesh": record["mesh"],
+            },
+            year=int(record["year"]) if record["year"] else None,
+        )
+
+    def ingest(self, path, progress=None):
+        """Stream one baseline/update file (.xml or .xml.gz) into the index"""
+        def delete(pmids):
+            for pmid in pmids:
+                if pmid.isdigit():
+                    self.delete(int(pmid))
+
+        opener = gzip.open if path.endswith(".gz") else open
+        count = 0
+        with opener(path, "rb") as f:
+            for record in iter_pubmed_xml_records(f, on_delete=delete):
+                self.add_record(record)
+                count += 1
+                if progress and count % 10000 == 0:
+                    progress(path, count)
+        self.flush()
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (f"ingested:{os.path.basename(path)}", str(count)))
+        self.conn.commit()
+        return count
+
+    def is_ingested(self, path):
+        """Check whether a dump file was already loaded"""
+        row = self.conn.execute("SELECT 1 FROM meta WHERE key = ?", (f"ingested:{os.path.basename(path)}",)).fetchone()
+        return row is not None
+
+    def search_publications(self, keywords, max_results=5, year_from=None, year_to=None):
+        """Ranked publications for a keyword list, in search_pubmed's result shape"""
+        where, params = [], []
+        if year_from:
+            where.append("year >= ?")
+            params.append(int(year_from))
+        if year_to:
+            where.append("year <= ?")
+            params.append(int(year_to))
+        results = self.search(" ".join(keywords), limit=max_results,
+                              where=" AND ".join(where) or None, params=params)
+        return [payload for _, _, payload in results]
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+def get_literature_index():
+    """Get the shared local literature index, or None if none has been built"""
+    global _default_index
+    path = os.environ.get("LITERATURE_INDEX_PATH", "literature_index.db")
+    with _default_lock:
+        if _default_index is None and os.path.exists(path):
+            _default_index = LiteratureIndex(path)
+        return _default_index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build and query the offline PubMed index")
+    parser.add_argument("--index", default=os.environ.get("LITERATURE_INDEX_PATH", "literature_index.db"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = subparsers.add_parser("ingest", help="Load PubMed baseline/update XML files (.xml or .xml.gz)")
+    ingest_parser.add_argument("files", nargs="+")
+    ingest_parser.add_argument("--batch-docs", type=int, default=20000, help="Documents per in-memory segment")
+    ingest_parser.add_argument("--force", action="store_true", help="Re-load files that were already ingested")
+    search_parser = subparsers.add_parser("search", help="Query the index")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--max-results", type=int, default=5)
+    subparsers.add_parser("optimize", help="Merge segments and drop superseded postings")
+    subparsers.add_parser("stats", help="Show index size")
+    args = parser.parse_args()
+
+    index = LiteratureIndex(args.index, batch_docs=getattr(args, "batch_docs", 20000))
+    if args.command == "ingest":
+        # Baseline files first, then updates in file-name order
+        for path in sorted(args.files, key=os.path.basename):
+            if index.is_ingested(path) and not args.force:
+                print(f"{path}: already ingested, skipping")
+                continue
+            start = time.time()
+            count = index.ingest(path, progress=lambda p, n: print(f"{p}: {n} records", flush=True))
+            print(f"{path}: {count} records in {time.time() - start:.1f}s")
+    elif args.command == "search":
+        start = time.perf_counter()
+        results = index.search_publications(args.query.split(), max_results=args.max_results)
+        for pub in results:
+            print(f"{pub['id']}  {pub['year']}  {pub['journal']}  {pub['title']}")
+        print(f"{len(results)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
+    elif args.command == "optimize":
+        index.optimize()
+        print(index.stats())
+    else:
+        print(index.stats())
+    index.close()
@@ -0,0 +1,171 @@
+import codecs
+import re
+import xml.etree.ElementTree as ET
+
+# Incremental parsers for PubMed efetch output (MEDLINE text and PubMed XML)
+YEAR_PATTERN = re.compile(r"\b(1[89]\d\d|20\d\d)\b")
+
+def _empty_record():
+    return {"id": "", "title": "", "journal": "", "journal_title": "", "year": "",
+            "authors": [], "abstract": "", "doi": "", "mesh": []}
+
+def _year_from(text):
+    """First plausible four-digit year in a date string, or '' if none"""
+    match = YEAR_PATTERN.search(text or "")
+    return match.group(1) if match else ""
+
+# Fields we keep; every other tag (and its continuation lines) is skipped
+LIST_FIELDS = {"AU": "authors", "MH": "mesh"}
+TEXT_FIELDS = {"PMID": "id", "TI": "title", "AB": "abstract", "TA": "journal", "JT": "journal_title"}
+KEPT_TAGS = set(LIST_FIELDS) | set(TEXT_FIELDS) | {"DP", "AID", "LID"}
+
+def _apply_field(record, tag, value):
+    """Store one (possibly multi-line) MEDLINE field on a record"""
+    if tag in TEXT_FIELDS:
+        record[TEXT_FIELDS[tag]] = value
+    elif tag in LIST_FIELDS:
+        record[LIST_FIELDS[tag]].append(value)
+    elif tag == "DP":
+        record["year"] = _year_from(value)
+    elif value.endswith("[doi]") and not record["doi"]:
+        record["doi"] = value[:-len("[doi]")].strip()
+
+def _finish(record):
+    if not record["journal"]:
+        record["journal"] = record["journal_title"]
+    return record
+
+def _iter_text_chunks(source, chunk_size):
+    """Yield decoded text chunks from a file object, bytes/str or an iterable of chunks"""
+    if isinstance(source, (str, bytes)):
+        source = [source]
+    elif hasattr(source, "read"):
+        reader = source
+
+        def read_chunks():
+            while True:
+                chunk = reader.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+        source = read_chunks()
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in source:
+        if chunk:
+            yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def iter_medline_records(source, chunk_size=64 * 1024):
+    """Stream MEDLINE records from efetch output without loading it all
+
+    Continuation lines (indented by six spaces) are joined onto their field,
+    so long titles and abstracts come through whole. Yields dicts with id,
+    title, journal, journal_title, year, authors, abstract, doi and mesh.
+    """
+    record = _empty_record()
+    tag, parts = None, []
+    pending = ""
+
+    for text in _iter_text_chunks(source, chunk_size):
+        lines = (pending + text).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if line[:6] == "      ":
+                # Continuation of the current field
+                if tag:
+                    parts.append(line.strip())
+            elif line[4:6] == "- ":
+                if tag:
+                    _apply_field(record, tag, " ".join(parts))
+                tag = line[:4].rstrip()
+                if tag in KEPT_TAGS:
+                    parts = [line[6:].strip()]
+                else:
+                    tag = None
+            elif not line.strip():
+                # Blank line ends the record
+                if tag:
+                    _apply_field(record, tag, " ".join(parts))
+                    tag = None
+                if record["id"]:
+                    yield _finish(record)
+                    record = _empty_record()
+
+    if pending.strip() and pending[4:6] == "- " and pending[:4].rstrip() in KEPT_TAGS:
+        if tag:
+            _apply_field(record, tag, " ".join(parts))
+        tag, parts = pending[:4].rstrip(), [pending[6:].strip()]
+    elif pending[:6] == "      " and tag:
+        parts.append(pending.strip())
+    if tag:
+        _apply_field(record, tag, " ".join(parts))
+    if record["id"]:
+        yield _finish(record)
+
+def _text(element):
+    """All text inside an element (titles/abstracts may contain markup)"""
+    return "".join(element.itertext()).strip() if element is not None else ""
+
+def iter_pubmed_xml_records(source, on_delete=None):
+    """Stream records from PubMed XML (efetch retmode=xml or baseline dumps)
+
+    Each <PubmedArticle> is cleared once parsed, so memory stays bounded.
+    Update files also list retracted PMIDs in <DeleteCitation>; those are
+    passed to on_delete(pmids) when given.
+    """
+    root = None
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if root is None:
+            root = element
+        if event != "end":
+            continue
+        if element.tag == "DeleteCitation":
+            if on_delete is not None:
+                on_delete([_text(pmid) for pmid in element.findall("PMID")])
+            element.clear()
+            continue
+        if element.tag != "PubmedArticle":
+            continue
+
+        citation = element.find("MedlineCitation")
+        article = citation.find("Article") if citation is not None else None
+        record = _empty_record()
+        if citation is not None:
+            record["id"] = _text(citation.find("PMID"))
+            record["mesh"] = [_text(heading.find("DescriptorName"))
+                              for heading in citation.findall("MeshHeadingList/MeshHeading")]
+        if article is not None:
+            record["title"] = _text(article.find("ArticleTitle"))
+            record["abstract"] = " ".join(_text(part) for part in article.findall("Abstract/AbstractText"))
+            record["journal"] = _text(article.find("Journal/ISOAbbreviation"))
+            record["journal_title"] = _text(article.find("Journal/Title"))
+            pub_date = article.find("Journal/JournalIssue/PubDate")
+            if pub_date is not None:
+                record["year"] = _year_from(_text(pub_date.find("Year")) or _text(pub_date.find("MedlineDate")))
+            for author in article.findall("AuthorList/Author"):
+                last, initials = _text(author.find("LastName")), _text(author.find("Initials"))
+                name = f"{last} {initials}".strip() or _text(author.find("CollectiveName"))
+                if name:
+                    record["authors"].append(name)
+            for eid in article.findall("ELocationID"):
+                if eid.get("EIdType") == "doi":
+                    record["doi"] = _text(eid)
+                    break
+        if not record["doi"]:
+            for article_id in element.findall("PubmedData/ArticleIdList/ArticleId"):
+                if article_id.get("IdType") == "doi":
+                    record["doi"] = _text(article_id)
+                    break
+
+        element.clear()
+        root.clear()
+        if record["id"]:
+            yield _finish(record)
+
+def parse_medline_text(text):
+    """Parse a complete MEDLINE response into a list of records"""
+    return list(iter_medline_records(text))
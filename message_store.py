@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+# Room messages in SQLite, fetched by cursor instead of loading whole rooms
+class MessageStore:
+    """Messages for collaboration and QA rooms, indexed by (room, cursor)
+
+    The cursor is a store-wide, ever-increasing integer assigned on insert,
+    so "everything after cursor N" and "the page before cursor N" are both
+    single index range scans however long a discussion gets.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("MESSAGE_STORE_PATH", "message_store.db")
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                cursor INTEGER PRIMARY KEY AUTOINCREMENT,
+                room TEXT NOT NULL,
+                id TEXT UNIQUE,
+                user TEXT,
+                content TEXT,
+                type TEXT,
+                timestamp TEXT
+            );
+            CREATE INDEX IF NOT EXISTS messages_room ON messages (room, cursor);
+            CREATE TABLE IF NOT EXISTS room_memory (
+                room TEXT PRIMARY KEY,
+                summary TEXT,
+                through_cursor INTEGER,
+                updated_at TEXT
+            );
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def _message(row):
+        return {"id": row["id"], "user": row["user"], "content": row["content"], "type": row["type"],
+                "timestamp": row["timestamp"], "cursor": row["cursor"]}
+
+    def add(self, room, user, content, message_type="text", timestamp=None, message_id=None):
+        """Append a message to a room; returns it with its cursor"""
+        message = {
+            "id": message_id or str(uuid.uuid4()),
+            "user": user,
+            "content": content,
+            "type": message_type,
+            "timestamp": timestamp or datetime.now().isoformat(),
+        }
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO messages (room, id, user, content, type, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                (room, message["id"], user, content, message_type, message["timestamp"])
+            )
+            self.conn.commit()
+        message["cursor"] = cursor.lastrowid
+        return message
+
+    def update(self, cursor, content, message_type=None):
+        """Replace a message's content (and optionally type), e.g. while a reply streams in"""
+        with self._lock:
+            if message_type is None:
+                self.conn.execute("UPDATE messages SET content = ? WHERE cursor = ?", (content, cursor))
+            else:
+                self.conn.execute("UPDATE messages SET content = ?, type = ? WHERE cursor = ?",
+                                  (content, message_type, cursor))
+            self.conn.commit()
+
+    def get_by_cursors(self, room, cursors):
+        """Specific messages of a room by cursor"""
+        cursors = list(cursors)
+        if not cursors:
+            return []
+        placeholders = ", ".join("?" for _ in cursors)
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM messages WHERE room = ? AND cursor IN ({placeholders}) ORDER BY cursor",
+                (room, *cursors)
+            ).fetchall()
+        return [self._message(row) for row in rows]
+
+    def import_messages(self, room, messages):
+        """Copy existing messages into a room in order (ids already present are skipped)"""
+        with self._lock:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO messages (room, id, user, content, type, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                ((room, message.get("id") or str(uuid.uuid4()), message.get("user"), message.get("content"),
+                  message.get("type", "text"), message.get("timestamp")) for message in messages)
+            )
+            self.conn.commit()
+            return cursor.rowcount
+
+    def get_messages(self, room, after_cursor=None, limit=50):
+        """Messages after a cursor, oldest first; without a cursor, the latest `limit`"""
+        if after_cursor is None:
+            return self.get_messages_before(room, None, limit)
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM messages WHERE room = ? AND cursor > ? ORDER BY cursor LIMIT ?",
+                (room, after_cursor, limit)
+            ).fetchall()
+        return [self._message(row) for row in rows]
+
+    def get_messages_before(self, room, cursor=None, limit=50):
+        """The `limit` messages before a cursor (or the newest), oldest first"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM messages WHERE room = ? AND cursor < ? ORDER BY cursor DESC LIMIT ?",
+                (room, cursor if cursor is not None else 2 ** 63 - 1, limit)
+            ).fetchall()
+        return [self._message(row) for row in reversed(rows)]
+
+    def room_messages(self, room):
+        """Every message in a room, oldest first (for archiving)"""
+        with self._lock:
+            rows = self.conn.execute("SELECT * FROM messages WHERE room = ? ORDER BY cursor", (room,)).fetchall()
+        return [self._message(row) for row in rows]
+
+    # Conversation memory: a rolling summary of a room's messages up to a cursor
+    def get_memory(self, room):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM room_memory WHERE room = ?", (room,)).fetchone()
+        if row is None:
+            return {"summary": "", "through_cursor": 0, "updated_at": None}
+        return {"summary": row["summary"], "through_cursor": row["through_cursor"], "updated_at": row["updated_at"]}
+
+    def set_memory(self, room, summary, through_cursor):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO room_memory (room, summary, through_cursor, updated_at) VALUES (?, ?, ?, ?)",
+                (room, summary, through_cursor, datetime.now().isoformat())
+            )
+            self.conn.commit()
+
+    def count(self, room):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM messages WHERE room = ?", (room,)).fetchone()[0]
+
+    def delete_room(self, room):
+        """Drop every message in a room (and its memory); returns the number removed"""
+        with self._lock:
+            cursor = self.conn.execute("DELETE FROM messages WHERE room = ?", (room,))
+            self.conn.execute("DELETE FROM room_memory WHERE room = ?", (room,))
+            self.conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def get_message_store():
+    """Get the shared message store"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = MessageStore()
+        return _default_store
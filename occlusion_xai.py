@@ -0,0 +1,226 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from utils_simple import analyze_image, extract_findings_and_keywords
+from heatmap_engine import default_engine, image_hash
+
+# Analysis models: any callable taking a PIL image and returning analysis text (None on failure)
+class OpenAIAnalysisModel:
+    """Analysis model backed by the same vision call as the main analysis"""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.name = "openai:gpt-4o"
+
+    def __call__(self, image):
+        result = analyze_image(image, self.api_key)
+        # A failed call must not read as "every finding disappeared"
+        return None if "error" in result else result["analysis"]
+
+
+class StubAnalysisModel:
+    """Deterministic local model for development and testing
+
+    Each region of interest reports its finding while most of its pixels
+    stay bright, so occluding a large enough part of it removes the finding.
+    """
+
+    DEFAULT_REGIONS = [
+        # (top, left, bottom, right) as fractions of the image, finding text
+        ((0.55, 0.05, 0.95, 0.45), "Consolidation in the right lower lobe"),
+        ((0.30, 0.35, 0.75, 0.65), "Mild cardiomegaly"),
+        ((0.10, 0.60, 0.40, 0.95), "Small nodule in the left upper lobe"),
+    ]
+
+    def __init__(self, regions=None, brightness=128, coverage=0.75):
+        self.regions = regions or self.DEFAULT_REGIONS
+        self.brightness = brightness
+        self.coverage = coverage
+        self.name = "stub"
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, image):
+        with self._lock:
+            self.calls += 1
+        array = np.asarray(image.convert("L"))
+        height, width = array.shape
+
+        findings = []
+        for (top, left, bottom, right), finding in self.regions:
+            region = array[int(top * height):int(bottom * height), int(left * width):int(right * width)]
+            if region.size and float((region > self.brightness).mean()) >= self.coverage:
+                findings.append(finding)
+
+        impression = "\n".join(f"{idx}. {finding}" for idx, finding in enumerate(findings, 1))
+        return f"Radiological Analysis\n\nStub analysis.\n\nImpression:\n{impression or '1. No acute findings'}\n"
+
+
+def findings_change_score(baseline, candidate):
+    """Score how much a candidate analysis differs from the baseline findings (0-1)"""
+    base_findings, base_keywords = baseline
+    new_findings, new_keywords = candidate
+
+    def lost_fraction(before, after):
+        before = {item.lower() for item in before}
+        if not before:
+            return 0.0
+        after = {item.lower() for item in after}
+        return len(before - after) / len(before)
+
+    # Findings that disappear weigh as much as keywords that disappear
+    return 0.5 * lost_fraction(base_findings, new_findings) + 0.5 * lost_fraction(base_keywords, new_keywords)
+
+
+class OcclusionExplainer:
+    """Occlusion-sensitivity maps with adaptive coarse-to-fine refinement"""
+
+    def __init__(self, model, grid_size=4, max_depth=2, refine_threshold=0.25,
+                 max_queries=64, max_workers=4, cache_size=512):
+        self.model = model
+        self.grid_size = grid_size
+        self.max_depth = max_depth
+        self.refine_threshold = refine_threshold
+        self.max_queries = max_queries
+        self.max_workers = max_workers
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._explanations = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+
+    def _query(self, image_array):
+        """Run the model on an image, reusing cached answers for identical pixels
+
+        Returns (findings and keywords, or None if the model failed; whether it was cached).
+        Failures are not cached, so a later run retries them.
+        """
+        key = (getattr(self.model, "name", type(self.model).__name__), image_hash(image_array))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return self._cache[key], True
+
+        analysis = self.model(Image.fromarray(image_array))
+        if analysis is None:
+            return None, False
+        result = extract_findings_and_keywords(analysis)
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result, False
+
+    def _occlude(self, image_array, box, fill):
+        """Copy the image with one box filled by a neutral value"""
+        top, left, bottom, right = box
+        occluded = image_array.copy()
+        occluded[top:bottom, left:right] = fill
+        return occluded
+
+    def _split(self, box, parts):
+        """Split a box into a parts x parts grid of non-empty cells"""
+        top, left, bottom, right = box
+        rows = np.linspace(top, bottom, parts + 1).astype(int).tolist()
+        cols = np.linspace(left, right, parts + 1).astype(int).tolist()
+        cells = []
+        for r in range(parts):
+            for c in range(parts):
+                if rows[r + 1] > rows[r] and cols[c + 1] > cols[c]:
+                    cells.append((rows[r], cols[c], rows[r + 1], cols[c + 1]))
+        return cells
+
+    def explain(self, image_array, baseline_analysis=None):
+        """Build a saliency map of how each region drives the reported findings
+
+        Cells whose query failed are left out of the map (and not refined);
+        the explanation counts them as `failed_queries`.
+        """
+        image_array = np.ascontiguousarray(image_array)
+        explanation_key = (
+            image_hash(image_array),
+            hashlib.sha256((baseline_analysis or "").encode()).hexdigest(),
+            self.grid_size, self.max_depth, self.refine_threshold, self.max_queries,
+        )
+        with self._lock:
+            if explanation_key in self._explanations:
+                self._explanations.move_to_end(explanation_key)
+                return self._explanations[explanation_key]
+
+        height, width = image_array.shape[:2]
+        fill = image_array.mean(axis=(0, 1)).astype(image_array.dtype)
+
+        # Baseline findings: reuse the stored analysis when we have one
+        if baseline_analysis is not None:
+            baseline = extract_findings_and_keywords(baseline_analysis)
+        else:
+            baseline, _ = self._query(image_array)
+            if baseline is None:
+                raise RuntimeError("The analysis model failed on the unoccluded image")
+
+        saliency_sum = np.zeros((height, width), dtype=np.float32)
+        saliency_count = np.zeros((height, width), dtype=np.float32)
+        cells = []
+        queries = cache_hits = failed = 0
+
+        level = self._split((0, 0, height, width), self.grid_size)
+        depth = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while level and depth <= self.max_depth and queries < self.max_queries:
+                level = level[:self.max_queries - queries]
+                occluded = [self._occlude(image_array, box, fill) for box in level]
+                results = list(executor.map(self._query, occluded))
+                queries += len(level)
+
+                next_level = []
+                for box, (result, cached) in zip(level, results):
+                    cache_hits += cached
+                    if result is None:
+                        failed += 1
+                        continue
+                    score = findings_change_score(baseline, result)
+                    top, left, bottom, right = box
+                    saliency_sum[top:bottom, left:right] += score
+                    saliency_count[top:bottom, left:right] += 1
+                    lost = [f for f in baseline[0] if f.lower() not in {n.lower() for n in result[0]}]
+                    cells.append({"box": box, "depth": depth, "score": score, "lost_findings": lost})
+
+                    # Only subdivide cells that actually moved the findings
+                    if score >= self.refine_threshold:
+                        next_level.extend(self._split(box, 2))
+
+                level = next_level
+                depth += 1
+
+        saliency = saliency_sum / np.maximum(saliency_count, 1)
+        if saliency.max() > 0:
+            saliency = saliency / saliency.max()
+
+        explanation = {
+            "saliency": saliency,
+            "cells": cells,
+            "baseline_findings": baseline[0],
+            "baseline_keywords": baseline[1],
+            "queries": queries,
+            "cache_hits": cache_hits,
+            "failed_queries": failed,
+        }
+        # Keep only complete explanations, so failed cells are retried next time
+        if not failed:
+            with self._lock:
+                self._explanations[explanation_key] = explanation
+                while len(self._explanations) > 8:
+                    self._explanations.popitem(last=False)
+        return explanation
+
+
+def generate_occlusion_heatmap(image_array, explainer, baseline_analysis=None, colormap="jet", alpha=0.5):
+    """Generate an occlusion-sensitivity overlay for XAI visualization"""
+    explanation = explainer.explain(image_array, baseline_analysis=baseline_analysis)
+    overlay, heatmap = default_engine.render_map(image_array, explanation["saliency"], colormap=colormap, alpha=alpha)
+    return Image.fromarray(overlay), Image.fromarray(heatmap), explanation
@@ -0,0 +1,79 @@
+import numpy as np
+from PIL import Image
+
+# Compact decoded image: one pixel buffer, zero-copy PIL and NumPy views
+class ProcessedImage:
+    """Decoded medical image backed by a single pixel buffer
+
+    Grayscale images are kept as an (H, W) buffer and colour images as an
+    (H, W, 4) RGBA buffer with opaque alpha, the layout PIL can wrap without
+    copying. ``array`` and ``data`` are views onto that one buffer, which may
+    itself be a read-only memory map from the blob store.
+    """
+
+    __slots__ = ("type", "buffer", "image_hash", "pixels_hash")
+
+    def __init__(self, image_type, buffer, image_hash=None, pixels_hash=None):
+        self.type = image_type
+        self.buffer = buffer
+        self.image_hash = image_hash
+        self.pixels_hash = pixels_hash
+
+    @classmethod
+    def from_array(cls, image_type, array):
+        """Build from a uint8 (H, W) or (H, W, 3) array"""
+        array = np.asarray(array, dtype=np.uint8)
+        if array.ndim == 3:
+            buffer = np.empty(array.shape[:2] + (4,), dtype=np.uint8)
+            buffer[..., :3] = array[..., :3]
+            buffer[..., 3] = 255
+        else:
+            buffer = np.ascontiguousarray(array)
+        return cls(image_type, buffer)
+
+    @classmethod
+    def from_pil(cls, image_type, image):
+        """Build from a PIL image, keeping only the pixel buffer"""
+        if image.mode == "L":
+            return cls(image_type, np.asarray(image).copy())
+        return cls(image_type, np.asarray(image.convert("RGBA")).copy())
+
+    @classmethod
+    def from_blob(cls, image_type, pixels_hash, image_hash=None, blob_store=None):
+        """Open a handle whose pixels are memory-mapped from the blob store"""
+        if blob_store is None:
+            from blob_store import get_blob_store
+            blob_store = get_blob_store()
+        return cls(image_type, blob_store.load_array(pixels_hash),
+                   image_hash=image_hash, pixels_hash=pixels_hash)
+
+    @property
+    def array(self):
+        """Pixels as (H, W) or (H, W, 3) uint8, without copying"""
+        if self.buffer.ndim == 3:
+            return self.buffer[..., :3]
+        return self.buffer
+
+    @property
+    def data(self):
+        """Pixels as a PIL image sharing the same buffer"""
+        height, width = self.buffer.shape[:2]
+        mode = "RGBA" if self.buffer.ndim == 3 else "L"
+        return Image.frombuffer(mode, (width, height), self.buffer, "raw", mode, 0, 1)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the pixel buffer"""
+        return self.buffer.nbytes
+
+    # Mapping-style access so existing file_data["..."] call sites keep working
+    def __getitem__(self, key):
+        if key in ("type", "data", "array", "image_hash", "pixels_hash"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in ("type", "data", "array", "image_hash", "pixels_hash")
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
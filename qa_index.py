@@ -0,0 +1,328 @@
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+import numpy as np
+from text_index import tokenize
+from answer_cache import content_version
+from analysis_changes import get_analysis_changes
+from embeddings import get_embedding_provider, encode_one
+from utils_simple import get_all_analyses, get_analysis_by_id
+
+def analysis_text(analysis):
+    """The text QA answers are based on: analysis, findings and image metadata"""
+    text = analysis.get("analysis", "")
+    if analysis.get("findings"):
+        findings_text = "\n".join(f"- {finding}" for finding in analysis["findings"])
+        text += f"\n\nFindings:\n{findings_text}"
+    text += f"\n\nImage: {analysis.get('filename', 'unknown')}"
+    text += f"\nDate: {analysis.get('date', '')[:10]}"
+    return text
+
+def chunk_analysis(analysis, chunk_chars=1200):
+    """Split an analysis into paragraph-aligned chunks, each labelled with its image and date"""
+    if not analysis.get("analysis", "").strip():
+        return []
+    label = f"[{analysis.get('filename', 'unknown')}, {analysis.get('date', '')[:10]}]"
+    chunks, current = [], ""
+    for paragraph in analysis_text(analysis).split("\n\n"):
+        if current and len(current) + len(paragraph) > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return [f"{label}\n{chunk}" for chunk in chunks]
+
+
+# Retrieval index for report QA, refreshed from the analysis change log
+class QAIndex:
+    """Analysis chunks with embeddings and a lexical (BM25) index, updated by deltas
+
+    Chunks and their embeddings are persisted in SQLite with the last
+    change-log sequence applied, so a restart loads them instead of
+    re-embedding. refresh() applies only the changes since then: a saved
+    analysis has its chunks replaced (unchanged chunks keep their
+    embeddings), a removed one has its rows dropped. Rows are tombstoned in
+    memory and compacted once more than half are dead.
+
+    Embeddings come from an embedding provider (see embeddings.py), whose
+    name is stored with the index: switching providers, or refitting a
+    corpus-trained one, re-embeds every chunk. A trained provider's model
+    is saved next to the index as `<path>.embedder`.
+    """
+
+    lexical_weight = 0.3
+
+    def __init__(self, path=None, changes=None, chunk_chars=None, embedder=None):
+        self.path = path or os.environ.get("QA_INDEX_PATH", "qa_index.db")
+        self.chunk_chars = int(chunk_chars or os.environ.get("QA_INDEX_CHUNK_CHARS", 1200))
+        self.changes = changes or get_analysis_changes()
+        self.embedder = embedder or get_embedding_provider()
+        if hasattr(self.embedder, "load") and os.path.exists(f"{self.path}.embedder"):
+            self.embedder.load(f"{self.path}.embedder")
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                analysis_id TEXT NOT NULL,
+                version TEXT,
+                text TEXT,
+                date TEXT,
+                embedding BLOB
+            );
+            CREATE INDEX IF NOT EXISTS chunks_analysis ON chunks (analysis_id);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self.conn.commit()
+        self._load()
+
+    def _meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    # In-memory rows: chunk records, embedding matrix, tombstones and postings
+    def _reset(self):
+        self._rows = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._embedded = np.zeros(0, dtype=bool)
+        self._matrix = None
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._postings = defaultdict(dict)
+        self._by_analysis = defaultdict(list)
+        self._dead = 0
+
+    def _load(self):
+        with self._lock:
+            self._reset()
+            self.last_seq = int(self._meta("last_seq", 0))
+            self.built = self._meta("built") == "1"
+            for row in self.conn.execute("SELECT chunk_id, analysis_id, version, text, date, embedding FROM chunks"):
+                embedding = np.frombuffer(row[5], dtype=np.float32) if row[5] else None
+                self._append({"chunk_id": row[0], "analysis_id": row[1], "version": row[2],
+                              "text": row[3], "date": row[4]}, embedding)
+
+    def _grow(self, size):
+        capacity = max(size, 2 * len(self._alive), 64)
+        for name in ("_alive", "_embedded", "_lengths"):
+            grown = np.zeros(capacity, dtype=getattr(self, name).dtype)
+            grown[:len(self._rows)] = getattr(self, name)[:len(self._rows)]
+            setattr(self, name, grown)
+        if self._matrix is not None:
+            grown = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+            grown[:len(self._rows)] = self._matrix[:len(self._rows)]
+            self._matrix = grown
+
+    def _append(self, chunk, embedding=None):
+        row = len(self._rows)
+        if row >= len(self._alive):
+            self._grow(row + 1)
+        self._rows.append(chunk)
+        self._alive[row] = True
+        self._by_analysis[chunk["analysis_id"]].append(row)
+        terms = Counter(tokenize(chunk["text"]))
+        self._lengths[row] = sum(terms.values())
+        for term, count in terms.items():
+            self._postings[term][row] = count
+        if embedding is not None:
+            self._set_embedding(row, embedding)
+        return row
+
+    def _set_embedding(self, row, embedding):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        if not norm:
+            return
+        if self._matrix is None or self._matrix.shape[1] != len(embedding):
+            # First embedding, or the embedding model changed: every row is re-embedded
+            self._matrix = np.zeros((len(self._alive), len(embedding)), dtype=np.float32)
+            self._embedded[:] = False
+        self._matrix[row] = embedding / norm
+        self._embedded[row] = True
+
+    def _remove_rows(self, analysis_id):
+        for row in self._by_analysis.pop(analysis_id, []):
+            self._alive[row] = False
+            self._embedded[row] = False
+            for term in set(tokenize(self._rows[row]["text"])):
+                self._postings[term].pop(row, None)
+            self._dead += 1
+
+    def _compact(self):
+        # Rebuild the in-memory arrays from live rows (no re-embedding)
+        live = [(self._rows[row], self._matrix[row] if self._embedded[row] else None)
+                for row in range(len(self._rows)) if self._alive[row]]
+        self._reset()
+        for chunk, embedding in live:
+            self._append(chunk, embedding)
+
+    # Applying changes
+    def _upsert(self, analysis):
+        analysis_id = analysis["id"]
+        chunks = [{"chunk_id": f"{analysis_id}:{position}", "analysis_id": analysis_id, "version": content_version(text),
+                   "text": text, "date": analysis.get("date", "")}
+                  for position, text in enumerate(chunk_analysis(analysis, self.chunk_chars))]
+        existing = self._by_analysis.get(analysis_id, [])
+        if [chunk["version"] for chunk in chunks] == [self._rows[row]["version"] for row in existing]:
+            return 0
+        kept = {self._rows[row]["version"]: self._matrix[row] for row in existing if self._embedded[row]}
+        self._remove_rows(analysis_id)
+        self.conn.execute("DELETE FROM chunks WHERE analysis_id = ?", (analysis_id,))
+        for chunk in chunks:
+            row = self._append(chunk, kept.get(chunk["version"]))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO chunks (chunk_id, analysis_id, version, text, date, embedding) VALUES (?, ?, ?, ?, ?, ?)",
+                (chunk["chunk_id"], analysis_id, chunk["version"], chunk["text"], chunk["date"],
+                 self._matrix[row].tobytes() if self._embedded[row] else None)
+            )
+        return len(chunks)
+
+    def _delete(self, analysis_id):
+        self._remove_rows(analysis_id)
+        self.conn.execute("DELETE FROM chunks WHERE analysis_id = ?", (analysis_id,))
+
+    def _embed_pending(self, embedder, batch_size=256):
+        # New chunks, and any indexed while the provider was unavailable, in batches
+        pending = np.flatnonzero(self._alive[:len(self._rows)] & ~self._embedded[:len(self._rows)])
+        for start in range(0, len(pending), batch_size):
+            rows = pending[start:start + batch_size]
+            vectors = embedder.encode([self._rows[row]["text"] for row in rows])
+            if vectors is None:
+                return
+            for row, vector in zip(rows, vectors):
+                self._set_embedding(row, vector)
+            self.conn.executemany("UPDATE chunks SET embedding = ? WHERE chunk_id = ?",
+                                  [(self._matrix[row].tobytes() if self._embedded[row] else None, self._rows[row]["chunk_id"])
+                                   for row in rows])
+
+    def _sync_embedder(self, embedder):
+        # Refit a corpus-trained provider as the corpus grows, then drop vectors from any other model
+        live = np.flatnonzero(self._alive[:len(self._rows)])
+        if embedder.needs_fit(len(live)):
+            embedder.fit([self._rows[row]["text"] for row in live])
+            embedder.save(f"{self.path}.embedder")
+        if self._meta("embedder") != embedder.name:
+            self._matrix = None
+            self._embedded[:] = False
+            self.conn.execute("UPDATE chunks SET embedding = NULL")
+            self._set_meta("embedder", embedder.name)
+
+    def refresh(self, embedder=None):
+        """Apply analysis changes since the last refresh; returns the number of changes applied
+
+        The first refresh indexes every analysis; later ones only read the
+        change log after the last applied sequence. New chunks (and any not
+        yet embedded) are then embedded in batches by `embedder`, or the
+        index's own provider.
+        """
+        embedder = embedder or self.embedder
+        with self._lock:
+            applied = 0
+            if not self.built:
+                generation = self.changes.generation()
+                for analysis in get_all_analyses():
+                    self._upsert(analysis)
+                    applied += 1
+                self.last_seq, self.built = generation, True
+                self._set_meta("built", 1)
+
+            while True:
+                changes = self.changes.since(self.last_seq)
+                if not changes:
+                    break
+                # Only the last change to each analysis matters
+                latest = {}
+                for seq, analysis_id, op in changes:
+                    latest.pop(analysis_id, None)
+                    latest[analysis_id] = op
+                    self.last_seq = seq
+                for analysis_id, op in latest.items():
+                    analysis = get_analysis_by_id(analysis_id) if op != "delete" else None
+                    if analysis is None:
+                        self._delete(analysis_id)
+                    else:
+                        self._upsert(analysis)
+                    applied += 1
+
+            self._sync_embedder(embedder)
+            self._embed_pending(embedder)
+            if self._dead > len(self._rows) // 2:
+                self._compact()
+            self._set_meta("last_seq", self.last_seq)
+            self.conn.commit()
+            return applied
+
+    def embed_query(self, query, embedder=None):
+        """The query's vector from the same provider as the index (None if unavailable)"""
+        return encode_one(embedder or self.embedder, query)
+
+    # Retrieval
+    def _lexical_scores(self, query):
+        scores = np.zeros(len(self._rows), dtype=np.float32)
+        live = int(self._alive[:len(self._rows)].sum())
+        if not live:
+            return scores
+        average_length = float(self._lengths[:len(self._rows)][self._alive[:len(self._rows)]].mean()) or 1.0
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (live - len(postings) + 0.5) / (len(postings) + 0.5))
+            rows = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            counts = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            # BM25 with k1=1.2, b=0.75
+            scores[rows] += idf * counts * 2.2 / (counts + 1.2 * (0.25 + 0.75 * self._lengths[rows] / average_length))
+        return scores
+
+    def search(self, query, query_embedding=None, top_k=3):
+        """The top_k chunks by embedding similarity plus weighted BM25, as dicts with id, chunk_id, version, text, date"""
+        with self._lock:
+            size = len(self._rows)
+            if not size or not self._alive[:size].any():
+                return []
+            lexical = self._lexical_scores(query)
+            if lexical.max() > 0:
+                lexical /= lexical.max()
+            scores = self.lexical_weight * lexical
+            if query_embedding is not None and self._matrix is not None:
+                query_vector = np.asarray(query_embedding, dtype=np.float32)
+                if len(query_vector) == self._matrix.shape[1] and np.linalg.norm(query_vector):
+                    semantic = self._matrix[:size] @ (query_vector / np.linalg.norm(query_vector))
+                    scores = scores + np.where(self._embedded[:size], semantic, 0)
+            scores = np.where(self._alive[:size], scores, -np.inf)
+            top = np.argsort(-scores, kind="stable")[:min(top_k, int(self._alive[:size].sum()))]
+            return [{"id": self._rows[row]["analysis_id"], "chunk_id": self._rows[row]["chunk_id"],
+                     "version": self._rows[row]["version"], "text": self._rows[row]["text"],
+                     "date": self._rows[row]["date"], "score": float(scores[row])} for row in top]
+
+    def stats(self):
+        with self._lock:
+            size = len(self._rows)
+            return {
+                "analyses": len(self._by_analysis),
+                "chunks": int(self._alive[:size].sum()),
+                "pending_embeddings": int((self._alive[:size] & ~self._embedded[:size]).sum()),
+                "last_seq": self.last_seq,
+            }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+def get_qa_index():
+    """Get the shared QA retrieval index"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = QAIndex()
+        return _default_index
@@ -3,6 +3,9 @@ import time
 
 # Import the QA system
 from report_qa_chat import ReportQASystem, ReportQAChat
+from app_cache import get_shared_qa_chat
+from chat_system import message_window, load_older_messages, get_reply_executor
+from conversation_memory import get_conversation_memory
 
 def render_qa_chat_interface():
     """Render the QA chat interface in Streamlit"""
@@ -14,7 +17,7 @@ def render_qa_chat_interface():
         st.session_state.qa_system = ReportQASystem(api_key=api_key)
     
     if "qa_chat" not in st.session_state:
-        st.session_state.qa_chat = ReportQAChat()
+        st.session_state.qa_chat = get_shared_qa_chat()
     
     # User information
     if "qa_user_name" not in st.session_state:
@@ -41,7 +44,6 @@ def render_qa_chat_interface():
                 #@16/04 2:31pm
                 # Only rerun the page if necessary
                 if "current_qa_id" not in st.session_state or st.session_state.current_qa_id != selected_qa_id:
-
                     st.rerun()
         else:
             st.info("No active Q&A rooms. Create a new one!")
@@ -58,8 +60,7 @@ def render_qa_chat_interface():
                 #16/04 2:33pm
                 # Only rerun the page if necessary
                 if "current_qa_id" not in st.session_state or st.session_state.current_qa_id != created_qa_id:
-
-                st.rerun()
+                    st.rerun()
             else:
                 st.error("Please provide a room name")
     
@@ -82,15 +83,17 @@ def render_qa_chat_interface():
             
             # Option to clear chat history
             if st.button("Clear Conversation History", key="clear_qa_hist"):
-                st.session_state.qa_system.clear_history()
+                st.session_state.qa_system.clear_history(qa_id)
                 st.info("Conversation history has been cleared.")
             
-            # Display messages
-            messages = st.session_state.qa_chat.get_messages(qa_id)
+            # Display messages (only new ones are fetched on each rerun)
+            window = message_window(qa_id)
+            if window["has_older"] and st.button("Load earlier messages", key="qa_older"):
+                load_older_messages(qa_id)
             
             qa_chat_container = st.container()
             with qa_chat_container:
-                for msg in messages:
+                for msg in window["messages"]:
                     is_ai = msg["user"] == "Report QA System"
                     with st.chat_message(name=msg["user"], avatar="🤖" if is_ai else "👨‍⚕️"):
                         st.write(msg["content"])
@@ -99,7 +102,7 @@ def render_qa_chat_interface():
             qa_message = st.chat_input("Ask a question about your medical reports", key="qa_msg_input")
             if qa_message:
                 # Add user message
-                st.session_state.qa_chat.add_message(qa_id, user_name, qa_message)
+                posted = st.session_state.qa_chat.add_message(qa_id, user_name, qa_message)
                 
                 # Get API key from session state
                 api_key = st.session_state.get("OPENAI_API_KEY", st.session_state.get("openai_key", None))
@@ -112,22 +115,25 @@ def render_qa_chat_interface():
                 with st.spinner("Analyzing medical reports..."):
                     # Add small delay for better UX
                     time.sleep(0.5)
-                    ai_response = st.session_state.qa_system.answer_question(qa_message)
+                    ai_response = st.session_state.qa_system.answer_question(
+                        qa_message, qa_id, posted["cursor"] if posted else None
+                    )
                 
-                # Add AI response
+                # Add AI response, then fold older turns into the room's memory in the background
                 st.session_state.qa_chat.add_message(qa_id, "Report QA System", ai_response)
+                get_reply_executor().submit(get_conversation_memory().compact, qa_id, api_key)
                 
                 #16/04 2:34pm
                 # Only rerun the page if necessary
                 if "current_qa_id" not in st.session_state or st.session_state.current_qa_id != qa_id:
-
-                st.rerun()
+                    st.rerun()
             
             # Option to delete room
             with st.expander("Room Settings"):
                 if st.button("Delete Q&A Room", key="del_qa_room"):
                     if st.session_state.qa_chat.delete_qa_room(qa_id):
                         st.success("Room deleted successfully.")
+                        st.session_state.pop(f"messages_{qa_id}", None)
                         # Remove current room from session state
                         del st.session_state.current_qa_id
                         st.rerun()
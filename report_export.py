@@ -0,0 +1,193 @@
+import json
+import multiprocessing
+import os
+import re
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from report_jobs import _init_worker, get_report_renderer, render_report, report_cache_key
+from utils_simple import REPORT_REFERENCE_COUNT, search_pubmed_many
+
+# Bulk export of analysis reports into one zip archive
+PAGE_PATTERN = re.compile(rb"/Type\s*/Page\b")
+
+def count_pages(pdf_bytes):
+    """Number of pages in a ReportLab PDF"""
+    return len(PAGE_PATTERN.findall(pdf_bytes))
+
+def _keywords_text(analysis):
+    keywords = analysis.get("keywords", [])
+    return " ".join(keywords) if isinstance(keywords, list) else str(keywords)
+
+def filter_analyses(analyses, date_from=None, date_to=None, keyword=None, analysis_type=None):
+    """Analyses within a date range (YYYY-MM-DD, inclusive), of a type and mentioning a keyword"""
+    keyword = keyword.lower() if keyword else None
+    for analysis in analyses:
+        day = analysis.get("date", "")[:10]
+        if date_from and day < str(date_from):
+            continue
+        if date_to and day > str(date_to):
+            continue
+        if analysis_type and analysis.get("type") != analysis_type:
+            continue
+        if keyword:
+            text = " ".join([
+                analysis.get("filename", ""),
+                analysis.get("analysis", ""),
+                " ".join(analysis.get("findings", [])),
+                _keywords_text(analysis),
+            ]).lower()
+            if keyword not in text:
+                continue
+        yield analysis
+
+def report_filename(analysis):
+    """Archive member name for an analysis report"""
+    day = analysis.get("date", "")[:10] or "undated"
+    return f"report_{day}_{analysis.get('id', 'unknown')[:8]}.pdf"
+
+def prefetch_references(analyses):
+    """Look up the references of many reports in one batched PubMed session
+
+    Results go to the shared literature cache, so the rendering workers read
+    them from there instead of each making its own esearch and efetch.
+    """
+    keyword_sets = {tuple(analysis["keywords"]) for analysis in analyses
+                    if isinstance(analysis.get("keywords"), list) and analysis["keywords"]}
+    if keyword_sets:
+        search_pubmed_many(keyword_sets, max_results=REPORT_REFERENCE_COUNT)
+
+def export_reports(path, analyses, include_references=True, workers=None, progress=None):
+    """Render reports in worker processes and stream them into a zip at path
+
+    At most two renders per worker are in flight and each PDF is written
+    to the archive as soon as it arrives, so memory stays bounded whatever
+    the number of reports. Reports already in the report cache are copied
+    without rendering; references for the rest are fetched up front in one
+    batch. progress(done, total, pages, elapsed) is called after each
+    report. Returns a summary dict.
+    """
+    analyses = list(analyses)
+    workers = workers or int(os.environ.get("REPORT_WORKERS", 2))
+    # The process's one report cache; a second instance over the same file would overwrite its entries
+    cache = get_report_renderer().cache
+    start = time.perf_counter()
+    done, pages, cached, failed = 0, 0, 0, []
+    manifest = []
+
+    # Write to a temporary name so a partial archive is never mistaken for a finished one
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker
+    )
+    try:
+        with zipfile.ZipFile(temp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            def write(analysis, pdf_bytes):
+                nonlocal done, pages
+                name = report_filename(analysis)
+                archive.writestr(name, pdf_bytes)
+                page_count = count_pages(pdf_bytes)
+                manifest.append({"id": analysis.get("id"), "filename": analysis.get("filename"),
+                                 "date": analysis.get("date"), "report": name, "pages": page_count})
+                done += 1
+                pages += page_count
+                if progress:
+                    progress(done, len(analyses), pages, time.perf_counter() - start)
+
+            if include_references:
+                prefetch_references(analysis for analysis in analyses
+                                    if cache.blob_for(report_cache_key(analysis, include_references)) is None)
+
+            pending = {}
+            for analysis in analyses:
+                key = report_cache_key(analysis, include_references)
+                pdf_bytes = cache.get(key)
+                if pdf_bytes is not None:
+                    cached += 1
+                    write(analysis, pdf_bytes)
+                    continue
+
+                # Keep the pool busy without queuing every analysis at once
+                while len(pending) >= workers * 2:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        _collect(future, pending.pop(future), cache, write, failed)
+                future = pool.submit(render_report, analysis, include_references)
+                pending[future] = (analysis, key)
+
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    _collect(future, pending.pop(future), cache, write, failed)
+
+            archive.writestr("manifest.json", json.dumps({
+                "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "include_references": include_references,
+                "reports": manifest,
+                "failed": failed,
+            }, indent=2))
+        os.replace(temp_path, path)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "path": path,
+        "reports": done,
+        "pages": pages,
+        "cached": cached,
+        "failed": failed,
+        "seconds": elapsed,
+        "pages_per_second": pages / elapsed if elapsed else 0.0,
+    }
+
+def _collect(future, item, cache, write, failed):
+    """Write one finished render, or record its failure"""
+    analysis, key = item
+    if future.exception() is not None:
+        failed.append({"id": analysis.get("id"), "error": str(future.exception())})
+        return
+    pdf_bytes = future.result()
+    cache.put(key, pdf_bytes)
+    write(analysis, pdf_bytes)
+
+def default_export_path(prefix="reports"):
+    """Timestamped archive path in the export directory"""
+    export_dir = os.environ.get("REPORT_EXPORT_DIR", "exports")
+    os.makedirs(export_dir, exist_ok=True)
+    return os.path.join(export_dir, f"{prefix}_{time.strftime('%Y%m%d_%H%M%S')}.zip")
+
+
+if __name__ == "__main__":
+    import argparse
+    from utils_simple import get_all_analyses
+
+    parser = argparse.ArgumentParser(description="Export analysis reports into a zip archive")
+    parser.add_argument("--output", help="Archive path (default: exports/reports_<timestamp>.zip)")
+    parser.add_argument("--from", dest="date_from", help="First analysis date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", help="Last analysis date, YYYY-MM-DD")
+    parser.add_argument("--keyword", help="Only analyses mentioning this text")
+    parser.add_argument("--type", dest="analysis_type", help="Only analyses of this type (image, dicom, nifti)")
+    parser.add_argument("--no-references", action="store_true", help="Skip literature and trial lookups")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    selected = list(filter_analyses(get_all_analyses(args.date_from, args.date_to), args.date_from, args.date_to,
+                                    args.keyword, args.analysis_type))
+    print(f"{len(selected)} analyses selected")
+
+    def show(done, total, pages, elapsed):
+        print(f"\r{done}/{total} reports, {pages} pages, {pages / elapsed if elapsed else 0:.1f} pages/s",
+              end="", flush=True)
+
+    summary = export_reports(args.output or default_export_path(), selected,
+                             include_references=not args.no_references, workers=args.workers, progress=show)
+    print()
+    print(f"{summary['path']}: {summary['reports']} reports ({summary['cached']} from cache), "
+          f"{summary['pages']} pages in {summary['seconds']:.1f}s "
+          f"({summary['pages_per_second']:.1f} pages/s), {len(summary['failed'])} failed")
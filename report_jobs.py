@@ -0,0 +1,214 @@
+import atexit
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait
+from blob_store import get_blob_store
+
+# Bump when the report layout changes so cached PDFs are re-rendered
+REPORT_TEMPLATE_VERSION = 2
+
+def report_cache_key(analysis, include_references=True):
+    """Cache key from the analysis id, render options and a hash of its content"""
+    content_hash = hashlib.sha256(json.dumps(analysis, sort_keys=True, default=str).encode()).hexdigest()
+    options = f"refs={int(bool(include_references))};template={REPORT_TEMPLATE_VERSION}"
+    return f"{analysis.get('id', 'unknown')}:{options}:{content_hash}"
+
+
+class ReportCache:
+    """Finished PDFs in the blob store, indexed by report cache key"""
+
+    def __init__(self, path=None, max_entries=1000):
+        self.path = path or os.environ.get("REPORT_CACHE_PATH", "report_cache.json")
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                return json.load(f).get("reports", {})
+        return {}
+
+    def _save(self):
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"reports": self._entries}, f)
+        os.replace(temp_path, self.path)
+
+    def get(self, key):
+        """Get cached PDF bytes, or None"""
+        blob_store = get_blob_store()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not blob_store.exists(entry["blob"]):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return blob_store.get(entry["blob"])
+
+    def blob_for(self, key):
+        """Blob hash of a cached PDF, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry["blob"] if entry else None
+
+    def put(self, key, pdf_bytes):
+        """Store a rendered PDF"""
+        blob_store = get_blob_store()
+        blob_hash = blob_store.put(pdf_bytes)
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous and previous["blob"] == blob_hash:
+                return
+            self._entries[key] = {"blob": blob_hash, "created_at": time.time()}
+            blob_store.incref(blob_hash)
+            if previous:
+                blob_store.decref(previous["blob"])
+
+            # Evict the oldest reports over the size limit
+            if len(self._entries) > self.max_entries:
+                oldest = sorted(self._entries, key=lambda k: self._entries[k]["created_at"])
+                for old_key in oldest[:len(self._entries) - self.max_entries]:
+                    blob_store.decref(self._entries.pop(old_key)["blob"])
+            self._save()
+
+
+def _init_worker():
+    """Build ReportLab styles once when a worker process starts"""
+    from utils_simple import get_report_styles
+    get_report_styles()
+
+def render_report(analysis, include_references=True):
+    """Render one report to PDF bytes (runs in a worker process)"""
+    from utils_simple import generate_report
+    return generate_report(analysis, include_references=include_references).getvalue()
+
+
+class ReportJob:
+    """Handle for a report being rendered in the background"""
+
+    def __init__(self, key, future=None, pdf_bytes=None):
+        self.key = key
+        self.future = future
+        self._pdf_bytes = pdf_bytes
+        self.submitted_at = time.time()
+
+    @property
+    def state(self):
+        """'done', 'error' or 'running'"""
+        if self._pdf_bytes is not None:
+            return "done"
+        if self.future.done():
+            return "error" if self.future.exception() else "done"
+        return "running"
+
+    @property
+    def done(self):
+        return self.state != "running"
+
+    @property
+    def error(self):
+        return self.future.exception() if self.future is not None and self.future.done() else None
+
+    def wait(self, timeout=None):
+        """Wait up to timeout seconds; returns True once finished"""
+        if self._pdf_bytes is None:
+            wait([self.future], timeout=timeout)
+        return self.done
+
+    def result(self, timeout=None):
+        """PDF bytes (blocks until rendered)"""
+        if self._pdf_bytes is None:
+            self._pdf_bytes = self.future.result(timeout=timeout)
+        return self._pdf_bytes
+
+
+class ReportRenderer:
+    """Renders reports in a process pool and caches finished PDFs
+
+    Submitting the same analysis and options again returns the existing
+    job, or the cached PDF at once when it was already rendered.
+    """
+
+    def __init__(self, max_workers=None, cache=None):
+        self.max_workers = max_workers or int(os.environ.get("REPORT_WORKERS", 2))
+        self.cache = cache or ReportCache()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Spawned workers don't inherit the web server's threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return self._pool
+
+    def submit(self, analysis, include_references=True):
+        """Start rendering (or reuse a cached/in-flight render); returns a ReportJob"""
+        key = report_cache_key(analysis, include_references)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.state != "error":
+                return job
+
+        pdf_bytes = self.cache.get(key)
+        with self._lock:
+            if pdf_bytes is not None:
+                job = ReportJob(key, pdf_bytes=pdf_bytes)
+            else:
+                future = self._get_pool().submit(render_report, analysis, include_references)
+                job = ReportJob(key, future=future)
+                future.add_done_callback(lambda f, key=key: self._store(key, f))
+            self._jobs[key] = job
+            self._prune()
+            return job
+
+    def _store(self, key, future):
+        if future.exception() is None:
+            self.cache.put(key, future.result())
+
+    def _prune(self, max_jobs=256):
+        """Forget finished jobs beyond the most recent ones (results stay cached)"""
+        if len(self._jobs) > max_jobs:
+            finished = sorted((job.submitted_at, key) for key, job in self._jobs.items() if job.done)
+            for _, key in finished[:len(self._jobs) - max_jobs]:
+                del self._jobs[key]
+
+    def render(self, analysis, include_references=True, timeout=None):
+        """Render synchronously through the pool/cache; returns PDF bytes"""
+        return self.submit(analysis, include_references).result(timeout=timeout)
+
+    def stats(self):
+        """Job and cache counters"""
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if not job.done)
+        return {"running": running, "cache_hits": self.cache.hits, "cache_misses": self.cache.misses}
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_default_renderer = None
+_default_lock = threading.Lock()
+
+def get_report_renderer():
+    """Get the shared background report renderer"""
+    global _default_renderer
+    with _default_lock:
+        if _default_renderer is None:
+            _default_renderer = ReportRenderer()
+            atexit.register(_default_renderer.shutdown)
+        return _default_renderer
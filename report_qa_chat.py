@@ -3,111 +3,90 @@ import os
 import uuid
 from datetime import datetime
 import openai
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from utils_simple import get_openai_client
+from message_store import get_message_store
+from conversation_memory import get_conversation_memory
+from answer_cache import get_answer_cache, content_version
+from qa_index import get_qa_index
+from embeddings import get_embedding_provider
+
+# Model and prompt version for report answers (part of the answer cache key)
+QA_MODEL = "gpt-3.5-turbo"
+QA_PROMPT_VERSION = "report-qa-1"
 
 # QA System for Medical Reports
 class ReportQASystem:
     def __init__(self, api_key=None):
         self.api_key = api_key
-        self.conversation_history = []
-        self.analysis_store = self.load_analysis_store()
     
-    def load_analysis_store(self):
-        """Load the analysis store from disk"""
-        if os.path.exists("analysis_store.json"):
-            with open("analysis_store.json", "r") as f:
-                return json.load(f)
-        return {"analyses": []}
+    def embedding_provider(self):
+        """The deployment's embedding provider (local unless QA_EMBEDDINGS=openai)"""
+        return get_embedding_provider(self.api_key)
     
-    def get_embeddings(self, text, model="text-embedding-ada-002"):
-        """Get embeddings for text using OpenAI API"""
-        if not self.api_key:
-            # Return dummy embeddings if no API key
-            return np.random.rand(1536)
-            
-        try:
-            client = openai.OpenAI(api_key=self.api_key)
-            response = client.embeddings.create(
-                input=text,
-                model=model
-            )
-            return response.data[0].embedding
-        except Exception as e:
-            print(f"Error getting embeddings: {e}")
-            # Return dummy embeddings on error
-            return np.random.rand(1536)
+    def get_embeddings(self, text):
+        """Get embeddings for text from the embedding provider (None if unavailable)"""
+        return get_qa_index().embed_query(text, self.embedding_provider())
     
     def get_relevant_contexts(self, query, top_k=3):
         """Find relevant contexts for a query using embeddings similarity"""
-        # Get query embedding
-        query_embedding = self.get_embeddings(query)
-        
-        # Extract all analyses and get embeddings
-        analyses = self.analysis_store["analyses"]
-        contexts = []
-        
-        if not analyses:
+        _, contexts = self.rank_contexts(query, top_k)
+        if not contexts:
             return ["No previous analyses found."]
-        
-        # Get embeddings for each analysis
-        for analysis in analyses:
-            analysis_text = analysis.get("analysis", "")
-            if not analysis_text.strip():
-                continue
-                
-            # Combine analysis with findings
-            full_text = analysis_text
-            if "findings" in analysis and analysis["findings"]:
-                findings_text = "\n".join([f"- {finding}" for finding in analysis["findings"]])
-                full_text += f"\n\nFindings:\n{findings_text}"
-            
-            # Add metadata
-            full_text += f"\n\nImage: {analysis.get('filename', 'unknown')}"
-            full_text += f"\nDate: {analysis.get('date', '')[:10]}"
-            
-            contexts.append({
-                "text": full_text,
-                "embedding": self.get_embeddings(full_text),
-                "id": analysis.get("id", ""),
-                "date": analysis.get("date", "")
-            })
-        
-        # Calculate similarities
-        similarities = []
-        for context in contexts:
-            similarity = cosine_similarity(
-                [query_embedding], 
-                [context["embedding"]]
-            )[0][0]
-            similarities.append((similarity, context))
-        
-        # Sort by similarity and get top_k
-        similarities.sort(reverse=True)
-        top_contexts = [context["text"] for _, context in similarities[:top_k]]
-        
-        return top_contexts
+        return [context["text"] for context in contexts]
+    
+    def rank_contexts(self, query, top_k=3):
+        """The query embedding and the top_k analysis chunks (id, chunk_id, version, text, date)
+
+        The shared QA index is brought up to date with the analysis change
+        log first, so analyses saved since the last question are included
+        without re-reading the store.
+        """
+        index, embedder = get_qa_index(), self.embedding_provider()
+        index.refresh(embedder)
+        query_embedding = index.embed_query(query, embedder)
+        return query_embedding, index.search(query, query_embedding, top_k)
     
-    def answer_question(self, question):
-        """Answer a question about medical reports using RAG"""
+    def answer_question(self, question, room_id=None, question_cursor=None):
+        """Answer a question about medical reports using RAG
+
+        With a `room_id`, the room's conversation memory up to
+        `question_cursor` (the posted question) is sent along with it.
+        """
         if not self.api_key:
             return "Please provide an OpenAI API key to enable the QA system."
         
         # Get relevant contexts
-        contexts = self.get_relevant_contexts(question)
+        try:
+            query_embedding, contexts = self.rank_contexts(question)
+        except Exception as e:
+            return f"I encountered an error while searching the reports: {str(e)}"
+        embedder_name = self.embedding_provider().name
         
-        if not contexts or contexts[0] == "No previous analyses found.":
+        if not contexts:
             return "I don't have any medical reports to reference. Please upload and analyze some images first."
         
-        # Create combined context text
-        combined_context = "\n\n---\n\n".join(contexts)
+        # Earlier turns of this room: a rolling summary plus the recent messages
+        history = []
+        if room_id:
+            history = get_conversation_memory().prompt_messages(room_id, "Report QA System", question_cursor)
+        
+        # The same question over the same reports (at the same versions) and
+        # the same memory is answered from the cache
+        cache = get_answer_cache()
+        sources = [(context["chunk_id"], context["version"]) for context in contexts]
+        if history:
+            sources.append(("history", content_version(history)))
+        answer, embedding = cache.get(question, sources, QA_MODEL, QA_PROMPT_VERSION, lambda text: query_embedding,
+                                      embedder_name)
+        if answer is not None:
+            return answer
         
-        # Add to conversation history
-        self.conversation_history.append({"role": "user", "content": question})
+        # Create combined context text
+        combined_context = "\n\n---\n\n".join(context["text"] for context in contexts)
         
         try:
             # Create prompt for GPT
-            client = openai.OpenAI(api_key=self.api_key)
+            client = get_openai_client(self.api_key)
             
             system_prompt = f"""You are a medical AI assistant answering questions about medical reports.
             Use the following medical report contexts to answer the question.
@@ -119,35 +98,29 @@ class ReportQASystem:
             
             messages = [
                 {"role": "system", "content": system_prompt},
-                *self.conversation_history
+                *history,
+                {"role": "user", "content": question}
             ]
             
             # Get response from OpenAI
             response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
+                model=QA_MODEL,
                 messages=messages,
                 max_tokens=500,
                 temperature=0.3
             )
             
             answer = response.choices[0].message.content
-            
-            # Add to conversation history
-            self.conversation_history.append({"role": "assistant", "content": answer})
-            
-            # Keep conversation history manageable
-            if len(self.conversation_history) > 10:
-                # Keep only the 10 most recent messages
-                self.conversation_history = self.conversation_history[-10:]
-            
+            cache.put(question, sources, QA_MODEL, QA_PROMPT_VERSION, answer, embedding,
+                      analysis_ids=[context["id"] for context in contexts], embedder_name=embedder_name)
             return answer
         
         except Exception as e:
             return f"I encountered an error while answering your question: {str(e)}"
     
-    def clear_history(self):
-        """Clear conversation history"""
-        self.conversation_history = []
+    def clear_history(self, room_id):
+        """Clear a room's conversation memory (its messages stay on screen)"""
+        get_conversation_memory().clear(room_id)
         return "Conversation history cleared."
 
 
@@ -155,6 +128,14 @@ class ReportQASystem:
 class ReportQAChat:
     def __init__(self):
         self.qa_chat_store = self.get_qa_chat_store()
+        self.message_store = get_message_store()
+        
+        # Older stores kept messages inline; move them into the message store once
+        inline = [room for room in self.qa_chat_store["rooms"].values() if "messages" in room]
+        for room in inline:
+            self.message_store.import_messages(room["id"], room.pop("messages"))
+        if inline:
+            self.save_qa_chat_store()
     
     def get_qa_chat_store(self):
         """Get the QA chat storage"""
@@ -176,23 +157,19 @@ class ReportQAChat:
             "id": room_id,
             "name": room_name,
             "created_at": datetime.now().isoformat(),
-            "creator": user_name,
-            "messages": []
-        }
-        
-        # Add welcome message
-        welcome_message = {
-            "id": str(uuid.uuid4()),
-            "user": "Report QA System",
-            "content": f"Welcome to the Report QA room: {room_name}. You can ask questions about your medical reports and I'll try to answer based on the analyses stored in the system.",
-            "timestamp": datetime.now().isoformat()
+            "creator": user_name
         }
-        room_data["messages"].append(welcome_message)
         
         # Store room
         self.qa_chat_store["rooms"][room_id] = room_data
         self.save_qa_chat_store()
         
+        # Add welcome message
+        self.message_store.add(
+            room_id, "Report QA System",
+            f"Welcome to the Report QA room: {room_name}. You can ask questions about your medical reports and I'll try to answer based on the analyses stored in the system."
+        )
+        
         return room_id
     
     def add_message(self, room_id, user_name, message):
@@ -200,25 +177,21 @@ class ReportQAChat:
         if room_id not in self.qa_chat_store["rooms"]:
             return None
         
-        message_data = {
-            "id": str(uuid.uuid4()),
-            "user": user_name,
-            "content": message,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        self.qa_chat_store["rooms"][room_id]["messages"].append(message_data)
-        self.save_qa_chat_store()
+        return self.message_store.add(room_id, user_name, message)
+    
+    def get_messages(self, room_id, after_cursor=None, limit=50):
+        """Messages after a cursor, oldest first; without a cursor, the most recent `limit`"""
+        if room_id not in self.qa_chat_store["rooms"]:
+            return []
         
-        return message_data
+        return self.message_store.get_messages(room_id, after_cursor, limit)
     
-    def get_messages(self, room_id, limit=50):
-        """Get the most recent messages from a QA room"""
+    def get_messages_before(self, room_id, cursor=None, limit=50):
+        """The `limit` messages before a cursor, oldest first (for loading older history)"""
         if room_id not in self.qa_chat_store["rooms"]:
             return []
         
-        messages = self.qa_chat_store["rooms"][room_id]["messages"]
-        return messages[-limit:] if len(messages) > limit else messages
+        return self.message_store.get_messages_before(room_id, cursor, limit)
     
     def get_qa_rooms(self):
         """Get all QA rooms"""
@@ -241,5 +214,6 @@ class ReportQAChat:
         if room_id in self.qa_chat_store["rooms"]:
             del self.qa_chat_store["rooms"][room_id]
             self.save_qa_chat_store()
+            self.message_store.delete_room(room_id)
             return True
         return False
\ No newline at end of file
@@ -0,0 +1,257 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from archive_store import get_archive_store
+from blob_store import get_blob_store
+from utils_simple import (
+    analysis_store_lock,
+    get_analysis_store,
+    write_analysis_store,
+    get_latest_analyses,
+    get_statistics,
+    get_analysis_search
+)
+from chat_system import chat_store_lock, get_chat_store, save_chat_store
+from message_store import get_message_store
+from answer_cache import get_answer_cache
+from analysis_changes import get_analysis_changes
+
+# Retention: keep recent records hot, compact older ones into archive segments
+def store_sizes():
+    """On-disk size of the hot stores and the archive"""
+    archive = get_archive_store().stats()
+    return {
+        "analysis_store_bytes": os.path.getsize("analysis_store.json") if os.path.exists("analysis_store.json") else 0,
+        "chat_store_bytes": os.path.getsize("chat_store.json") if os.path.exists("chat_store.json") else 0,
+        "archive_bytes": sum(kind["bytes"] for kind in archive.values()),
+        "archived_analyses": archive.get("analyses", {}).get("records", 0),
+        "archived_rooms": archive.get("rooms", {}).get("records", 0),
+    }
+
+def time_latest_analyses(repeat=5, limit=10):
+    """Median seconds for one get_latest_analyses call"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        get_latest_analyses(limit=limit)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+class RetentionManager:
+    """Moves analyses older than `hot_days` and closed chat rooms into the archive
+
+    Archiving writes the segments first, without holding the store locks,
+    then briefly takes the lock to publish them and drop the archived
+    records from the hot store, so saves and messages are never held up by
+    compression. Records edited in between stay hot, and a record is never
+    archived twice, even after an interrupted pass. With
+    `purge_days` set, archived analyses older than that are deleted
+    outright, along with their statistics, search entries, cached answers
+    and image references, and logged as deleted for the QA index.
+    """
+
+    def __init__(self, hot_days=None, purge_days=None, interval=None, archive=None, background=None):
+        self.hot_days = int(hot_days if hot_days is not None else os.environ.get("RETENTION_HOT_DAYS", 90))
+        self.purge_days = int(purge_days if purge_days is not None else os.environ.get("RETENTION_PURGE_DAYS", 0))
+        self.interval = int(interval if interval is not None else os.environ.get("RETENTION_INTERVAL", 6 * 3600))
+        # Periodic compaction in the app server is opt-in (RETENTION_BACKGROUND=1)
+        self.background = bool(int(background if background is not None else os.environ.get("RETENTION_BACKGROUND", 0)))
+        self.archive = archive or get_archive_store()
+        self.last_run = None
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def archive_analyses(self, now=None):
+        """Archive analyses dated before the hot window; returns the number moved"""
+        cutoff = ((now or datetime.now()) - timedelta(days=self.hot_days)).isoformat()
+        # Undated analyses stay hot; they can't be placed in a segment's range
+        candidates = [analysis for analysis in get_analysis_store()["analyses"]
+                      if analysis.get("date") and analysis["date"] < cutoff]
+        if not candidates:
+            return 0
+
+        # Copies archived by an earlier pass that stopped before dropping them from the hot store
+        copies = self.archive.find_many("analyses", [analysis["id"] for analysis in candidates],
+                                        min(analysis["date"] for analysis in candidates), cutoff)
+        by_month = defaultdict(list)
+        for analysis in candidates:
+            if analysis["id"] not in copies:
+                by_month[analysis["date"][:7]].append(analysis)
+        written = [(records, self.archive.write_segment("analyses", records, date_key="date", publish=False))
+                   for _, records in sorted(by_month.items())]
+
+        with analysis_store_lock:
+            store = get_analysis_store()
+            current = {analysis["id"]: analysis for analysis in store["analyses"]}
+            for records, entry in written:
+                unchanged = [record for record in records if current.get(record["id"]) == record]
+                if entry and len(unchanged) < len(records):
+                    # Edited while the segment was written (e.g. an artifact attached): those
+                    # stay hot with their changes and are archived by a later pass
+                    self.archive.discard_segment(entry)
+                    entry = self.archive.write_segment("analyses", unchanged, date_key="date", publish=False)
+                if entry:
+                    self.archive.publish_segment(entry)
+                copies.update((record["id"], record) for record in unchanged)
+            # Only drop records identical to their archived copy
+            archived = {analysis_id for analysis_id, copy in copies.items() if current.get(analysis_id) == copy}
+            store["analyses"] = [analysis for analysis in store["analyses"] if analysis["id"] not in archived]
+            write_analysis_store(store)
+        return len(archived)
+
+    def _room_record(self, room):
+        # Archived rooms carry their messages and memory, so they can be shown without the message store
+        message_store = get_message_store()
+        return dict(room, messages=message_store.room_messages(room["id"]), memory=message_store.get_memory(room["id"]))
+
+    def archive_rooms(self, now=None):
+        """Archive rooms closed before the hot window; returns the number moved
+
+        Rooms with a reply still streaming into a "pending" message stay hot
+        until it has been delivered.
+        """
+        cutoff = ((now or datetime.now()) - timedelta(days=self.hot_days)).isoformat()
+        with chat_store_lock:
+            closed = [self._room_record(room) for room in get_chat_store()["rooms"].values()
+                      if room.get("closed_at") and room["closed_at"] < cutoff]
+        closed = [room for room in closed if not any(message["type"] == "pending" for message in room["messages"])]
+        if not closed:
+            return 0
+
+        # Copies archived by an earlier pass that stopped before dropping them from the hot store
+        copies = self.archive.find_many("rooms", [room["id"] for room in closed],
+                                        min(room["closed_at"] for room in closed), cutoff)
+        records = [room for room in closed if room["id"] not in copies]
+        entry = self.archive.write_segment("rooms", records, date_key="closed_at", publish=False)
+
+        message_store = get_message_store()
+        with chat_store_lock:
+            store = get_chat_store()
+            current = {room["id"]: self._room_record(room) for room in closed if room["id"] in store["rooms"]}
+            unchanged = [room for room in records if current.get(room["id"]) == room]
+            if entry and len(unchanged) < len(records):
+                # Changed since the snapshot (e.g. memory compacted after the last reply): archived by a later pass
+                self.archive.discard_segment(entry)
+                entry = self.archive.write_segment("rooms", unchanged, date_key="closed_at", publish=False)
+            if entry:
+                self.archive.publish_segment(entry)
+            copies.update((room["id"], room) for room in unchanged)
+            # Only drop rooms identical to their archived copy
+            archived = [room_id for room_id, copy in copies.items() if current.get(room_id) == copy]
+            for room_id in archived:
+                store["rooms"].pop(room_id, None)
+                message_store.delete_room(room_id)
+            save_chat_store(store)
+        return len(archived)
+
+    def purge(self, now=None):
+        """Delete archived analyses past the purge age; returns the number removed"""
+        if not self.purge_days:
+            return 0
+        cutoff = ((now or datetime.now()) - timedelta(days=max(self.purge_days, self.hot_days))).isoformat()
+        stats, index, blob_store = get_statistics(), get_analysis_search(), get_blob_store()
+        answers, changes = get_answer_cache(), get_analysis_changes()
+        removed = 0
+        hot_ids = {analysis["id"] for analysis in get_analysis_store()["analyses"]}
+        for entry in self.archive.segments("analyses"):
+            # Whole segments only, so archive files stay immutable
+            if entry["last"] >= cutoff:
+                continue
+            for analysis in self.archive.read_segment(entry):
+                # A stale copy of a record that is hot again; the hot record keeps its references
+                if analysis["id"] in hot_ids:
+                    continue
+                stats.remove(analysis)
+                index.remove_analysis(analysis["id"])
+                answers.invalidate_analysis(analysis["id"])
+                changes.record(analysis["id"], "delete")
+                hashes = [analysis.get("image_hash"), analysis.get("pixels_hash"),
+                          *analysis.get("artifacts", {}).values()]
+                blob_store.decref(*[blob_hash for blob_hash in hashes if blob_hash])
+                removed += 1
+            self.archive.remove_segment(entry)
+        return removed
+
+    def run(self, now=None):
+        """One compaction pass; returns a summary with sizes and read latency before and after"""
+        with self._run_lock:
+            start = time.perf_counter()
+            before = dict(store_sizes(), latest_analyses_ms=time_latest_analyses() * 1000)
+            summary = {
+                "archived_analyses": self.archive_analyses(now),
+                "archived_rooms": self.archive_rooms(now),
+                "purged_analyses": self.purge(now),
+            }
+            after = dict(store_sizes(), latest_analyses_ms=time_latest_analyses() * 1000)
+            self.last_run = dict(summary, before=before, after=after, seconds=time.perf_counter() - start,
+                                 finished_at=datetime.now().isoformat())
+            return self.last_run
+
+    # Background compaction
+    def running(self):
+        return self._run_lock.locked()
+
+    def run_async(self):
+        """Start one pass in a background thread; returns False if one is already running"""
+        if self.running():
+            return False
+        threading.Thread(target=self.run, daemon=True).start()
+        return True
+
+    def start(self):
+        """Run a pass every `interval` seconds in a daemon thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run()
+            except Exception as e:
+                print(f"Retention pass failed: {e}")
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+_default_manager = None
+_default_lock = threading.Lock()
+
+def get_retention_manager():
+    """Get the shared retention manager"""
+    global _default_manager
+    with _default_lock:
+        if _default_manager is None:
+            _default_manager = RetentionManager()
+        return _default_manager
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archive old analyses and closed chat rooms")
+    parser.add_argument("command", choices=["compact", "status"])
+    parser.add_argument("--hot-days", type=int, help="Days of analyses kept in analysis_store.json")
+    parser.add_argument("--purge-days", type=int, help="Delete archived analyses older than this (0 keeps them)")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        summary = RetentionManager(hot_days=args.hot_days, purge_days=args.purge_days).run()
+        print(f"Archived {summary['archived_analyses']} analyses and {summary['archived_rooms']} rooms, "
+              f"purged {summary['purged_analyses']} in {summary['seconds']:.1f}s")
+        for label in ("before", "after"):
+            sizes = summary[label]
+            print(f"  {label:6s} analysis_store.json {sizes['analysis_store_bytes'] / 1e6:8.2f} MB, "
+                  f"archive {sizes['archive_bytes'] / 1e6:8.2f} MB, "
+                  f"get_latest_analyses {sizes['latest_analyses_ms']:.1f} ms")
+    else:
+        for key, value in store_sizes().items():
+            print(f"{key}: {value}")
+        print(get_archive_store().stats())
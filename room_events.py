@@ -0,0 +1,135 @@
+import json
+import os
+import queue
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+# Pub/sub channel for room events (message added or updated, participant joined, AI reply ready)
+class Subscription:
+    """Events for one room, queued until the subscriber drains them"""
+
+    def __init__(self, bus, room):
+        self.bus = bus
+        self.room = room
+        self._queue = queue.SimpleQueue()
+
+    def _put(self, event):
+        self._queue.put(event)
+
+    def wait(self, timeout=None):
+        """Block until at least one event arrives (or the timeout passes); returns every queued event"""
+        try:
+            events = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        return events + self.drain()
+
+    def drain(self):
+        """Every queued event without blocking"""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class LocalEventBus:
+    """In-process fan-out of room events to every subscriber of the room
+
+    Subscriptions are held weakly, so one dropped with its Streamlit session
+    stops receiving events without an explicit unsubscribe.
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(weakref.WeakSet)
+        self._lock = threading.Lock()
+
+    def subscribe(self, room):
+        subscription = Subscription(self, room)
+        with self._lock:
+            self._subscriptions[room].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.room].discard(subscription)
+
+    def subscriber_count(self, room):
+        with self._lock:
+            return len(self._subscriptions.get(room, ()))
+
+    def publish(self, room, event_type, **data):
+        """Send an event to the room's subscribers; returns the event"""
+        event = dict(data, type=event_type, room=room, at=time.time())
+        self._dispatch(room, event)
+        return event
+
+    def _dispatch(self, room, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(room, ()))
+        for subscription in subscriptions:
+            subscription._put(event)
+
+    def close(self):
+        pass
+
+
+class RedisEventBus(LocalEventBus):
+    """Room events relayed through a Redis-compatible broker, for several app nodes
+
+    Each node keeps one pattern subscription to the broker and fans events
+    out to its own local subscribers, so the broker sees one connection per
+    node rather than one per open browser tab.
+
+    Events carry message cursors, not message bodies: subscribers read the
+    messages from the message store. Every node must therefore share one
+    message store and chat store (the same data directory, or the same
+    MESSAGE_STORE_PATH) when this bus is selected; a per-node store would
+    hand out cursors the other nodes can't resolve. Needs the optional
+    `redis` package.
+    """
+
+    def __init__(self, url, prefix="room-events:"):
+        super().__init__()
+        import redis
+
+        self.prefix = prefix
+        self.redis = redis.Redis.from_url(url)
+        self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(**{f"{prefix}*": self._on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=0.01, daemon=True)
+
+    def publish(self, room, event_type, **data):
+        event = dict(data, type=event_type, room=room, at=time.time())
+        self.redis.publish(f"{self.prefix}{room}", json.dumps(event))
+        return event
+
+    def _on_message(self, message):
+        channel = message["channel"].decode() if isinstance(message["channel"], bytes) else message["channel"]
+        self._dispatch(channel[len(self.prefix):], json.loads(message["data"]))
+
+    def close(self):
+        self._thread.stop()
+        self._pubsub.close()
+
+
+_default_bus = None
+_default_lock = threading.Lock()
+
+def get_event_bus():
+    """Get the shared event bus: Redis when ROOM_EVENTS_REDIS_URL is set, otherwise in-process
+
+    The Redis bus is for app nodes sharing one message store (see RedisEventBus).
+    """
+    global _default_bus
+    with _default_lock:
+        if _default_bus is None:
+            url = os.environ.get("ROOM_EVENTS_REDIS_URL")
+            _default_bus = RedisEventBus(url) if url else LocalEventBus()
+        return _default_bus
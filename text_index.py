@@ -0,0 +1,279 @@
+import json
+import math
+import re
+import sqlite3
+import threading
+import zlib
+from collections import defaultdict
+import numpy as np
+
+# Shared tokenizer and compressed, segmented inverted index (SQLite-backed)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "were", "with", "we", "our",
+}
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords or single characters"""
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower())
+            if len(token) > 1 and token not in STOPWORDS]
+
+def encode_postings(doc_ids, weights):
+    """Compress a postings list: delta-encoded sorted ids plus uint16 weights"""
+    order = np.argsort(doc_ids, kind="stable")
+    ids = np.asarray(doc_ids, dtype=np.int64)[order]
+    deltas = np.diff(ids, prepend=0).astype(np.uint32)
+    weights = np.minimum(np.asarray(weights, dtype=np.float64)[order] * 16, 65535).astype(np.uint16)
+    header = np.array([len(ids)], dtype=np.uint32).tobytes()
+    return zlib.compress(header + deltas.tobytes() + weights.tobytes(), 6)
+
+def decode_postings(blob):
+    """Decode a postings blob into (doc_ids, weights) arrays"""
+    raw = zlib.decompress(blob)
+    count = int(np.frombuffer(raw[:4], dtype=np.uint32)[0])
+    deltas = np.frombuffer(raw[4:4 + 4 * count], dtype=np.uint32)
+    weights = np.frombuffer(raw[4 + 4 * count:], dtype=np.uint16)
+    return np.cumsum(deltas, dtype=np.int64), weights.astype(np.float32) / 16
+
+def pack_payload(payload):
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode(), 6)
+
+def unpack_payload(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+class SegmentedIndex:
+    """Compressed inverted index stored in SQLite as immutable segments
+
+    Postings are buffered in memory and flushed every `batch_docs` documents
+    as a new segment, so building from a large dump uses bounded memory.
+    Re-adding a document supersedes its older postings; optimize() merges
+    segments and drops superseded or deleted entries. Subclasses declare
+    extra filterable document columns and per-field weights.
+    """
+
+    doc_columns = {}
+    field_weights = {}
+    k1 = 1.2
+
+    def __init__(self, path, batch_docs=20000):
+        self.path = path
+        self.batch_docs = batch_docs
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        extra = "".join(f", {name} {kind}" for name, kind in self.doc_columns.items())
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS docs (doc_id INTEGER PRIMARY KEY, segment INTEGER, payload BLOB{extra});
+            CREATE TABLE IF NOT EXISTS postings (term TEXT, segment INTEGER, data BLOB, PRIMARY KEY (term, segment));
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE INDEX IF NOT EXISTS postings_segment ON postings (segment);
+            CREATE INDEX IF NOT EXISTS docs_segment ON docs (segment);
+        """)
+        for name in self.doc_columns:
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS docs_{name} ON docs ({name})")
+        self.conn.commit()
+        self._segment = self._next_segment()
+        self._buffer = defaultdict(dict)
+        self._buffered_docs = 0
+        # Live document count, kept current on add/delete instead of COUNT(*) per flush
+        self._doc_total = self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def _next_segment(self):
+        row = self.conn.execute("SELECT MAX(segment) FROM postings").fetchone()
+        return (row[0] or 0) + 1
+
+    def add(self, doc_id, fields, payload, **columns):
+        """Index a document; fields maps field name to text"""
+        weights = defaultdict(float)
+        for field, text in fields.items():
+            field_weight = self.field_weights.get(field, 1.0)
+            for token in tokenize(text):
+                weights[token] += field_weight
+
+        with self._lock:
+            for token, weight in weights.items():
+                self._buffer[token][doc_id] = weight
+            if self.conn.execute("SELECT 1 FROM docs WHERE doc_id = ?", (doc_id,)).fetchone() is None:
+                self._doc_total += 1
+            names = ["doc_id", "segment", "payload", *columns]
+            placeholders = ", ".join("?" for _ in names)
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO docs ({', '.join(names)}) VALUES ({placeholders})",
+                (doc_id, self._segment, pack_payload(payload), *columns.values())
+            )
+            self._buffered_docs += 1
+            if self._buffered_docs >= self.batch_docs:
+                self.flush()
+
+    def delete(self, doc_id):
+        """Remove a document; its stale postings are skipped and later compacted"""
+        with self._lock:
+            self._doc_total -= self.conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,)).rowcount
+            for postings in self._buffer.values():
+                postings.pop(doc_id, None)
+
+    def flush(self):
+        """Write buffered postings as a new immutable segment"""
+        with self._lock:
+            if self._buffer:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO postings (term, segment, data) VALUES (?, ?, ?)",
+                    ((term, self._segment, encode_postings(list(docs), list(docs.values())))
+                     for term, docs in self._buffer.items() if docs)
+                )
+                self._segment += 1
+            self._buffer = defaultdict(dict)
+            self._buffered_docs = 0
+            self.conn.commit()
+
+    def doc_count(self):
+        return self._doc_total
+
+    def _term_postings(self, term):
+        """All postings for a term as (doc_ids, weights, segments); newer segments win"""
+        rows = self.conn.execute(
+            "SELECT segment, data FROM postings WHERE term = ? ORDER BY segment DESC", (term,)
+        ).fetchall()
+        if not rows:
+            return None, None, None
+        decoded = [decode_postings(row[1]) for row in rows]
+        ids = np.concatenate([d[0] for d in decoded])
+        weights = np.concatenate([d[1] for d in decoded])
+        segments = np.repeat(np.array([row[0] for row in rows], dtype=np.int64), [len(d[0]) for d in decoded])
+        if len(decoded) > 1:
+            # np.unique keeps the first occurrence, i.e. the newest segment
+            ids, first = np.unique(ids, return_index=True)
+            weights = weights[first]
+            segments = segments[first]
+        return ids, weights, segments
+
+    def score(self, query, ranked=True):
+        """Score every document matching any query term
+
+        Returns (doc_ids, scores, segments) by descending score (by doc id
+        if not `ranked`), where segments is the newest segment any matching
+        posting came from.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        empty = (np.array([], dtype=np.int64), np.array([], dtype=np.float32), np.array([], dtype=np.int64))
+        if not terms:
+            return empty
+
+        total = max(self.doc_count(), 1)
+        postings = []
+        with self._lock:
+            for term in terms:
+                ids, weights, segments = self._term_postings(term)
+                if ids is not None:
+                    idf = math.log(1 + (total - len(ids) + 0.5) / (len(ids) + 0.5))
+                    postings.append((ids, idf * weights * (self.k1 + 1) / (weights + self.k1), segments))
+        if not postings:
+            return empty
+
+        # Accumulate per term (ids are unique within a term). Dense ids index
+        # the accumulators directly; sparse ids are mapped through a sort.
+        max_id = max(int(ids[-1]) for ids, _, _ in postings)
+        matched = sum(len(ids) for ids, _, _ in postings)
+        if max_id < 32 * matched + 1024:
+            universe = None
+            size = max_id + 1
+        else:
+            universe = np.unique(np.concatenate([ids for ids, _, _ in postings]))
+            size = len(universe)
+        scores = np.zeros(size, dtype=np.float64)
+        hits = np.zeros(size, dtype=np.float32)
+        newest = np.zeros(size, dtype=np.int64)
+        for ids, term_scores, segments in postings:
+            positions = ids if universe is None else np.searchsorted(universe, ids)
+            scores[positions] += term_scores
+            hits[positions] += 1
+            newest[positions] = np.maximum(newest[positions], segments)
+
+        found = np.flatnonzero(hits)
+        ids = found if universe is None else universe[found]
+        scores, hits, newest = scores[found], hits[found], newest[found]
+        # Favour documents matching more of the query terms
+        scores *= (hits / len(terms)) ** 2
+        if not ranked:
+            return ids, scores, newest
+        order = np.argsort(-scores, kind="stable")
+        return ids[order], scores[order], newest[order]
+
+    def search(self, query, limit=10, offset=0, where=None, params=()):
+        """Ranked (doc_id, score, payload) results, optionally filtered by doc columns"""
+        ids, scores, newest = self.score(query)
+        results = []
+        needed = offset + limit
+        clause = f" AND ({where})" if where else ""
+        batch = max(needed * 4, 64)
+        with self._lock:
+            for start in range(0, len(ids), batch):
+                chunk = [int(doc_id) for doc_id in ids[start:start + batch]]
+                placeholders = ", ".join("?" for _ in chunk)
+                rows = self.conn.execute(
+                    f"SELECT doc_id, segment, payload FROM docs WHERE doc_id IN ({placeholders}){clause}",
+                    (*chunk, *params)
+                ).fetchall()
+                found = {row[0]: (row[1], row[2]) for row in rows}
+                for doc_id, score, segment in zip(chunk, scores[start:start + batch], newest[start:start + batch]):
+                    # Skip documents re-added since, whose only matches are superseded postings
+                    if doc_id in found and found[doc_id][0] <= segment:
+                        results.append((doc_id, float(score), unpack_payload(found[doc_id][1])))
+                if len(results) >= needed:
+                    break
+        return results[offset:needed]
+
+    def merge_segments(self, after=0):
+        """Merge every segment newer than `after` into one, dropping deleted and superseded postings
+
+        Returns the merged segment id. Merging only the recent tail keeps
+        small incremental segments cheap to fold in.
+        """
+        with self._lock:
+            self.flush()
+            live = dict(self.conn.execute("SELECT doc_id, segment FROM docs WHERE segment > ?", (after,)))
+            terms = [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT term FROM postings WHERE segment > ?", (after,)
+            )]
+            merged_segment = self._segment
+            for term in terms:
+                rows = self.conn.execute(
+                    "SELECT segment, data FROM postings WHERE term = ? AND segment > ?", (term, after)
+                ).fetchall()
+                keep_ids, keep_weights = [], []
+                for segment, data in rows:
+                    ids, weights = decode_postings(data)
+                    for doc_id, weight in zip(ids.tolist(), weights.tolist()):
+                        if live.get(doc_id) == segment:
+                            keep_ids.append(doc_id)
+                            keep_weights.append(weight)
+                self.conn.execute("DELETE FROM postings WHERE term = ? AND segment > ?", (term, after))
+                if keep_ids:
+                    self.conn.execute("INSERT INTO postings VALUES (?, ?, ?)",
+                                      (term, merged_segment, encode_postings(keep_ids, keep_weights)))
+            self.conn.execute("UPDATE docs SET segment = ? WHERE segment > ?", (merged_segment, after))
+            self._segment = merged_segment + 1
+            self.conn.commit()
+            return merged_segment
+
+    def optimize(self):
+        """Merge all segments per term, dropping deleted and superseded postings"""
+        with self._lock:
+            self.merge_segments(0)
+            self.conn.execute("VACUUM")
+
+    def stats(self):
+        """Document, term and segment counts"""
+        with self._lock:
+            terms, segments = self.conn.execute(
+                "SELECT COUNT(DISTINCT term), COUNT(DISTINCT segment) FROM postings"
+            ).fetchone()
+        return {"documents": self.doc_count(), "terms": terms, "segments": segments}
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self.conn.close()
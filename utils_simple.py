@@ -5,17 +5,31 @@ from PIL import Image
 import pydicom
 import nibabel as nib
 import io, base64, uuid, os
+import functools
+import heapq
+import threading
+import time
 import json
 import openai
-from Bio import Entrez
 from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RPImage
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from datetime import datetime
-
-# Set Entrez email for NCBI API
-Entrez.email = "your_email@example.com"
+from heatmap_engine import default_engine
+from blob_store import get_blob_store
+from processed_image import ProcessedImage
+from literature_cache import get_literature_cache
+from entrez_client import get_entrez_client
+from literature_index import get_literature_index
+from clinical_trials import get_trial_index, OPEN_STATUSES
+from analysis_stats import get_analysis_stats
+from analysis_columns import get_analysis_columns
+from analysis_search import get_analysis_index
+from archive_store import get_archive_store
+from answer_cache import get_answer_cache
+from analysis_changes import get_analysis_changes
 
 # File processing functions
 def process_file(uploaded_file):
@@ -23,13 +37,13 @@ def process_file(uploaded_file):
     ext = uploaded_file.name.split('.')[-1].lower()
     if ext in ['jpg', 'jpeg', 'png']:
         image = Image.open(uploaded_file).convert('RGB')
-        return {"type": "image", "data": image, "array": np.array(image)}
+        return ProcessedImage.from_pil("image", image)
     elif ext == 'dcm':
         dicom = pydicom.dcmread(uploaded_file)
         img_array = dicom.pixel_array
         img_array = ((img_array - img_array.min()) /
                      (img_array.max() - img_array.min()) * 255).astype(np.uint8)
-        return {"type": "dicom", "data": Image.fromarray(img_array), "array": img_array}
+        return ProcessedImage.from_array("dicom", img_array)
     elif ext in ['nii', 'nii.gz']:
         temp_path = f"temp_{uuid.uuid4()}.nii.gz"
         with open(temp_path, 'wb') as f:
@@ -39,27 +53,30 @@ def process_file(uploaded_file):
         img_array = ((img_array - img_array.min()) /
                      (img_array.max() - img_array.min()) * 255).astype(np.uint8)
         os.remove(temp_path)
-        return {"type": "nifti", "data": Image.fromarray(img_array), "array": img_array}
+        return ProcessedImage.from_array("nifti", img_array)
+
+def persist_image(file_bytes, processed_image):
+    """Store the original upload and its pixel buffer in the blob store"""
+    blob_store = get_blob_store()
+    processed_image.image_hash = blob_store.put(file_bytes)
+    processed_image.pixels_hash = blob_store.put_array(processed_image.buffer)
+    return {
+        "image_hash": processed_image.image_hash,
+        "pixels_hash": processed_image.pixels_hash
+    }
+
+def load_processed_image(image_type, pixels_hash, image_hash=None):
+    """Open a stored image lazily (memory-mapped, read-only)"""
+    return ProcessedImage.from_blob(image_type, pixels_hash, image_hash=image_hash)
 
-def generate_heatmap(image_array):
+def generate_heatmap(image_array, colormap="jet", alpha=0.5):
     """Generate a heatmap overlay for XAI visualization"""
-    # Convert to grayscale if RGB
-    if len(image_array.shape) == 3:
-        gray_image = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-    else:
-        gray_image = image_array
-        
-    # Apply colormap to create heatmap
-    heatmap = cv2.applyColorMap(gray_image, cv2.COLORMAP_JET)
-    
-    # If original is grayscale, convert to RGB for overlay
-    if len(image_array.shape) == 2:
-        image_array = cv2.cvtColor(image_array, cv2.COLOR_GRAY2RGB)
-        
-    # Create overlay with weighted blend
-    overlay = cv2.addWeighted(heatmap, 0.5, image_array, 0.5, 0)
-    
-    return Image.fromarray(overlay), Image.fromarray(heatmap)
+    # Colour through the shared engine's precomputed LUT (cached by image hash)
+    return default_engine.render_images(image_array, colormap=colormap, alpha=alpha)
+
+def generate_heatmap_bytes(image_array, colormap="jet", alpha=0.5, format="png"):
+    """Generate compressed (overlay, heatmap) image bytes for display or embedding"""
+    return default_engine.render_encoded(image_array, colormap=colormap, alpha=alpha, format=format)
 
 
 
@@ -106,9 +123,16 @@ def extract_findings_and_keywords(analysis_text):
     
     return findings, keywords[:5]  
 
+@functools.lru_cache(maxsize=8)
+def get_openai_client(api_key):
+    """Get a shared OpenAI client for an API key (connections are reused)"""
+    return openai.OpenAI(api_key=api_key)
+
 def analyze_image(image, api_key, enable_xai=True):
     """Analyze medical image using OpenAI's vision model"""
-    # Prepare image for API
+    # Prepare image for API (compact images carry an opaque alpha channel)
+    if image.mode == "RGBA":
+        image = image.convert("RGB")
     buffered = io.BytesIO()
     image.save(buffered, format="PNG")
     encoded_image = base64.b64encode(buffered.getvalue()).decode()
@@ -116,7 +140,7 @@ def analyze_image(image, api_key, enable_xai=True):
     #client = openai.OpenAI(api_key=api_key)    #13/04 @8:36pm
     # Set the API key as an environment variable
     os.environ["OPENAI_API_KEY"] = api_key      #13/04 @11:03pm
-    client = openai.Client()                    #13/04 @11:03pm
+    client = get_openai_client(api_key)
     #client = openai.Client(api_key=api_key)    #13/04 @11:03pm
 
     
@@ -132,6 +156,7 @@ def analyze_image(image, api_key, enable_xai=True):
     """
     
     # Make API call
+    start = time.perf_counter()
     try:
         response = client.chat.completions.create(
             model="gpt-4o",
@@ -156,7 +181,8 @@ def analyze_image(image, api_key, enable_xai=True):
             "analysis": analysis,
             "findings": findings,
             "keywords": keywords,
-            "date": datetime.now().isoformat()
+            "date": datetime.now().isoformat(),
+            "latency": round(time.perf_counter() - start, 3)
         }
     except Exception as e:
         return {
@@ -164,74 +190,194 @@ def analyze_image(image, api_key, enable_xai=True):
             "analysis": f"Error analyzing image: {str(e)}",
             "findings": [],
             "keywords": [],
-            "date": datetime.now().isoformat()
+            "date": datetime.now().isoformat(),
+            "error": str(e)
         }
 
-def search_pubmed(keywords, max_results=5):
-    """Search PubMed for relevant articles based on keywords"""
+def fetch_pubmed(keywords, max_results=5):
+    """Query PubMed directly (esearch + efetch); raises on network errors"""
+    query = ' AND '.join(keywords)
+    return get_entrez_client().search(query, retmax=max_results)
+
+# Seconds to skip live Entrez after a failure when the local index can answer
+LIVE_LITERATURE_COOLDOWN = int(os.environ.get("LITERATURE_LIVE_COOLDOWN", 300))
+_live_literature_retry_at = 0.0
+
+def merge_publications(primary, secondary, max_results):
+    """Merge two result lists, keeping order and dropping duplicate PMIDs"""
+    merged = {}
+    for pub in list(primary) + list(secondary):
+        merged.setdefault(pub["id"], pub)
+    return list(merged.values())[:max_results]
+
+class LiteratureUnavailable(Exception):
+    """Raised when neither PubMed nor the local index could answer a lookup"""
+
+def placeholder_publications(keywords, max_results=5):
+    """Stand-in references for a failed lookup, marked so no cache keeps them"""
+    return [{"id": f"PMD{1000+i}", 
+            "title": f"Study on {' '.join(keywords)}", 
+            "journal": "Medical Journal", 
+            "year": "2024",
+            "fallback": True} for i in range(min(3, max_results))]
+
+def search_pubmed(keywords, max_results=5, placeholders=True):
+    """Search PubMed for relevant articles based on keywords
+
+    When no source can answer, returns placeholder_publications(), or with
+    `placeholders` False raises LiteratureUnavailable so the caller can tell.
+    """
+    global _live_literature_retry_at
     if not keywords:
         return []
-        
-    query = ' AND '.join(keywords)
+    
+    # Local offline index (built with literature_index.py), if present
+    source = os.environ.get("LITERATURE_SOURCE", "auto")
+    local_index = get_literature_index() if source != "live" else None
+    local_results = local_index.search_publications(keywords, max_results=max_results) if local_index else []
+    if source == "local" or (local_results and time.time() < _live_literature_retry_at):
+        return local_results
+    
+    # Served from the persistent literature cache when the same keyword set
+    # was looked up recently; concurrent identical lookups share one request
+    cache = get_literature_cache()
+    key = cache.make_key(keywords, max_results)
     try:
-        handle = Entrez.esearch(db="pubmed", term=query, retmax=max_results)
-        results = Entrez.read(handle)
-        
-        if not results["IdList"]:
-            return []
-            
-        # Fetch details for those IDs
-        fetch_handle = Entrez.efetch(db="pubmed", id=results["IdList"], rettype="medline", retmode="text")
-        records = fetch_handle.read().split('\n\n')
-        
-        publications = []
-        for record in records:
-            if not record.strip():
-                continue
-                
-            pub_data = {"id": "", "title": "", "journal": "", "year": ""}
-            
-            # Extract relevant fields
-            for line in record.split('\n'):
-                if line.startswith('PMID- '):
-                    pub_data["id"] = line[6:].strip()
-                elif line.startswith('TI  - '):
-                    pub_data["title"] = line[6:].strip()
-                elif line.startswith('TA  - '):
-                    pub_data["journal"] = line[6:].strip()
-                elif line.startswith('DP  - '):
-                    year_match = line[6:].strip().split()[0]
-                    pub_data["year"] = year_match if year_match.isdigit() else "2024"
-            
-            if pub_data["id"]:
-                publications.append(pub_data)
-        
-        return publications
+        live_results = cache.get_or_fetch(key, lambda: fetch_pubmed(keywords, max_results))
+        return merge_publications(live_results, local_results, max_results)
     except Exception as e:
         print(f"Error searching PubMed: {e}")
-        # Return fallback data
-        return [{"id": f"PMD{1000+i}", 
-                "title": f"Study on {' '.join(keywords)}", 
-                "journal": "Medical Journal", 
-                "year": "2024"} for i in range(min(3, max_results))]
+        if local_index:
+            _live_literature_retry_at = time.time() + LIVE_LITERATURE_COOLDOWN
+        if local_results:
+            return local_results
+        if not placeholders:
+            raise LiteratureUnavailable(str(e)) from e
+        return placeholder_publications(keywords, max_results)
+
+def search_pubmed_many(keyword_sets, max_results=5):
+    """Search PubMed for many keyword sets at once (e.g. bulk report generation)
+
+    Fetched results land in the literature cache, where search_pubmed finds them.
+    """
+    if os.environ.get("LITERATURE_SOURCE", "auto") == "local":
+        return {tuple(keywords): search_pubmed(list(keywords), max_results=max_results) for keywords in keyword_sets}
+    cache = get_literature_cache()
+    results = {}
+    missing = {}
+    for keywords in keyword_sets:
+        keywords = tuple(keywords)
+        if not keywords:
+            results[keywords] = []
+            continue
+        cached = cache.get(cache.make_key(keywords, max_results))
+        if cached is not None:
+            results[keywords] = cached
+        else:
+            missing[' AND '.join(keywords)] = keywords
+    
+    # One batched history-server session for everything not cached
+    if missing:
+        try:
+            fetched = get_entrez_client().search_many(list(missing), retmax=max_results)
+            for query, keywords in missing.items():
+                results[keywords] = fetched[query]
+                cache.put(cache.make_key(keywords, max_results), fetched[query])
+        except Exception as e:
+            print(f"Error searching PubMed: {e}")
+            for keywords in missing.values():
+                results[keywords] = search_pubmed(list(keywords), max_results=max_results)
+    
+    return results
 
 def search_clinical_trials(keywords, max_results=3):
-    """Search for clinical trials (mock implementation)"""
+    """Search for clinical trials in the local ClinicalTrials.gov snapshot"""
     if not keywords:
         return []
-        
-    # This is a mock implementation; in a real system, you would
-    # connect to ClinicalTrials.gov API or another source
-    return [{"id": f"NCT{1000+idx}", 
-            "title": f"Clinical Trial on {' '.join(keywords[:2])}", 
-            "status": "Recruiting",
-            "phase": f"Phase {idx+1}"} 
-            for idx in range(max_results)]
+    
+    # Import a snapshot first with: python clinical_trials.py import <export>
+    trial_index = get_trial_index()
+    if trial_index is None:
+        print("No clinical trials index found; skipping trial search")
+        return []
+    
+    # Prefer trials that are still open, then fill with the rest
+    trials = trial_index.search_trials(keywords, status=OPEN_STATUSES, max_results=max_results)
+    if len(trials) < max_results:
+        seen = {trial["id"] for trial in trials}
+        for trial in trial_index.search_trials(keywords, max_results=max_results * 2):
+            if trial["id"] not in seen and len(trials) < max_results:
+                trials.append(trial)
+    return trials
 
-def generate_report(data, include_references=True):
-    """Generate a PDF report with analysis results"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
+# Report images: downscaled to print resolution and JPEG-encoded once per source blob
+REPORT_IMAGE_WIDTH = 3.1 * inch
+REPORT_IMAGE_DPI = int(os.environ.get("REPORT_IMAGE_DPI", 150))
+REPORT_IMAGE_QUALITY = int(os.environ.get("REPORT_IMAGE_QUALITY", 80))
+
+@functools.lru_cache(maxsize=64)
+def get_report_image(blob_hash, is_array=False):
+    """Print-resolution JPEG for a stored image; returns (bytes, width, height)"""
+    blob_store = get_blob_store()
+    max_px = int(REPORT_IMAGE_WIDTH / inch * REPORT_IMAGE_DPI)
+    variant = f"report-{max_px}px-q{REPORT_IMAGE_QUALITY}.jpg"
+    
+    derived_hash = blob_store.get_derived(blob_hash, variant)
+    if derived_hash:
+        data = blob_store.get(derived_hash)
+        with Image.open(io.BytesIO(data)) as image:
+            return data, image.width, image.height
+    
+    if is_array:
+        array = blob_store.load_array(blob_hash)
+        image = Image.fromarray(np.ascontiguousarray(array[..., :3] if array.ndim == 3 else array))
+    else:
+        image = Image.open(io.BytesIO(blob_store.get(blob_hash)))
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    image.thumbnail((max_px, max_px), Image.LANCZOS, reducing_gap=2.0)
+    
+    # JPEG is embedded in the PDF as-is (DCTDecode), so it is never re-compressed
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=REPORT_IMAGE_QUALITY, optimize=True)
+    data = output.getvalue()
+    blob_store.put_derived(blob_hash, variant, data)
+    return data, image.width, image.height
+
+def report_image_flowables(data):
+    """Side-by-side analyzed image and XAI overlay for a report, if stored"""
+    artifacts = data.get("artifacts") or {}
+    sources = []
+    if data.get("pixels_hash"):
+        sources.append(("Analyzed image", data["pixels_hash"], True))
+    overlay_hash = artifacts.get("heatmap_overlay") or artifacts.get("occlusion_overlay")
+    if overlay_hash:
+        sources.append(("XAI overlay", overlay_hash, False))
+    
+    images, captions = [], []
+    styles, _, _ = get_report_styles()
+    for caption, blob_hash, is_array in sources:
+        try:
+            jpeg, width, height = get_report_image(blob_hash, is_array)
+        except (FileNotFoundError, OSError, ValueError):
+            # Blob collected or unreadable; the report is still useful without it
+            continue
+        scale = REPORT_IMAGE_WIDTH / max(width, height)
+        images.append(RPImage(io.BytesIO(jpeg), width=width * scale, height=height * scale))
+        captions.append(Paragraph(caption, styles["Normal"]))
+    
+    if not images:
+        return []
+    table = Table([images, captions], colWidths=[REPORT_IMAGE_WIDTH + 6] * len(images))
+    table.setStyle(TableStyle([
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+    ]))
+    return [table, Spacer(1, 12)]
+
+@functools.lru_cache(maxsize=1)
+def get_report_styles():
+    """Build the report paragraph styles once per process"""
     styles = getSampleStyleSheet()
     
     # Custom styles
@@ -249,6 +395,17 @@ def generate_report(data, include_references=True):
         spaceAfter=8
     )
     
+    return styles, title_style, subtitle_style
+
+# Publications listed under "Relevant Medical Literature" in a report
+REPORT_REFERENCE_COUNT = 3
+
+def generate_report(data, include_references=True):
+    """Generate a PDF report with analysis results"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles, title_style, subtitle_style = get_report_styles()
+    
     # Build content
     content = []
     
@@ -261,8 +418,13 @@ def generate_report(data, include_references=True):
     content.append(Paragraph(f"Report ID: {data['id']}", styles["Normal"]))
     if 'filename' in data:
         content.append(Paragraph(f"Image: {data['filename']}", styles["Normal"]))
+    if data.get('image_hash'):
+        content.append(Paragraph(f"Image SHA-256: {data['image_hash']}", styles["Normal"]))
     content.append(Spacer(1, 12))
     
+    # Analyzed image and heatmap
+    content.extend(report_image_flowables(data))
+    
     # Analysis
     content.append(Paragraph("Analysis Results", subtitle_style))
     content.append(Paragraph(data['analysis'], styles["Normal"]))
@@ -284,7 +446,7 @@ def generate_report(data, include_references=True):
     # Add references if available and requested
     if include_references:
         # Search PubMed
-        pubmed_results = search_pubmed(data.get('keywords', []), max_results=3)
+        pubmed_results = search_pubmed(data.get('keywords', []), max_results=REPORT_REFERENCE_COUNT)
         if pubmed_results:
             content.append(Paragraph("Relevant Medical Literature", subtitle_style))
             for ref in pubmed_results:
@@ -298,7 +460,7 @@ def generate_report(data, include_references=True):
             content.append(Paragraph("Related Clinical Trials", subtitle_style))
             for trial in trial_results:
                 content.append(Paragraph(f"• {trial['title']}", styles["Normal"]))
-                content.append(Paragraph(f"  ID: {trial['id']}, Status: {trial['status']}", styles["Normal"]))
+                content.append(Paragraph(f"  ID: {trial['id']}, Status: {trial['status']}, {trial['phase']}", styles["Normal"]))
     
     # Build the PDF
     doc.build(content)
@@ -306,29 +468,94 @@ def generate_report(data, include_references=True):
     return buffer
 
 # Analysis storage functions
+# Held for each read-modify-write of analysis_store.json (saves and compaction)
+analysis_store_lock = threading.RLock()
+
 def get_analysis_store():
-    """Get the analysis storage"""
+    """Get the analysis storage (recent analyses; older ones are archived)"""
     if os.path.exists("analysis_store.json"):
         with open("analysis_store.json", "r") as f:
             return json.load(f)
     return {"analyses": []}
 
-def save_analysis(analysis_data, filename="unknown.jpg"):
+def write_analysis_store(store):
+    """Replace the analysis storage atomically, so readers never see a partial file"""
+    temp_path = f"analysis_store.json.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(store, f)
+    os.replace(temp_path, "analysis_store.json")
+
+def get_all_analyses(date_from=None, date_to=None):
+    """Yield recent and archived analyses, optionally within a date range"""
+    hot_ids = set()
+    for analysis in get_analysis_store()["analyses"]:
+        hot_ids.add(analysis["id"])
+        date = analysis.get("date", "")
+        if (not date_from or date >= date_from) and (not date_to or date[:len(date_to)] <= date_to):
+            yield analysis
+    for analysis in get_archive_store().iter_records("analyses", date_from, date_to):
+        # Skip records caught mid-compaction (already archived, not yet dropped)
+        if analysis["id"] not in hot_ids:
+            yield analysis
+
+def save_analysis(analysis_data, filename="unknown.jpg", image_hashes=None, analysis_type=None):
     """Save analysis data to storage"""
-    store = get_analysis_store()
-    
-    # Add filename to analysis data
+    # Add filename (and the input type, e.g. "image" or "dicom") to analysis data
     analysis_data["filename"] = filename
+    if analysis_type:
+        analysis_data["type"] = analysis_type
     
-    # Add to store
-    store["analyses"].append(analysis_data)
+    # Reference the exact image by content hash instead of copying pixels
+    if image_hashes:
+        analysis_data.update(image_hashes)
+        get_blob_store().incref(*image_hashes.values())
     
-    # Save back to file
-    with open("analysis_store.json", "w") as f:
-        json.dump(store, f)
+    # Add to store and save back to file
+    with analysis_store_lock:
+        store = get_analysis_store()
+        store["analyses"].append(analysis_data)
+        write_analysis_store(store)
+    
+    # Update the running statistics instead of recounting later
+    get_statistics().record(analysis_data)
+    
+    # Make it searchable straight away
+    get_analysis_search().add_analysis(analysis_data)
+    
+    # Cached answers based on an earlier version of this analysis are stale,
+    # and the QA index picks the analysis up from the change log
+    if analysis_data.get("id"):
+        get_answer_cache().invalidate_analysis(analysis_data["id"])
+        get_analysis_changes().record(analysis_data["id"], "upsert")
+    
+    # Mirror into the columnar analytics copy when enabled
+    columns = get_analysis_columns()
+    if columns is not None:
+        columns.append(analysis_data)
     
     return analysis_data
 
+def attach_artifact(analysis_id, name, data):
+    """Store a derived artifact (e.g. a heatmap) and reference it from an analysis"""
+    blob_store = get_blob_store()
+    blob_hash = blob_store.put(data)
+    with analysis_store_lock:
+        store = get_analysis_store()
+        
+        for analysis in store["analyses"]:
+            if analysis["id"] == analysis_id:
+                artifacts = analysis.setdefault("artifacts", {})
+                if artifacts.get(name) == blob_hash:
+                    return blob_hash
+                if name in artifacts:
+                    blob_store.decref(artifacts[name])
+                artifacts[name] = blob_hash
+                blob_store.incref(blob_hash)
+                write_analysis_store(store)
+                return blob_hash
+    
+    return None
+
 def get_analysis_by_id(analysis_id):
     """Get a specific analysis by ID"""
     store = get_analysis_store()
@@ -337,85 +564,105 @@ def get_analysis_by_id(analysis_id):
         if analysis["id"] == analysis_id:
             return analysis
     
-    return None
+    # Older analyses are looked up in the archive on demand
+    return get_archive_store().find("analyses", analysis_id)
 
 def get_latest_analyses(limit=5):
     """Get the most recent analyses"""
     store = get_analysis_store()
     
-    # Sort by date (newest first)
-    sorted_analyses = sorted(store["analyses"], 
-                           key=lambda x: x.get("date", ""), 
-                           reverse=True)
+    # Newest first; only the archive is consulted if the hot store is short
+    latest = heapq.nlargest(limit, store["analyses"], key=lambda x: x.get("date", ""))
+    if len(latest) < limit:
+        hot_ids = {analysis["id"] for analysis in latest}
+        archived = get_archive_store().latest("analyses", limit)
+        latest += [analysis for analysis in archived if analysis["id"] not in hot_ids][:limit - len(latest)]
     
-    return sorted_analyses[:limit]
+    return latest
+
+def get_statistics():
+    """Get the statistics aggregates, building them from the store on first use"""
+    stats = get_analysis_stats()
+    if stats.total() == 0:
+        analyses = list(get_all_analyses())
+        if analyses:
+            stats.rebuild(analyses)
+    return stats
+
+def get_analysis_search():
+    """Get the analysis search index, building it from the store on first use"""
+    index = get_analysis_index()
+    if index.doc_count() == 0:
+        analyses = list(get_all_analyses())
+        if analyses:
+            index.rebuild(analyses)
+    return index
+
+def search_analyses(query="", **filters):
+    """Full-text and faceted search over past analyses (see AnalysisIndex.search_analyses)"""
+    return get_analysis_search().search_analyses(query, **filters)
 
 # Helper function to extract key findings from analysis_store data
-def extract_common_findings():
-    """Extract and summarize common findings from all stored analyses"""
-    store = get_analysis_store()
-    
-    # Count keyword frequencies
-    keyword_counts = {}
-    for analysis in store["analyses"]:
-        for keyword in analysis.get("keywords", []):
-            if keyword in keyword_counts:
-                keyword_counts[keyword] += 1
-            else:
-                keyword_counts[keyword] = 1
-    
-    # Sort by frequency
-    sorted_keywords = sorted(keyword_counts.items(), key=lambda x: x[1], reverse=True)
-    
-    return sorted_keywords
+def extract_common_findings(limit=None):
+    """Keywords across all stored analyses, most frequent first"""
+    return get_statistics().top_keywords(limit)
 
 def generate_statistics_report():
     """Generate a statistical report of findings"""
-    store = get_analysis_store()
+    # Aggregates are maintained on save, so this doesn't depend on archive size
+    summary = get_statistics().summary()
     
-    if not store["analyses"]:
+    if not summary["total"]:
         return None
     
-    # Count analyses by type
-    type_counts = {}
-    for analysis in store["analyses"]:
-        analysis_type = analysis.get("type", "unknown")
-        if analysis_type in type_counts:
-            type_counts[analysis_type] += 1
-        else:
-            type_counts[analysis_type] = 1
-    
-    # Get common findings
-    common_findings = extract_common_findings()
-    
     # Create report
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
     styles = getSampleStyleSheet()
+    table_style = TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+        ("ALIGN", (-1, 0), (-1, -1), "RIGHT"),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+    ])
+    
+    def add_table(title, header, rows):
+        if rows:
+            content.append(Paragraph(title, styles["Heading2"]))
+            table = Table([header] + [list(row) for row in rows], hAlign="LEFT")
+            table.setStyle(table_style)
+            content.append(table)
+            content.append(Spacer(1, 12))
     
     content = []
     
     # Title
     content.append(Paragraph("Medical Imaging Statistics Report", styles["Title"]))
+    content.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles["Normal"]))
     content.append(Spacer(1, 12))
     
     # Overall statistics
     content.append(Paragraph("Overall Statistics", styles["Heading2"]))
-    content.append(Paragraph(f"Total analyses: {len(store['analyses'])}", styles["Normal"]))
+    content.append(Paragraph(f"Total analyses: {summary['total']}", styles["Normal"]))
     content.append(Spacer(1, 12))
     
     # Analysis types
-    if type_counts:
-        content.append(Paragraph("Analysis Types", styles["Heading2"]))
-        for type_name, count in type_counts.items():
-            content.append(Paragraph(f"{type_name.capitalize()}: {count}", styles["Normal"]))
-        content.append(Spacer(1, 12))
+    add_table("Analysis Types", ["Type", "Share", "Analyses"],
+              [(type_name.capitalize(), f"{count / summary['total']:.0%}", count)
+               for type_name, count in summary["types"]])
     
     # Common findings
-    if common_findings:
-        content.append(Paragraph("Common Findings", styles["Heading2"]))
-        for keyword, count in common_findings[:10]:  # Top 10
-            content.append(Paragraph(f"{keyword.capitalize()}: {count} occurrences", styles["Normal"]))
+    add_table("Common Findings", ["Keyword", "Share of analyses", "Occurrences"],
+              [(keyword.capitalize(), f"{count / summary['total']:.0%}", count)
+               for keyword, count in summary["keywords"]])
+    
+    # Findings reported together
+    add_table("Co-occurring Findings", ["Finding", "With", "Analyses"],
+              [(a.capitalize(), b.capitalize(), count) for a, b, count in summary["pairs"]])
+    
+    # Volume over time
+    add_table("Weekly Volume", ["Week", "Analyses"], summary["weekly"])
+    add_table("Daily Volume (last 30 active days)", ["Day", "Analyses"], summary["daily"])
     
     # Build the PDF
     doc.build(content)